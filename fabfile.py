@@ -10,3 +10,9 @@ def generate_docs(clean='no'):
         c = "clean "
     with lcd('docs'):
         local('make %shtml' % c)
+
+
+@task
+def generate_index():
+    """Generate index of device classes."""
+    local('python -m snmp_orm.devices snmp_orm.devices')
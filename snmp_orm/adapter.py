@@ -1,16 +1,16 @@
 """Load and store all existed adapter's classes."""
 from __future__ import absolute_import
 
-from .utils import symbol_by_name
+from .utils import symbol_by_name, LRUCache
 from .settings import SnmpV2Settings, SnmpV3Settings
-from .config import DEFAULT_ADAPTER
+from .config import DEFAULT_ADAPTER, ADAPTER_POOL_SIZE
 
 
 class AdapterRegistry(dict):
-    """Storage for adapter's classes."""
+    """Storage for adapter's classes, module of adapter is imported when
+    it's requested first time.
 
-    def __init__(self):
-        self.get_class(DEFAULT_ADAPTER)
+    """
 
     def get_class(self, module_name):
         if module_name in self:
@@ -24,9 +24,16 @@ class AdapterRegistry(dict):
 #: Global storage of adapters.
 registry = AdapterRegistry()
 
+#: Recently used adapters by their class and settings.
+pool = LRUCache(ADAPTER_POOL_SIZE)
 
-def get_adapter(host, version=None, class_name=None, **kwargs):
-    """Create adapter instance for given host with given settings."""
+
+def get_adapter(host, version=None, class_name=None, pooled=True, **kwargs):
+    """Return adapter instance for given host with given settings. Adapter
+    is taken from pool if it was created with the same settings recently,
+    pass ``pooled=False`` to get new one with own sessions.
+
+    """
     cls = registry.get_class(class_name or DEFAULT_ADAPTER)
 
     if not host:
@@ -42,8 +49,16 @@ def get_adapter(host, version=None, class_name=None, **kwargs):
                                 if not key.startswith("write_"))
     for key in settings_read_kwargs.keys():
         del kwargs[key]
-    settings_write_kwargs = dict((key.replace("write_", ""), value)
+    # write settings are the same as read ones except of given explicitly
+    settings_write_kwargs = dict(settings_read_kwargs)
+    settings_write_kwargs.update((key.replace("write_", ""), value)
                                  for key, value in kwargs.items())
 
-    return cls(settings_read=settings_cls(**settings_read_kwargs),
-               settings_write=settings_cls(**settings_write_kwargs))
+    settings_read = settings_cls(**settings_read_kwargs)
+    settings_write = settings_cls(**settings_write_kwargs)
+    if not pooled:
+        return cls(settings_read=settings_read, settings_write=settings_write,
+                   pooled=False)
+    key = (cls, settings_read.get_key(), settings_write.get_key())
+    return pool.get_or_create(key, lambda: cls(settings_read=settings_read,
+                                               settings_write=settings_write))
@@ -0,0 +1,503 @@
+"""Asynchronous adapter that sends requests on :mod:`asyncio` event loop.
+
+All request methods of this adapter are coroutines:
+
+.. code-block:: python
+
+    adapter = get_adapter(host, class_name='snmp_orm.adapters.asyncio')
+    value = await adapter.get_one('1.3.6.1.2.1.1.5.0')
+
+Only community based versions of protocol (SNMPv1 and SNMPv2c) are
+supported. Module requires Python 3.5+.
+
+"""
+from __future__ import absolute_import
+
+import socket
+import asyncio
+import time
+import inspect
+import logging
+import weakref
+import functools
+from collections import OrderedDict
+
+from pyasn1.error import PyAsn1Error
+from pyasn1.codec.ber import encoder, decoder
+from pysnmp.proto import api
+
+from snmp_orm.config import SNMP_TIMEOUT, SNMP_RETRIES, BATCH_MAX_VARBINDS, \
+    BATCH_MAX_SIZE
+from snmp_orm.utils import str_to_oid
+from snmp_orm.adapters.base import AbstractAdapter, AbstractException, \
+    TimeoutException, TooBigException, SetException, Walker, MultiWalker, \
+    set_chunks, set_errors
+from snmp_orm.adapters.policy import Policy
+from snmp_orm.adapters.engine import AbstractEngine
+from snmp_orm.adapters.ber import get_request_id
+from snmp_orm.adapters import limits
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncioError(AbstractException):
+    pass
+
+
+class AsyncioTimeout(AsyncioError, TimeoutException):
+    pass
+
+
+class AsyncioTooBig(AsyncioError, TooBigException):
+    pass
+
+
+async def chain(result, callback):
+    """Await result and pass it to callback, await callback's result if
+    needed.
+
+    """
+    result = callback(await result)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def resolved(value):
+    """Return value, so it could be awaited like result of request."""
+    return value
+
+
+class Protocol(asyncio.DatagramProtocol):
+    """Datagram protocol that passes responses to engine."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.engine.dispatch(data, addr)
+
+    def error_received(self, exc):
+        logger.debug("Transport error: %s" % exc)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+
+class Engine(AbstractEngine):
+    """Shared UDP endpoints, one per address family, for all sessions
+    running in one event loop. Responses are routed by request-id and
+    timeouts of all requests are kept in one timer wheel, which is advanced
+    by single callback of event loop while there are requests in flight.
+
+    """
+
+    def __init__(self, loop):
+        super(Engine, self).__init__(get_request_id, AsyncioTimeout)
+        self.loop = loop
+        self.protocols = {}
+        self.addresses = {}
+        self.handle = None
+
+    async def resolve(self, address):
+        """Return address family and socket address for (host, port)."""
+        try:
+            return self.addresses[address]
+        except KeyError:
+            pass
+        host, port = address
+        infos = await self.loop.getaddrinfo(host, port,
+                                            type=socket.SOCK_DGRAM)
+        if not infos:
+            raise AsyncioError("Can't resolve %s" % host)
+        # prefer IPv4 like pysnmp transport does
+        infos.sort(key=lambda info: info[0] != socket.AF_INET)
+        family, _, _, _, sockaddr = infos[0]
+        result = self.addresses[address] = (family, sockaddr)
+        return result
+
+    async def get_protocol(self, family):
+        future = self.protocols.get(family)
+        if future is None:
+            future = self.protocols[family] = \
+                asyncio.ensure_future(self.connect(family))
+        try:
+            return await future
+        except Exception:
+            self.protocols.pop(family, None)
+            raise
+
+    async def connect(self, family):
+        _, protocol = await self.loop.create_datagram_endpoint(
+            lambda: Protocol(self), family=family)
+        return protocol
+
+    def sendto(self, family, data, sockaddr):
+        self.protocols[family].result().transport.sendto(data, sockaddr)
+
+    def start(self):
+        if self.handle is None:
+            self.handle = self.loop.call_at(self.loop.time() + self.wheel.tick,
+                                            self.tick)
+
+    def tick(self):
+        self.handle = None
+        self.expire_timers()
+        if self.pending:
+            self.start()
+
+    async def request(self, address, build, policy):
+        """Send request built by ``build`` for given request-id to (host,
+        port), return response.
+
+        """
+        family, sockaddr = await self.resolve(address)
+        await self.get_protocol(family)
+        waiter = self.loop.create_future()
+
+        def callback(response):
+            if not waiter.done():
+                waiter.set_result(response)
+
+        request = self.submit((family, sockaddr), build, policy, callback)
+        try:
+            response = await waiter
+        finally:
+            self.cancel(request)
+        if response is None:
+            raise AsyncioTimeout('requestTimedOut')
+        return response
+
+    def close(self):
+        """Close all opened endpoints and fail requests in flight."""
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        for future in self.protocols.values():
+            if future.done() and not future.cancelled() and \
+                    not future.exception():
+                future.result().close()
+            else:
+                future.cancel()
+        self.protocols.clear()
+        self.fail_pending()
+
+
+#: Engines of event loops.
+engines = weakref.WeakKeyDictionary()
+
+
+def get_engine(loop=None):
+    """Return shared engine of given or running event loop."""
+    loop = loop or asyncio.get_running_loop()
+    try:
+        return engines[loop]
+    except KeyError:
+        engine = engines[loop] = Engine(loop)
+        return engine
+
+
+class Session(object):
+    """Community based session, that sends requests through shared engine
+    of running event loop.
+
+    """
+
+    def __init__(self, host, port, version, community,
+                 timeout=SNMP_TIMEOUT, retries=SNMP_RETRIES, policy=None):
+        self.address = (host, port)
+        self.version = version
+        self.community = community
+        self.policy = policy or Policy(timeout, retries)
+        self.pMod = api.protoModules[
+            api.protoVersion1 if version == 1 else api.protoVersion2c]
+
+    def make_pdu(self, pdu, varBinds, api_pdu=None):
+        api_pdu = api_pdu or self.pMod.apiPDU
+        api_pdu.setDefaults(pdu)
+        api_pdu.setVarBinds(pdu, varBinds)
+        return pdu
+
+    async def send(self, reqPDU):
+        pMod = self.pMod
+        reqMsg = pMod.Message()
+        pMod.apiMessage.setDefaults(reqMsg)
+        pMod.apiMessage.setCommunity(reqMsg, self.community)
+        pMod.apiMessage.setPDU(reqMsg, reqPDU)
+
+        def build(request_id):
+            pMod.apiPDU.setRequestID(reqPDU, request_id)
+            return encoder.encode(reqMsg)
+
+        data = await get_engine().request(self.address, build, self.policy)
+        try:
+            rspMsg, _ = decoder.decode(data, asn1Spec=pMod.Message())
+        except PyAsn1Error as e:
+            raise AsyncioError("Malformed response: %s" % e)
+        return pMod.apiMessage.getPDU(rspMsg)
+
+    def handle_error(self, reqPDU, rspPDU, next=False):
+        """Raise error from response, return False if it is end of MIB
+        signalled by SNMPv1 agent.
+
+        """
+        pMod = self.pMod
+        errorStatus = pMod.apiPDU.getErrorStatus(rspPDU)
+        if not errorStatus:
+            return True
+        if next and self.version == 1 and errorStatus == 2:
+            return False
+        errorIndex = pMod.apiPDU.getErrorIndex(rspPDU)
+        variables = pMod.apiPDU.getVarBinds(reqPDU)
+        position = errorIndex and variables[int(errorIndex) - 1] or '?'
+        error_cls = AsyncioTooBig if errorStatus == 1 else AsyncioError
+        text = errorStatus.prettyPrint()
+        status = errorStatus.getNamedValues().getName(errorStatus)
+        raise error_cls("%s at %s" % (text, position), status=status or text,
+                        index=int(errorIndex))
+
+    def format_varBinds(self, varBinds):
+        return [(str_to_oid(oid), value) for oid, value in varBinds]
+
+    def read_varBinds(self, oids):
+        null = self.pMod.null
+        return [(oid, null) for oid in oids]
+
+    async def get(self, *args):
+        reqPDU = self.make_pdu(self.pMod.GetRequestPDU(),
+                               self.read_varBinds(args))
+        rspPDU = await self.send(reqPDU)
+        self.handle_error(reqPDU, rspPDU)
+        return self.format_varBinds(self.pMod.apiPDU.getVarBinds(rspPDU))
+
+    async def set(self, *args):
+        reqPDU = self.make_pdu(self.pMod.SetRequestPDU(), args)
+        rspPDU = await self.send(reqPDU)
+        self.handle_error(reqPDU, rspPDU)
+        return self.format_varBinds(self.pMod.apiPDU.getVarBinds(rspPDU))
+
+    async def getnext(self, *args):
+        reqPDU = self.make_pdu(self.pMod.GetNextRequestPDU(),
+                               self.read_varBinds(args))
+        rspPDU = await self.send(reqPDU)
+        if not self.handle_error(reqPDU, rspPDU, next=True):
+            return []
+        return self.format_varBinds(self.pMod.apiPDU.getVarBinds(rspPDU))
+
+    async def getbulk(self, rows, *args, **kwargs):
+        if self.version == 1:
+            # SNMPv1 doesn't support GETBULK
+            return await self.getnext(*args)
+        non_repeaters = kwargs.get('non_repeaters', 0)
+        api_pdu = self.pMod.apiBulkPDU
+        reqPDU = self.make_pdu(self.pMod.GetBulkRequestPDU(),
+                               self.read_varBinds(args), api_pdu)
+        api_pdu.setNonRepeaters(reqPDU, non_repeaters)
+        api_pdu.setMaxRepetitions(reqPDU, rows)
+        rspPDU = await self.send(reqPDU)
+        self.handle_error(reqPDU, rspPDU)
+        if non_repeaters:
+            return self.format_varBinds(api_pdu.getVarBinds(rspPDU))
+        result = []
+        for varBinds in api_pdu.getVarBindTable(reqPDU, rspPDU):
+            result.extend(self.format_varBinds(varBinds))
+        return result
+
+
+class AsyncWalker(Walker):
+    """Walker that should be used with ``async for`` statement."""
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.raise_stop:
+            raise StopAsyncIteration()
+        rows = await self.fetch()
+        try:
+            return self.process(rows)
+        except StopIteration:
+            raise StopAsyncIteration()
+
+
+class AsyncMultiWalker(MultiWalker):
+    """Multi walker that should be used with ``async for`` statement."""
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.active:
+            raise StopAsyncIteration()
+        rows = await self.fetch()
+        try:
+            return self.process(rows)
+        except StopIteration:
+            raise StopAsyncIteration()
+
+
+class AsyncRows(object):
+    """Asynchronous iterator over rows of walker's responses."""
+
+    def __init__(self, walker, convert=None):
+        self.walker = walker
+        self.convert = convert
+        self.rows = iter(())
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            for row in self.rows:
+                return row if self.convert is None else self.convert(row)
+            self.rows = iter(await self.walker.__anext__())
+
+
+class LimitedSession(limits.LimitedSession):
+    """Proxy of session, that waits for limiters without blocking event
+    loop. Limiter of subnet is found on first request, after address of
+    host is resolved by engine.
+
+    """
+
+    def limit(self, method):
+
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            acquired = []
+            try:
+                for index, limiter in enumerate(self.limiters):
+                    if isinstance(limiter, limits.UnresolvedLimiter):
+                        _, sockaddr = await get_engine().resolve(
+                            self.session.address)
+                        limiter = self.limiters[index] = \
+                            limiter.resolve(sockaddr[0])
+                    delay = limiter.poll()
+                    while delay is not None:
+                        await asyncio.sleep(delay)
+                        delay = limiter.poll()
+                    acquired.append(limiter)
+                return await method(*args, **kwargs)
+            finally:
+                self.release(acquired)
+
+        return wrapper
+
+
+class Adapter(AbstractAdapter):
+
+    limited_session_cls = LimitedSession
+    resolve_subnet = False
+
+    def get_snmp_v2_session(self, host, port, version, community,
+                            timeout=SNMP_TIMEOUT, retries=SNMP_RETRIES,
+                            policy=None, **kwargs):
+        if community is None:
+            raise TypeError("community can`t be None")
+        return Session(host, port, version, community, timeout, retries,
+                       policy)
+
+    def get_snmp_v3_session(self, *args, **kwargs):
+        raise NotImplementedError("SNMPv3 isn't supported by asyncio adapter")
+
+    def then(self, result, callback):
+        return chain(result, callback)
+
+    def resolve(self, value):
+        return resolved(value)
+
+    def batch(self, **kwargs):
+        raise NotImplementedError("Batches aren't supported by asyncio "
+                                  "adapter, use asyncio.gather instead")
+
+    async def get(self, *args):
+        return await self.session_read.get(*map(str_to_oid, args))
+
+    async def getnext(self, *args):
+        return await self.session_read.getnext(*map(str_to_oid, args))
+
+    async def getbulk(self, rows=None, *args, **kwargs):
+        args = [str_to_oid(arg) for arg in args]
+        non_repeaters = kwargs.get('non_repeaters', 0)
+        if rows is not None or self.tuner is None:
+            if rows is None:
+                rows = self.settings_read["bulk_rows"]
+            return await self.session_read.getbulk(
+                rows, *args, non_repeaters=non_repeaters)
+        tuner = self.tuner
+        while True:
+            rows = tuner.value
+            started = time.time()
+            try:
+                result = await self.session_read.getbulk(
+                    rows, *args, non_repeaters=non_repeaters)
+            except TooBigException:
+                if tuner.shrink():
+                    continue
+                raise
+            except TimeoutException:
+                # Retry would wait for the whole timeout again, so only
+                # next request uses fewer rows.
+                tuner.shrink()
+                raise
+            if len(args) > non_repeaters:
+                tuner.feedback(rows, len(args) - non_repeaters,
+                               result[non_repeaters:],
+                               time.time() - started)
+            return result
+
+    async def set(self, oid, value):
+        return await self.session_write.set((str_to_oid(oid), value))
+
+    async def set_many(self, variables, max_varbinds=BATCH_MAX_VARBINDS,
+                       max_size=BATCH_MAX_SIZE):
+        result, errors = [], OrderedDict()
+        for chunk in set_chunks(variables, max_varbinds, max_size):
+            try:
+                result.extend(await self.session_write.set(*chunk))
+            except AbstractException as e:
+                errors.update(set_errors(chunk, e))
+        if errors:
+            raise SetException(errors, result)
+        return result
+
+    async def walk(self, oid):
+        """Collect all rows in given OID."""
+        oid = str_to_oid(oid)
+        result = []
+        walker = AsyncWalker(self, oid,
+                             use_bulk=self.settings_read["use_bulk"])
+        async for rows in walker:
+            result.extend(rows)
+        return result
+
+    def iter_walk(self, oid, convert=None):
+        """Return asynchronous iterator over rows in given OID, that should
+        be used with ``async for`` statement.
+
+        """
+        return AsyncRows(AsyncWalker(self, str_to_oid(oid),
+                                     use_bulk=self.settings_read["use_bulk"]),
+                         convert)
+
+    async def walk_many(self, oids, first=None):
+        """Walk all given OIDs in lockstep, return list of rows for each
+        OID in the same order.
+
+        """
+        oids = [str_to_oid(oid) for oid in oids]
+        result = [[] for _ in oids]
+        walker = AsyncMultiWalker(self, oids,
+                                  use_bulk=self.settings_read["use_bulk"])
+        for position, rows in walker.start(first):
+            result[position].extend(rows)
+        async for portion in walker:
+            for position, rows in portion:
+                result[position].extend(rows)
+        return result
@@ -1,31 +1,86 @@
 """Abstract adapter class."""
 from __future__ import absolute_import
 
+import time
 import logging
+import threading
 
 from pprint import pformat
 from functools import wraps
+from itertools import chain
+from collections import OrderedDict
 
 from six import Iterator
 from pyasn1.type.univ import Null
+from pysnmp.proto.rfc1905 import EndOfMibView
 
-from snmp_orm.config import DEBUG
+from snmp_orm.config import DEBUG, ADAPTER_POOL_SIZE, BATCH_MAX_VARBINDS, \
+    BATCH_MAX_SIZE
 from snmp_orm.settings import SnmpV2Settings, SnmpV3Settings
-from snmp_orm.utils import str_to_oid
+from snmp_orm.utils import str_to_oid, LRUCache
+from snmp_orm.adapters.batch import Batch, Deferred, chunks
+from snmp_orm.adapters.prepared import PreparedRequest
+from snmp_orm.adapters.tuning import get_tuner
+from snmp_orm.adapters.policy import get_policy
+from snmp_orm.adapters.limits import LimitedSession, get_limiters
 
 logger = logging.getLogger(__name__)
 
+#: Recently used sessions by adapter class and settings.
+sessions = LRUCache(ADAPTER_POOL_SIZE)
+
 
 class AbstractException(Exception):
-    pass
+    """Base error of adapters. If agent responded with error, ``status``
+    is name of error-status and ``index`` is position of failed variable
+    in request starting from 1 (0 if agent didn't point it).
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.status = kwargs.pop('status', None)
+        self.index = kwargs.pop('index', None)
+        super(AbstractException, self).__init__(*args, **kwargs)
+
+
+class TimeoutException(AbstractException):
+    """Agent didn't respond in time."""
+
+
+class TooBigException(AbstractException):
+    """Response doesn't fit in one message."""
+
+
+class NotAppliedException(AbstractException):
+    """Variable wasn't set, because other variable of the same SET request
+    failed.
+
+    """
+
+
+class SetException(AbstractException):
+    """Some variables of :meth:`AbstractAdapter.set_many` weren't set.
+    ``errors`` is ordered dictionary of OID to error of each failed
+    variable, ``variables`` are returned by successful requests.
+
+    """
+
+    def __init__(self, errors, variables):
+        super(SetException, self).__init__(
+            "%d variables weren't set: %s" % (
+                len(errors), ", ".join("%s (%s)" % (".".join(map(str, oid)),
+                                                    error)
+                                       for oid, error in errors.items())))
+        self.errors = errors
+        self.variables = variables
 
 
 def log(f):
 
     @wraps(f)
-    def inner_wrapper(self, *args):
+    def inner_wrapper(self, *args, **kwargs):
         logger.debug("[%s] Call %s%s" % (self.host, f.__name__, pformat(args)))
-        result = f(self, *args)
+        result = f(self, *args, **kwargs)
         logger.debug("[%s] %s return %s" % (self.host, f.__name__, pformat(result)))
         return result
 
@@ -35,12 +90,45 @@ def log(f):
         return f
 
 
+def first_value(variables):
+    """Return value of first variable or None if there is no value."""
+    if variables:
+        result = variables[0][1]
+        if not isinstance(result, Null):
+            return result
+    return None
+
+
+def set_chunks(variables, max_varbinds=BATCH_MAX_VARBINDS,
+               max_size=BATCH_MAX_SIZE):
+    """Split (OID, value) pairs to lists that fit to one SET request."""
+    return chunks([(str_to_oid(oid), value) for oid, value in variables],
+                  max_varbinds, max_size)
+
+
+def set_errors(chunk, error):
+    """Return errors of each variable of failed SET request. SET request
+    is applied atomically, so if agent points failed variable, other ones
+    are just not applied.
+
+    """
+    index = error.index or 0
+    if not 0 < index <= len(chunk):
+        return [(oid, error) for oid, _ in chunk]
+    failed = chunk[index - 1][0]
+    return [(oid, error if position == index else NotAppliedException(
+        "not applied due to error at %s" % ".".join(map(str, failed))))
+        for position, (oid, _) in enumerate(chunk, 1)]
+
+
 class Walker(Iterator):
     """SNMP walker class"""
 
     def __init__(self, agent, baseoid, use_bulk=True, bulk_rows=None):
+        baseoid = str_to_oid(baseoid)
         self.baseoid = baseoid
         self.baseoid_len = len(baseoid)
+        self.parentoid = baseoid[:-1]
         self.lastoid = baseoid
         self.agent = agent
         self.use_bulk = use_bulk
@@ -53,33 +141,138 @@ class Walker(Iterator):
     def __next__(self):
         if self.raise_stop:
             raise StopIteration()
+        return self.process(self.fetch())
+
+    def fetch(self):
+        """Request next portion of rows from agent."""
         if self.use_bulk:
-            rows = self.agent.getbulk(self.bulk_rows, self.lastoid)
+            return self.agent.getbulk(self.bulk_rows, self.lastoid)
         else:
-            rows = self.agent.getnext(self.lastoid)
+            return self.agent.getnext(self.lastoid)
+
+    def process(self, rows):
+        """Cut rows that are out of walked subtree. Sessions return OIDs
+        already parsed, so they are compared by slices without conversion.
+
+        """
         if not rows:
             raise StopIteration()
-        if self.use_bulk:
-            slice = 0
-            for oid, _ in reversed(rows):
-                diff = self.baseoid_len - len(oid)
-                if (diff == 0 and oid[:-1] == self.baseoid[:-1]) or \
-                    (diff != 0 and oid[:diff] == self.baseoid):
-                    break
-                else:
-                    slice += 1
-            if slice > 0:
-                rows = rows[:0 - slice]
-                self.raise_stop = True
-                if not rows:
-                    raise StopIteration()
+        slice = 0
+        for oid, value in reversed(rows):
+            if isinstance(value, EndOfMibView):
+                slice += 1
+                continue
+            if len(oid) == self.baseoid_len:
+                prefix = self.parentoid
+            else:
+                prefix = self.baseoid
+            if oid[:len(prefix)] == prefix:
+                break
+            slice += 1
+        if slice > 0:
+            rows = rows[:0 - slice]
+            self.raise_stop = True
+            if not rows:
+                raise StopIteration()
         self.lastoid = rows[-1][0]
         return rows
 
 
+class MultiWalker(Iterator):
+    """Walk many subtrees at once. Each request contains last OIDs of all
+    unfinished subtrees, so they are advanced in lockstep and each subtree
+    stops on it's own when it's end is reached. Each iteration returns
+    list of (subtree position, rows) pairs.
+
+    """
+
+    def __init__(self, agent, baseoids, use_bulk=True, bulk_rows=None):
+        self.baseoids = [str_to_oid(oid) for oid in baseoids]
+        self.lastoids = list(self.baseoids)
+        self.active = list(range(len(self.baseoids)))
+        self.agent = agent
+        self.use_bulk = use_bulk
+        self.bulk_rows = bulk_rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.active:
+            raise StopIteration()
+        return self.process(self.fetch())
+
+    def start(self, rows=None):
+        """Process response to first request if it's already received,
+        return it's portion.
+
+        """
+        if not rows:
+            return []
+        try:
+            return self.process(rows)
+        except StopIteration:
+            return []
+
+    def fetch(self):
+        """Request next portion of rows for all unfinished subtrees."""
+        oids = [self.lastoids[position] for position in self.active]
+        if self.use_bulk:
+            return self.agent.getbulk(self.bulk_rows, *oids)
+        else:
+            return self.agent.getnext(*oids)
+
+    def process(self, rows):
+        """Distribute rows between subtrees, finish exhausted subtrees.
+
+        Agent could truncate GETBULK response to fewer variables than
+        there are subtrees, so subtree without rows stays unfinished and
+        is requested again. Subtree is finished only by endOfMibView, by
+        OID out of it or by OID that doesn't grow.
+
+        """
+        if not rows:
+            self.active = []
+            raise StopIteration()
+        active = self.active
+        columns = [[] for _ in active]
+        for i, row in enumerate(rows):
+            columns[i % len(active)].append(row)
+        result = []
+        self.active = []
+        for position, column in zip(active, columns):
+            baseoid = self.baseoids[position]
+            lastoid = self.lastoids[position]
+            taken = []
+            finished = False
+            for oid, value in column:
+                if isinstance(value, EndOfMibView) or oid <= lastoid or \
+                        len(oid) <= len(baseoid) or \
+                        oid[:len(baseoid)] != baseoid:
+                    finished = True
+                    break
+                taken.append((oid, value))
+                lastoid = oid
+            if taken:
+                self.lastoids[position] = lastoid
+                result.append((position, taken))
+            if not finished:
+                self.active.append(position)
+        if not result and not self.active:
+            raise StopIteration()
+        return result
+
+
 class AbstractAdapter(object):
 
-    def __init__(self, settings_read, settings_write=None):
+    #: Proxy of sessions that enforces limits of requests.
+    limited_session_cls = LimitedSession
+
+    #: Resolve host when adapter is created to find limiter of it's subnet,
+    #: otherwise session of adapter should resolve it by itself.
+    resolve_subnet = True
+
+    def __init__(self, settings_read, settings_write=None, pooled=True):
         settings_write = settings_write or settings_read.__class__()
         assert settings_write.__class__ == settings_read.__class__
 
@@ -98,12 +291,60 @@ class AbstractAdapter(object):
         self.host = settings_read["host"]
         self.settings_read = settings_read
         self.settings_write = _settings_write
+        self.pooled = pooled
+        self.local = threading.local()
+
+        self.policy = get_policy(
+            settings_read.get("policy_key") or
+            (self.host, settings_read["port"]),
+            settings_read["policy"], timeout=settings_read["timeout"],
+            retries=settings_read["retries"], hedge=settings_read.get("hedge"))
+
+        if settings_read["adaptive_bulk"]:
+            key = settings_read.get("tuning_key") or \
+                (self.host, settings_read["port"])
+            self.tuner = get_tuner(key, settings_read["bulk_rows"])
+        else:
+            self.tuner = None
 
-        self.session_read = session_getter(**settings_read.prepare_kwargs())
+        self.session_read = self.get_session(session_getter, settings_read)
         if settings_read == _settings_write:
             self.session_write = self.session_read
         else:
-            self.session_write = session_getter(**_settings_write.prepare_kwargs())
+            self.session_write = self.get_session(session_getter,
+                                                  _settings_write)
+
+        self.limiters = get_limiters(settings_read, self.resolve_subnet)
+        if self.limiters:
+            session_read = self.session_read
+            self.session_read = self.limited_session_cls(session_read,
+                                                         self.limiters)
+            if self.session_write is session_read:
+                self.session_write = self.session_read
+            else:
+                self.session_write = self.limited_session_cls(
+                    self.session_write, self.limiters)
+
+    @property
+    def current_batch(self):
+        """Batch that collects reads of current thread at the moment."""
+        return getattr(self.local, 'batch', None)
+
+    @current_batch.setter
+    def current_batch(self, batch):
+        self.local.batch = batch
+
+    def get_session(self, session_getter, settings):
+        """Return session for given settings, reuse recently created one
+        with the same settings if it exists and adapter is pooled.
+
+        """
+        kwargs = settings.prepare_kwargs()
+        kwargs["policy"] = self.policy
+        if not self.pooled:
+            return session_getter(**kwargs)
+        key = (type(self), settings.get_key())
+        return sessions.get_or_create(key, lambda: session_getter(**kwargs))
 
     def get_snmp_v2_session(self, host, port, version, community, **kwargs):
         raise NotImplementedError()
@@ -113,6 +354,50 @@ class AbstractAdapter(object):
                                    priv_protocol=None, priv_passphrase=None, **kwargs):
         raise NotImplementedError()
 
+    def then(self, result, callback):
+        """Pass result of request to callback.
+
+        Asynchronous adapters return awaitable objects from their methods,
+        so they should override this to call callback when result is ready.
+
+        """
+        if isinstance(result, Deferred):
+            return result.then(callback)
+        return callback(result)
+
+    def resolve(self, value):
+        """Return already known value as result of request: resolved
+        :class:`Deferred` inside batch, value itself otherwise.
+
+        """
+        if self.current_batch is not None:
+            deferred = Deferred()
+            deferred.resolve(value)
+            return deferred
+        return value
+
+    def batch(self, **kwargs):
+        """Return context manager that collects reads of single values and
+        loads them at exit by as few requests as possible. Values read
+        inside context are :class:`Deferred`:
+
+        .. code-block:: python
+
+            with adapter.batch():
+                name = adapter.get_one('1.3.6.1.2.1.1.5.0')
+                location = adapter.get_one('1.3.6.1.2.1.1.6.0')
+            print(name.value, location.value)
+
+        """
+        return Batch(self, **kwargs)
+
+    def prepare(self, *items):
+        """Return GET request for given fields, groups or OIDs, that could
+        be sent many times, see :class:`PreparedRequest`.
+
+        """
+        return PreparedRequest(self, items)
+
     @log
     def get(self, *args):
         """Return tuple of pairs:
@@ -127,12 +412,11 @@ class AbstractAdapter(object):
 
     def get_one(self, oid):
         """Return oid value."""
-        variables = self.get(oid)
-        if variables:
-            result = variables[0][1]
-            if not isinstance(result, Null):
-                return result
-        return None
+        if self.current_batch is not None:
+            variables = self.current_batch.get(oid)
+        else:
+            variables = self.get(oid)
+        return self.then(variables, first_value)
 
     @log
     def getnext(self, *args):
@@ -153,24 +437,114 @@ class AbstractAdapter(object):
         return self.session_read.getnext(*map(str_to_oid, args))
 
     @log
-    def getbulk(self, rows=None, *args):
-        """Return same as getnext method, but use rows number."""
-        if rows is None:
-            rows = self.settings_read["bulk_rows"]
-        return self.session_read.getbulk(rows, *map(str_to_oid, args))
+    def getbulk(self, rows=None, *args, **kwargs):
+        """Return same as getnext method, but use rows number. If rows
+        number isn't given, it's tuned by previous responses of device.
+        First ``non_repeaters`` OIDs are requested only once:
+
+        .. code-block:: python
+
+            adapter.getbulk(None, '1.3.6.1.2.1.1.3', '1.3.6.1.2.1.2.2.1.2',
+                            non_repeaters=1)
+
+        """
+        args = [str_to_oid(arg) for arg in args]
+        non_repeaters = kwargs.get('non_repeaters', 0)
+        if rows is not None or self.tuner is None:
+            if rows is None:
+                rows = self.settings_read["bulk_rows"]
+            return self.session_read.getbulk(rows, *args,
+                                             non_repeaters=non_repeaters)
+        tuner = self.tuner
+        while True:
+            rows = tuner.value
+            started = time.time()
+            try:
+                result = self.session_read.getbulk(
+                    rows, *args, non_repeaters=non_repeaters)
+            except TooBigException:
+                if tuner.shrink():
+                    continue
+                raise
+            except TimeoutException:
+                # Retry would wait for the whole timeout again, so only
+                # next request uses fewer rows.
+                tuner.shrink()
+                raise
+            if len(args) > non_repeaters:
+                tuner.feedback(rows, len(args) - non_repeaters,
+                               result[non_repeaters:],
+                               time.time() - started)
+            return result
 
     @log
-    def set(self, *args):
-        #TODO: set more than one values
-        return self.session_write.set(args)
+    def set(self, oid, value):
+        """Set value of OID, return list of variables from response."""
+        if self.current_batch is not None:
+            return self.current_batch.set(oid, value)
+        return self.session_write.set((str_to_oid(oid), value))
+
+    @log
+    def set_many(self, variables, max_varbinds=BATCH_MAX_VARBINDS,
+                 max_size=BATCH_MAX_SIZE):
+        """Set values of many OIDs by as few SET requests as possible,
+        return list of variables from responses:
+
+        .. code-block:: python
+
+            adapter.set_many([('1.3.6.1.2.1.2.2.1.7.5', Integer(2)),
+                              ('1.3.6.1.2.1.31.1.1.1.18.5',
+                               OctetString('uplink'))])
+
+        Each request contains no more than ``max_varbinds`` variables and
+        no more than ``max_size`` bytes of encoded variables. Failed requests
+        don't stop others, :class:`SetException` with error of each variable
+        is raised at the end.
+
+        """
+        result, errors = [], OrderedDict()
+        for chunk in set_chunks(variables, max_varbinds, max_size):
+            try:
+                result.extend(self.session_write.set(*chunk))
+            except AbstractException as e:
+                errors.update(set_errors(chunk, e))
+        if errors:
+            raise SetException(errors, result)
+        return result
 
     def walk(self, oid):
         """Collect all rows in given OID."""
+        return list(self.iter_walk(oid))
+
+    def iter_walk(self, oid, convert=None):
+        """Yield rows in given OID as they are received, only one response
+        is kept in memory. Each row is passed through ``convert`` function
+        if it's given:
+
+        .. code-block:: python
+
+            for oid, value in adapter.iter_walk('1.3.6.1.2.1.17.4.3.1.2'):
+                ...
+
+        """
         oid = str_to_oid(oid)
-        result = []
-        walker = Walker(self, oid,
-                        use_bulk=self.settings_read["use_bulk"],
-                        bulk_rows=self.settings_read["bulk_rows"])
+        walker = Walker(self, oid, use_bulk=self.settings_read["use_bulk"])
         for rows in walker:
-            result.extend(rows)
+            for row in rows:
+                yield row if convert is None else convert(row)
+
+    def walk_many(self, oids, first=None):
+        """Walk all given OIDs in lockstep, return list of rows for each
+        OID in the same order. If response to first GETBULK (or GETNEXT)
+        request for these OIDs is already received, it's passed as
+        ``first``.
+
+        """
+        oids = [str_to_oid(oid) for oid in oids]
+        result = [[] for _ in oids]
+        walker = MultiWalker(self, oids,
+                             use_bulk=self.settings_read["use_bulk"])
+        for portion in chain([walker.start(first)], walker):
+            for position, rows in portion:
+                result[position].extend(rows)
         return result
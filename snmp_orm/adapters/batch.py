@@ -0,0 +1,205 @@
+"""Deferred values and batches of scalar reads and writes."""
+from __future__ import absolute_import
+
+from collections import OrderedDict
+
+from snmp_orm.config import BATCH_MAX_VARBINDS, BATCH_MAX_SIZE
+from snmp_orm.utils import str_to_oid, LazyModule
+
+encoder = LazyModule('pyasn1.codec.ber.encoder')
+
+#: Encoded size of variable binding without OID: headers of sequence,
+#: OID and NULL value.
+VARBIND_OVERHEAD = 6
+
+
+def oid_size(oid):
+    """Return size of BER encoded OID's content."""
+    size = 1  # first two sub-identifiers are packed into one octet
+    for subid in oid[2:]:
+        size += 1
+        while subid > 0x7f:
+            subid >>= 7
+            size += 1
+    return size
+
+
+def varbind_size(oid, value=None):
+    """Return size of BER encoded variable binding, NULL value is assumed
+    if value isn't given.
+
+    """
+    size = oid_size(oid) + VARBIND_OVERHEAD
+    if value is not None:
+        size += len(encoder.encode(value)) - 2
+        if size > 0x7f:
+            # long form of sequence length
+            size += 2
+    return size
+
+
+def chunks(varbinds, max_varbinds=BATCH_MAX_VARBINDS,
+           max_size=BATCH_MAX_SIZE):
+    """Split (OID, value) pairs to lists that fit to one request, value is
+    None for reads.
+
+    """
+    chunk, size = [], 0
+    for oid, value in varbinds:
+        size_of = varbind_size(oid, value)
+        if chunk and (len(chunk) >= max_varbinds or
+                      size + size_of > max_size):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append((oid, value))
+        size += size_of
+    if chunk:
+        yield chunk
+
+
+class Deferred(object):
+    """Result of request, that will be known when batch is resolved."""
+
+    def __init__(self):
+        self.resolved = False
+        self.result = None
+        self.error = None
+        self.children = []
+
+    def then(self, callback):
+        """Return deferred of callback result."""
+        child = Deferred()
+        if self.resolved:
+            child.settle(self.result, self.error, callback)
+        else:
+            self.children.append((child, callback))
+        return child
+
+    def settle(self, result, error=None, callback=None):
+        if error is None and callback is not None:
+            try:
+                result = callback(result)
+            except Exception as e:
+                error = e
+        self.resolved = True
+        self.result = result
+        self.error = error
+        children, self.children = self.children, []
+        for child, callback in children:
+            child.settle(result, error, callback)
+
+    def resolve(self, result):
+        self.settle(result)
+
+    def fail(self, error):
+        self.settle(None, error)
+
+    @property
+    def value(self):
+        """Return result or raise error of request."""
+        if not self.resolved:
+            raise ValueError('Value is not resolved yet')
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def __repr__(self):
+        if self.resolved:
+            state = 'error %r' % self.error if self.error else repr(self.result)
+        else:
+            state = 'pending'
+        return '<Deferred %s at %s>' % (state, hex(id(self)))
+
+
+class Batch(object):
+    """Collect scalar reads and writes and send them by as few GET and SET
+    requests as possible when context is exited or :meth:`flush` called.
+    Writes are sent before reads. Each request contains no more than
+    ``max_varbinds`` variables and no more than ``max_size`` bytes of
+    encoded variables.
+
+    """
+
+    def __init__(self, adapter, max_varbinds=BATCH_MAX_VARBINDS,
+                 max_size=BATCH_MAX_SIZE):
+        self.adapter = adapter
+        self.max_varbinds = max_varbinds
+        self.max_size = max_size
+        self.pending = OrderedDict()
+        self.writes = OrderedDict()
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = self.adapter.current_batch
+        self.adapter.current_batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.adapter.current_batch = self.previous
+        self.previous = None
+        if exc_type is None:
+            self.flush()
+        else:
+            self.pending.clear()
+            self.writes.clear()
+
+    def get(self, oid):
+        """Queue read of OID, return deferred list of variables."""
+        oid = str_to_oid(oid)
+        deferred = self.pending.get(oid)
+        if deferred is None:
+            deferred = self.pending[oid] = Deferred()
+        return deferred
+
+    def set(self, oid, value):
+        """Queue write of OID, return deferred list of variables. Later
+        write of the same OID replaces earlier one.
+
+        """
+        oid = str_to_oid(oid)
+        previous = self.writes.pop(oid, None)
+        deferred = Deferred() if previous is None else previous[1]
+        self.writes[oid] = (value, deferred)
+        return deferred
+
+    def chunks(self, oids):
+        """Split OIDs to lists that fit to one request."""
+        for chunk in chunks([(oid, None) for oid in oids],
+                            self.max_varbinds, self.max_size):
+            yield [oid for oid, _ in chunk]
+
+    def flush(self):
+        """Send queued writes and reads and resolve their values."""
+        writes, self.writes = self.writes, OrderedDict()
+        if writes:
+            self.flush_writes(writes)
+        pending, self.pending = self.pending, OrderedDict()
+        for chunk in self.chunks(pending):
+            try:
+                variables = dict(self.adapter.get(*chunk))
+            except Exception as e:
+                for oid in chunk:
+                    pending[oid].fail(e)
+                continue
+            for oid in chunk:
+                pending[oid].resolve([(oid, variables.get(oid))])
+
+    def flush_writes(self, writes):
+        errors = {}
+        try:
+            variables = self.adapter.set_many(
+                [(oid, value) for oid, (value, _) in writes.items()],
+                self.max_varbinds, self.max_size)
+        except Exception as e:
+            errors = getattr(e, 'errors', None)
+            if errors is None:
+                for _, deferred in writes.values():
+                    deferred.fail(e)
+                return
+            variables = e.variables
+        variables = dict(variables)
+        for oid, (value, deferred) in writes.items():
+            if oid in errors:
+                deferred.fail(errors[oid])
+            else:
+                deferred.resolve([(oid, variables.get(oid, value))])
@@ -0,0 +1,465 @@
+"""Adapter with own compact BER codec for community based messages.
+
+Messages of SNMPv1 and SNMPv2c read requests (GET, GETNEXT and GETBULK) are
+encoded and decoded by hand, responses are decoded straight into list of
+``(OID, value)`` pairs, so pyasn1 codec isn't used on the hot path.
+SNMPv3, SET requests and responses that codec doesn't understand are
+passed to :mod:`snmp_orm.adapters.pysnmp` adapter:
+
+.. code-block:: python
+
+    adapter = get_adapter(host, class_name='snmp_orm.adapters.ber')
+
+"""
+from __future__ import absolute_import
+
+import socket
+import struct
+import logging
+
+from six import int2byte
+from pyasn1.type import univ
+from pysnmp.proto import rfc1902, rfc1905
+
+from snmp_orm.config import SNMP_TIMEOUT, SNMP_RETRIES
+from snmp_orm.adapters.base import AbstractException, TimeoutException, \
+    TooBigException
+from snmp_orm.adapters import pysnmp
+from snmp_orm.adapters.policy import Policy
+from snmp_orm.adapters.limits import LimitedSession
+from snmp_orm.adapters.engine import get_engine, REQUEST_ID_MIN
+from snmp_orm.adapters.prepared import PreparedRequest as BasePreparedRequest
+from snmp_orm.utils import OID
+
+logger = logging.getLogger(__name__)
+
+# Universal tags.
+INTEGER = 0x02
+OCTET_STRING = 0x04
+NULL = 0x05
+OBJECT_IDENTIFIER = 0x06
+SEQUENCE = 0x30
+
+# Application tags.
+IP_ADDRESS = 0x40
+COUNTER32 = 0x41
+GAUGE32 = 0x42
+TIME_TICKS = 0x43
+OPAQUE = 0x44
+COUNTER64 = 0x46
+
+# Exception values of SNMPv2c.
+NO_SUCH_OBJECT = 0x80
+NO_SUCH_INSTANCE = 0x81
+END_OF_MIB_VIEW = 0x82
+
+# PDU tags.
+GET_REQUEST = 0xa0
+GET_NEXT_REQUEST = 0xa1
+GET_RESPONSE = 0xa2
+SET_REQUEST = 0xa3
+GET_BULK_REQUEST = 0xa5
+
+#: Names of error-status values.
+ERROR_NAMES = ('noError', 'tooBig', 'noSuchName', 'badValue', 'readOnly',
+               'genErr', 'noAccess', 'wrongType', 'wrongLength',
+               'wrongEncoding', 'wrongValue', 'noCreation',
+               'inconsistentValue', 'resourceUnavailable', 'commitFailed',
+               'undoFailed', 'authorizationError', 'notWritable',
+               'inconsistentName')
+
+NULL_VALUE = b'\x05\x00'
+
+
+class BERError(AbstractException):
+    pass
+
+
+class BERTimeout(BERError, TimeoutException):
+    pass
+
+
+class BERTooBig(BERError, TooBigException):
+    pass
+
+
+class UnsupportedError(BERError):
+    """Message couldn't be handled by codec."""
+
+
+def encode_length(length):
+    if length < 0x80:
+        return int2byte(length)
+    octets = bytearray()
+    while length:
+        octets.insert(0, length & 0xff)
+        length >>= 8
+    return int2byte(0x80 | len(octets)) + bytes(octets)
+
+
+def encode_tlv(tag, value):
+    return int2byte(tag) + encode_length(len(value)) + value
+
+
+def encode_integer(value, tag=INTEGER):
+    """Encode integer in minimal two's complement form."""
+    octets = bytearray()
+    while True:
+        octets.insert(0, value & 0xff)
+        if -0x80 <= value < 0x80:
+            break
+        value >>= 8
+    return encode_tlv(tag, bytes(octets))
+
+
+def encode_oid(oid):
+    octets = bytearray()
+    if len(oid) < 2:
+        raise UnsupportedError('OID %r is too short' % (oid, ))
+    for subid in (oid[0] * 40 + oid[1], ) + tuple(oid[2:]):
+        chunk = bytearray((subid & 0x7f, ))
+        subid >>= 7
+        while subid:
+            chunk.insert(0, 0x80 | (subid & 0x7f))
+            subid >>= 7
+        octets.extend(chunk)
+    return encode_tlv(OBJECT_IDENTIFIER, bytes(octets))
+
+
+def encode_message(version, community, tag, request_id, oids,
+                   non_repeaters=0, max_repetitions=0):
+    """Encode read request message. For GETBULK request error-status and
+    error-index are replaced by non-repeaters and max-repetitions.
+
+    """
+    varbinds = b''.join(encode_tlv(SEQUENCE, encode_oid(oid) + NULL_VALUE)
+                        for oid in oids)
+    pdu = (encode_integer(request_id) +
+           encode_integer(non_repeaters) +
+           encode_integer(max_repetitions) +
+           encode_tlv(SEQUENCE, varbinds))
+    return encode_tlv(SEQUENCE,
+                      encode_integer(version) +
+                      encode_tlv(OCTET_STRING, community) +
+                      encode_tlv(tag, pdu))
+
+
+def decode_tlv(data, offset):
+    """Return tag, start and end of value at given offset."""
+    try:
+        tag = data[offset]
+        length = data[offset + 1]
+    except IndexError:
+        raise UnsupportedError('Truncated message')
+    offset += 2
+    if length & 0x80:
+        count = length & 0x7f
+        if not count or count > 4:
+            raise UnsupportedError('Unsupported length form')
+        length = 0
+        for octet in data[offset:offset + count]:
+            length = (length << 8) | octet
+        offset += count
+    end = offset + length
+    if end > len(data):
+        raise UnsupportedError('Truncated message')
+    return tag, offset, end
+
+
+def decode_integer(data, start, end):
+    value = 0
+    for octet in data[start:end]:
+        value = (value << 8) | octet
+    if end > start and data[start] & 0x80:
+        value -= 1 << ((end - start) * 8)
+    return value
+
+
+def decode_unsigned(data, start, end):
+    value = 0
+    for octet in data[start:end]:
+        value = (value << 8) | octet
+    return value
+
+
+def decode_oid(data, start, end):
+    if start == end:
+        raise UnsupportedError('Empty OID')
+    subids = []
+    subid = 0
+    for octet in data[start:end]:
+        subid = (subid << 7) | (octet & 0x7f)
+        if not octet & 0x80:
+            subids.append(subid)
+            subid = 0
+    first = subids[0]
+    if first < 80:
+        subids[0:1] = (first // 40, first % 40)
+    else:
+        subids[0:1] = (2, first - 80)
+    return OID(subids)
+
+
+def to_bytes(data, start, end):
+    return bytes(data[start:end])
+
+
+#: Value decoders by tag.
+decoders = {
+    INTEGER: lambda d, s, e: rfc1902.Integer(decode_integer(d, s, e)),
+    OCTET_STRING: lambda d, s, e: rfc1902.OctetString(to_bytes(d, s, e)),
+    NULL: lambda d, s, e: univ.Null(''),
+    OBJECT_IDENTIFIER: lambda d, s, e: univ.ObjectIdentifier(
+        decode_oid(d, s, e)),
+    IP_ADDRESS: lambda d, s, e: rfc1902.IpAddress(to_bytes(d, s, e)),
+    COUNTER32: lambda d, s, e: rfc1902.Counter32(decode_unsigned(d, s, e)),
+    GAUGE32: lambda d, s, e: rfc1902.Gauge32(decode_unsigned(d, s, e)),
+    TIME_TICKS: lambda d, s, e: rfc1902.TimeTicks(decode_unsigned(d, s, e)),
+    OPAQUE: lambda d, s, e: rfc1902.Opaque(to_bytes(d, s, e)),
+    COUNTER64: lambda d, s, e: rfc1902.Counter64(decode_unsigned(d, s, e)),
+    NO_SUCH_OBJECT: lambda d, s, e: rfc1905.noSuchObject,
+    NO_SUCH_INSTANCE: lambda d, s, e: rfc1905.noSuchInstance,
+    END_OF_MIB_VIEW: lambda d, s, e: rfc1905.endOfMibView,
+}
+
+
+def expect(data, offset, tag):
+    found, start, end = decode_tlv(data, offset)
+    if found != tag:
+        raise UnsupportedError('Expected tag 0x%02x, got 0x%02x' %
+                               (tag, found))
+    return start, end
+
+
+def decode_header(data, tag=GET_RESPONSE):
+    """Return version, community, request-id and offset of the rest of
+    message with given PDU tag.
+
+    """
+    if not isinstance(data, bytearray):
+        data = bytearray(data)
+    start, _ = expect(data, 0, SEQUENCE)
+    offset, end = expect(data, start, INTEGER)
+    version = decode_integer(data, offset, end)
+    offset, end = expect(data, end, OCTET_STRING)
+    community = to_bytes(data, offset, end)
+    offset, _ = expect(data, end, tag)
+    start, end = expect(data, offset, INTEGER)
+    request_id = decode_integer(data, start, end)
+    return version, community, request_id, end
+
+
+def decode_response(data, layout=None):
+    """Decode response message, return version, community, request-id,
+    error-status, error-index and list of variables. Layout is list of
+    expected (OID, encoded OID) pairs, OIDs found at their positions
+    aren't decoded.
+
+    """
+    data = bytearray(data)
+    version, community, request_id, offset = decode_header(data)
+    start, end = expect(data, offset, INTEGER)
+    error_status = decode_integer(data, start, end)
+    start, end = expect(data, end, INTEGER)
+    error_index = decode_integer(data, start, end)
+    offset, stop = expect(data, end, SEQUENCE)
+    variables = []
+    expected = len(layout) if layout else 0
+    while offset < stop:
+        start, offset = expect(data, offset, SEQUENCE)
+        start, end = expect(data, start, OBJECT_IDENTIFIER)
+        position = len(variables)
+        if position < expected and \
+                data[start:end] == layout[position][1]:
+            oid = layout[position][0]
+        else:
+            oid = decode_oid(data, start, end)
+        tag, start, end = decode_tlv(data, end)
+        try:
+            decoder = decoders[tag]
+        except KeyError:
+            raise UnsupportedError('Unknown value tag 0x%02x' % tag)
+        variables.append((oid, decoder(data, start, end)))
+    return version, community, request_id, error_status, error_index, \
+        variables
+
+
+def get_request_id(data):
+    """Return request-id of response message."""
+    return decode_header(data)[2]
+
+
+class Session(object):
+    """Community based session, that encodes and decodes read requests by
+    itself and passes everything else to pysnmp session.
+
+    """
+
+    def __init__(self, host, port, version, community,
+                 timeout=SNMP_TIMEOUT, retries=SNMP_RETRIES, policy=None):
+        self.host = host
+        self.port = port
+        self.version = version
+        self.message_version = 0 if version == 1 else 1
+        self.community = community
+        self.encoded_community = community if isinstance(community, bytes) \
+            else community.encode('utf-8')
+        self.timeout = timeout
+        self.retries = retries
+        self.policy = policy or Policy(timeout, retries)
+        infos = socket.getaddrinfo(host, port, 0, socket.SOCK_DGRAM)
+        if not infos:
+            raise BERError("Can't resolve %s" % host)
+        # prefer IPv4 like pysnmp transport does
+        infos.sort(key=lambda info: info[0] != socket.AF_INET)
+        family, _, _, _, sockaddr = infos[0]
+        self.address = (family, sockaddr)
+        self._fallback = None
+
+    @property
+    def fallback(self):
+        """pysnmp session, created when it's needed first time."""
+        if self._fallback is None:
+            self._fallback = pysnmp.Session(
+                self.host, self.port, self.version, self.community,
+                self.timeout, self.retries)
+        return self._fallback
+
+    @property
+    def engine(self):
+        return get_engine(__name__, get_request_id, BERTimeout)
+
+    def request(self, tag, oids, non_repeaters=0, max_repetitions=0):
+        def build(request_id):
+            return encode_message(self.message_version,
+                                  self.encoded_community, tag, request_id,
+                                  oids, non_repeaters, max_repetitions)
+
+        response = self.engine.request(self.address, build, self.policy)
+        return decode_response(response)[3:]
+
+    def prepare(self, oids):
+        """Encode GET request for given OIDs, return message and offset of
+        request-id in it.
+
+        """
+        data = encode_message(self.message_version, self.encoded_community,
+                              GET_REQUEST, REQUEST_ID_MIN, oids)
+        end = decode_header(data, GET_REQUEST)[3]
+        return data, end - 4
+
+    def send_prepared(self, message, offset, oids, layout):
+        """Send prepared GET request with new request-id."""
+        head, tail = message[:offset], message[offset + 4:]
+
+        def build(request_id):
+            return head + struct.pack('>I', request_id) + tail
+
+        try:
+            response = self.engine.request(self.address, build, self.policy)
+            error_status, error_index, variables = \
+                decode_response(response, layout)[3:]
+        except UnsupportedError as e:
+            logger.debug("Use pysnmp for request to %s: %s" % (self.host, e))
+            return self.fallback.get(*oids)
+        self.handle_error(oids, error_status, error_index)
+        return variables
+
+    def handle_error(self, oids, error_status, error_index, next=False):
+        """Raise error from response, return False if it is end of MIB
+        signalled by SNMPv1 agent.
+
+        """
+        if not error_status:
+            return True
+        if next and self.version == 1 and error_status == 2:
+            return False
+        try:
+            text = ERROR_NAMES[error_status]
+        except IndexError:
+            text = str(error_status)
+        position = '?'
+        if 0 < error_index <= len(oids):
+            position = oids[error_index - 1]
+        error_cls = BERTooBig if error_status == 1 else BERError
+        raise error_cls("%s at %s" % (text, position), status=text,
+                        index=error_index)
+
+    def read(self, tag, oids, fallback, non_repeaters=0, max_repetitions=0):
+        try:
+            error_status, error_index, variables = self.request(
+                tag, oids, non_repeaters, max_repetitions)
+        except UnsupportedError as e:
+            logger.debug("Use pysnmp for request to %s: %s" % (self.host, e))
+            return fallback()
+        if not self.handle_error(oids, error_status, error_index,
+                                 tag != GET_REQUEST):
+            return []
+        return variables
+
+    def get(self, *args):
+        return self.read(GET_REQUEST, args,
+                         lambda: self.fallback.get(*args))
+
+    def getnext(self, *args):
+        return self.read(GET_NEXT_REQUEST, args,
+                         lambda: self.fallback.getnext(*args))
+
+    def getbulk(self, rows, *args, **kwargs):
+        if self.version == 1:
+            # SNMPv1 doesn't support GETBULK
+            return self.getnext(*args)
+        non_repeaters = kwargs.get('non_repeaters', 0)
+        return self.read(GET_BULK_REQUEST, args,
+                         lambda: self.fallback.getbulk(
+                             rows, *args, non_repeaters=non_repeaters),
+                         non_repeaters, rows)
+
+    def set(self, *args):
+        return self.fallback.set(*args)
+
+
+class PreparedRequest(BasePreparedRequest):
+    """Prepared request, that is encoded once. Each time it's sent only
+    request-id is replaced, OIDs of response are matched by their encoded
+    form.
+
+    """
+
+    def __init__(self, adapter, items):
+        super(PreparedRequest, self).__init__(adapter, items)
+        self.session = adapter.session_read
+        self.message, self.offset = self.session.prepare(self.oids)
+        self.layout = []
+        for oid in self.oids:
+            encoded = bytearray(encode_oid(oid))
+            start = decode_tlv(encoded, 0)[1]
+            self.layout.append((oid, bytes(encoded[start:])))
+
+    def get(self):
+        return self.session.send_prepared(self.message, self.offset,
+                                          self.oids, self.layout)
+
+
+class Adapter(pysnmp.Adapter):
+    """Drop-in replacement of pysnmp adapter. SNMPv3 sessions are created
+    by pysnmp adapter.
+
+    """
+
+    def prepare(self, *items):
+        session = self.session_read
+        if isinstance(session, LimitedSession):
+            # prepared request is sent through proxy, so it's limited too
+            session = session.session
+        if not isinstance(session, Session):
+            return super(Adapter, self).prepare(*items)
+        return PreparedRequest(self, items)
+
+    def get_snmp_v2_session(self, host, port, version, community,
+                            timeout=SNMP_TIMEOUT, retries=SNMP_RETRIES,
+                            policy=None, **kwargs):
+        if community is None:
+            raise TypeError("community can`t be None")
+        return Session(host, port, version, community, timeout, retries,
+                       policy)
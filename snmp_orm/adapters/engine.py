@@ -0,0 +1,368 @@
+"""Transport engine shared by all sessions of process.
+
+Engine owns one UDP socket per address family and one thread, that reads
+responses and passes each of them to waiting request found by request-id.
+Timeouts of requests are handled by timer wheel, so number of requests in
+flight is limited neither by sockets nor by threads:
+
+.. code-block:: python
+
+    engine = get_engine()
+    engine.submit(address, build, policy, callback)
+
+Engine is created again in forked processes. Routing of responses,
+retransmissions and hedging are implemented by :class:`AbstractEngine`,
+engine of :mod:`snmp_orm.adapters.asyncio` is based on it too.
+
+"""
+from __future__ import absolute_import
+
+import os
+import select
+import socket
+import random
+import logging
+import threading
+from time import time
+
+from snmp_orm.config import TIMER_TICK, TIMER_WHEEL_SIZE
+from snmp_orm.adapters.base import AbstractException, TimeoutException
+
+logger = logging.getLogger(__name__)
+
+#: Range of request-ids, all of them are encoded by four octets.
+REQUEST_ID_MIN = 0x01000000
+REQUEST_ID_MAX = 0x7fffffff
+
+
+class EngineError(AbstractException):
+    pass
+
+
+class EngineTimeout(EngineError, TimeoutException):
+    pass
+
+
+class Timer(object):
+    __slots__ = ('tick', 'callback', 'cancelled')
+
+    def __init__(self, tick, callback):
+        self.tick = tick
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel(object):
+    """Hashed timer wheel: timers are stored in slots by their tick, so
+    adding and cancelling of timer costs O(1) and expiration costs O(1) per
+    timer.
+
+    """
+
+    def __init__(self, tick=TIMER_TICK, size=TIMER_WHEEL_SIZE, now=None):
+        self.tick = tick
+        self.size = size
+        self.slots = [[] for _ in range(size)]
+        self.current = int((time() if now is None else now) / tick)
+        self.count = 0
+
+    def schedule(self, deadline, callback):
+        """Call callback at given time, return timer that could be
+        cancelled.
+
+        """
+        tick = max(int(-(-deadline // self.tick)), self.current + 1)
+        timer = Timer(tick, callback)
+        self.slots[tick % self.size].append(timer)
+        self.count += 1
+        return timer
+
+    def advance(self, now):
+        """Return callbacks of timers expired to given time."""
+        target = int(now / self.tick)
+        if target <= self.current:
+            return []
+        if target - self.current >= self.size:
+            indexes = range(self.size)
+        else:
+            indexes = [tick % self.size
+                       for tick in range(self.current + 1, target + 1)]
+        self.current = target
+        expired = []
+        for index in indexes:
+            slot = self.slots[index]
+            if not slot:
+                continue
+            left = []
+            for timer in slot:
+                if timer.cancelled:
+                    continue
+                if timer.tick <= target:
+                    expired.append(timer.callback)
+                else:
+                    left.append(timer)
+            self.count -= len(slot) - len(left)
+            self.slots[index] = left
+        return expired
+
+
+class Request(object):
+    """Request in flight."""
+
+    __slots__ = ('request_id', 'address', 'data', 'policy', 'callback',
+                 'timeouts', 'attempt', 'sent', 'hedged', 'timer')
+
+    def __init__(self, request_id, address, data, policy, callback):
+        self.request_id = request_id
+        self.address = address
+        self.data = data
+        self.policy = policy
+        self.callback = callback
+        self.timeouts = policy.timeouts()
+        self.attempt = 0
+        self.sent = None
+        self.hedged = False
+        self.timer = None
+
+
+class AbstractEngine(object):
+    """Send requests and route responses to them by request-id, which is
+    read from response by ``get_request_id``. Subclasses send datagrams
+    and pass received ones to :meth:`dispatch`, timers of all requests are
+    kept in one wheel that should be advanced by :meth:`expire_timers`.
+
+    """
+
+    def __init__(self, get_request_id, timeout_error=EngineTimeout):
+        self.get_request_id = get_request_id
+        self.timeout_error = timeout_error
+        self.lock = threading.RLock()
+        self.pending = {}
+        self.wheel = TimerWheel()
+        self.next_id = random.randint(REQUEST_ID_MIN, REQUEST_ID_MAX)
+        self.closed = False
+
+    def sendto(self, family, data, sockaddr):
+        """Send datagram to socket address of given family."""
+        raise NotImplementedError()
+
+    def start(self):
+        """Called after request is sent, should ensure that responses are
+        received and timers are expired.
+
+        """
+
+    def allocate_id(self):
+        """Return request-id that isn't used by requests in flight."""
+        request_id = self.next_id
+        while request_id in self.pending:
+            request_id += 1
+            if request_id > REQUEST_ID_MAX:
+                request_id = REQUEST_ID_MIN
+        self.next_id = request_id + 1
+        if self.next_id > REQUEST_ID_MAX:
+            self.next_id = REQUEST_ID_MIN
+        return request_id
+
+    def submit(self, address, build, policy, callback):
+        """Send request to address (result of ``getaddrinfo``: family and
+        socket address). Data of request is returned by ``build`` for given
+        request-id. Callback is called from thread of engine with response or
+        None if request timed out.
+
+        """
+        with self.lock:
+            if self.closed:
+                raise EngineError('Engine is closed')
+            request_id = self.allocate_id()
+            request = Request(request_id, address, build(request_id),
+                              policy, callback)
+            self.pending[request_id] = request
+            self.send(request)
+            self.start()
+        return request
+
+    def cancel(self, request):
+        """Forget request, it's callback won't be called."""
+        with self.lock:
+            self.pending.pop(request.request_id, None)
+            if request.timer is not None:
+                request.timer.cancel()
+
+    def send(self, request, hedge=False):
+        family, sockaddr = request.address
+        now = time()
+        if not hedge:
+            timeout = request.timeouts[request.attempt]
+            request.attempt += 1
+            request.sent = now
+            delay = None
+            if request.attempt == 1:
+                delay = request.policy.hedge_delay(timeout)
+            if delay is None:
+                request.timer = self.wheel.schedule(
+                    now + timeout, lambda: self.expire(request))
+            else:
+                request.timer = self.wheel.schedule(
+                    now + delay, lambda: self.hedge(request, now + timeout))
+        try:
+            self.sendto(family, request.data, sockaddr)
+        except socket.error as e:
+            logger.debug("Can't send request to %s: %s" % (sockaddr, e))
+
+    def hedge(self, request, deadline):
+        request.hedged = True
+        request.timer = self.wheel.schedule(
+            deadline, lambda: self.expire(request))
+        self.send(request, hedge=True)
+
+    def expire(self, request):
+        if request.attempt < len(request.timeouts):
+            self.send(request)
+            return
+        self.pending.pop(request.request_id, None)
+        request.policy.record(None, request.attempt, request.hedged)
+        self.notify(request, None)
+
+    def notify(self, request, response):
+        try:
+            request.callback(response)
+        except Exception:
+            logger.exception("Callback of request failed")
+
+    def dispatch(self, response, address):
+        """Pass response received from address to it's request."""
+        try:
+            request_id = self.get_request_id(response)
+        except Exception as e:
+            logger.debug("Drop malformed message from %s: %s" %
+                         (address, e))
+            return
+        with self.lock:
+            request = self.pending.get(request_id)
+            if request is None or \
+                    request.address[1][:2] != address[:2]:
+                logger.debug("Drop unexpected response from %s" %
+                             (address, ))
+                return
+            del self.pending[request_id]
+            request.timer.cancel()
+        request.policy.record(time() - request.sent, request.attempt,
+                              request.hedged)
+        self.notify(request, response)
+
+    def expire_timers(self):
+        """Retransmit or fail requests which timers are expired."""
+        with self.lock:
+            expired = self.wheel.advance(time())
+            for callback in expired:
+                callback()
+
+    def fail_pending(self):
+        """Fail all requests in flight."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for request in pending.values():
+            self.notify(request, None)
+
+
+class Engine(AbstractEngine):
+    """Send requests through shared sockets, responses are read by own
+    thread.
+
+    """
+
+    def __init__(self, get_request_id, timeout_error=EngineTimeout):
+        super(Engine, self).__init__(get_request_id, timeout_error)
+        self.sockets = {}
+        self.thread = None
+        self.pid = os.getpid()
+
+    def get_socket(self, family):
+        sock = self.sockets.get(family)
+        if sock is None:
+            sock = self.sockets[family] = socket.socket(family,
+                                                        socket.SOCK_DGRAM)
+            sock.setblocking(False)
+        return sock
+
+    def sendto(self, family, data, sockaddr):
+        self.get_socket(family).sendto(data, sockaddr)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run,
+                                           name='snmp-orm-engine')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def request(self, address, build, policy):
+        """Send request and wait response."""
+        event = threading.Event()
+        result = []
+
+        def callback(response):
+            result.append(response)
+            event.set()
+
+        self.submit(address, build, policy, callback)
+        event.wait(sum(policy.timeouts()) + 1)
+        if not result or result[0] is None:
+            raise self.timeout_error('requestTimedOut')
+        return result[0]
+
+    def receive(self, sock):
+        while True:
+            try:
+                response, address = sock.recvfrom(65535)
+            except socket.error:
+                return
+            self.dispatch(response, address)
+
+    def run(self):
+        while not self.closed:
+            sockets = list(self.sockets.values())
+            try:
+                readable = select.select(sockets, [], [],
+                                         self.wheel.tick)[0]
+            except (select.error, socket.error, ValueError) as e:
+                if self.closed:
+                    break
+                logger.debug("Can't wait for responses: %s" % e)
+                continue
+            for sock in readable:
+                self.receive(sock)
+            self.expire_timers()
+
+    def close(self):
+        """Close sockets and fail requests in flight."""
+        with self.lock:
+            self.closed = True
+            for sock in self.sockets.values():
+                sock.close()
+            self.sockets.clear()
+        self.fail_pending()
+
+
+#: Engines by their keys.
+engines = {}
+engines_lock = threading.Lock()
+
+
+def get_engine(key, get_request_id, timeout_error=EngineTimeout):
+    """Return engine for given key, create it if it doesn't exist or was
+    created in other process.
+
+    """
+    engine = engines.get(key)
+    if engine is None or engine.closed or engine.pid != os.getpid():
+        with engines_lock:
+            engine = engines.get(key)
+            if engine is None or engine.closed or \
+                    engine.pid != os.getpid():
+                engine = engines[key] = Engine(get_request_id,
+                                               timeout_error)
+    return engine
@@ -0,0 +1,243 @@
+"""Limits of concurrency and rate of requests.
+
+Limiters are shared by all adapters of process: one per host and one per
+subnet of hosts. They are enabled by settings of adapter, so they could
+be set per device class by ``AdapterParams``:
+
+.. code-block:: python
+
+    class OldSwitch(DefaultDevice):
+
+        class AdapterParams:
+            concurrency = 1
+            rate = 20
+            subnet_concurrency = 8
+
+``concurrency`` limits requests in flight to host, ``rate`` limits
+requests per second to host with bursts of ``burst`` requests,
+``subnet_concurrency`` limits requests in flight to all hosts of subnet
+with prefix of ``subnet_prefix`` length.
+
+"""
+from __future__ import absolute_import
+
+import socket
+import functools
+from time import time
+from threading import Condition, Lock
+
+from snmp_orm.config import LIMIT_SUBNET_PREFIX, LIMIT_SUBNET_PREFIX6, \
+    TIMER_TICK
+from snmp_orm.utils import LazyModule
+
+netaddr = LazyModule('netaddr')
+
+#: Methods of sessions that send requests.
+REQUEST_METHODS = frozenset(['get', 'getnext', 'getbulk', 'set',
+                             'send_prepared'])
+
+
+class Limiter(object):
+    """Limit number of requests in flight and rate of requests by token
+    bucket, that holds up to ``burst`` tokens and is filled by ``rate``
+    tokens per second.
+
+    """
+
+    def __init__(self, concurrency=None, rate=None, burst=None):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst or max(1, rate or 0)
+        self.condition = Condition()
+        self.active = 0
+        self.tokens = self.burst
+        self.updated = time()
+        self.requests = 0
+        self.waits = 0
+
+    def take(self, now):
+        """Take token, return 0 or time to wait for it."""
+        if not self.rate:
+            return 0
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def full(self):
+        return self.concurrency is not None and \
+            self.active >= self.concurrency
+
+    def poll(self):
+        """Try to start request without waiting, return None if request
+        is started or time after which it's worth to try again.
+
+        """
+        with self.condition:
+            if self.full():
+                return TIMER_TICK
+            delay = self.take(time())
+            if delay:
+                return delay
+            self.active += 1
+            self.requests += 1
+            return None
+
+    def acquire(self):
+        """Wait until request could be started."""
+        with self.condition:
+            waited = False
+            while True:
+                if self.full():
+                    self.condition.wait()
+                else:
+                    delay = self.take(time())
+                    if not delay:
+                        break
+                    self.condition.wait(delay)
+                waited = True
+            self.active += 1
+            self.requests += 1
+            if waited:
+                self.waits += 1
+
+    def release(self):
+        """Finish request."""
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    def stats(self):
+        return {'active': self.active,
+                'requests': self.requests,
+                'waits': self.waits}
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, self.stats())
+
+
+class LimitedSession(object):
+    """Proxy of session, that passes requests through limiters."""
+
+    def __init__(self, session, limiters):
+        self.session = session
+        self.limiters = limiters
+
+    def __getattr__(self, name):
+        value = getattr(self.session, name)
+        if name in REQUEST_METHODS:
+            value = self.limit(value)
+        return value
+
+    def limit(self, method):
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            acquired = []
+            try:
+                for limiter in self.limiters:
+                    limiter.acquire()
+                    acquired.append(limiter)
+                return method(*args, **kwargs)
+            finally:
+                self.release(acquired)
+
+        return wrapper
+
+    def release(self, acquired):
+        for limiter in reversed(acquired):
+            limiter.release()
+
+
+def parse_address(host):
+    """Return IP address if host is given by address or None."""
+    try:
+        return netaddr.IPAddress(host)
+    except (netaddr.AddrFormatError, ValueError):
+        return None
+
+
+def get_subnet(host, prefix=LIMIT_SUBNET_PREFIX):
+    """Return subnet of host's address or host itself if it can't be
+    resolved.
+
+    """
+    address = parse_address(host)
+    if address is None:
+        try:
+            address = netaddr.IPAddress(
+                socket.getaddrinfo(host, None)[0][4][0])
+        except (socket.error, netaddr.AddrFormatError, ValueError):
+            return host
+    if address.version == 6:
+        prefix = max(prefix, LIMIT_SUBNET_PREFIX6)
+    return str(netaddr.IPNetwork('%s/%d' % (address, prefix)).cidr)
+
+
+#: Limiters by keys.
+limiters = {}
+limiters_lock = Lock()
+
+
+def get_limiter(key, concurrency=None, rate=None, burst=None):
+    """Return limiter for given key and limits, create it if it doesn't
+    exist.
+
+    """
+    key = (key, concurrency, rate, burst)
+    try:
+        return limiters[key]
+    except KeyError:
+        with limiters_lock:
+            if key not in limiters:
+                limiters[key] = Limiter(concurrency, rate, burst)
+            return limiters[key]
+
+
+class UnresolvedLimiter(object):
+    """Placeholder of limiter of subnet of host given by name. Session
+    replaces it by real limiter after address of host is resolved.
+
+    """
+
+    def __init__(self, host, prefix, concurrency):
+        self.host = host
+        self.prefix = prefix
+        self.concurrency = concurrency
+
+    def resolve(self, address):
+        """Return limiter of subnet of given address of host."""
+        return get_limiter(("subnet", get_subnet(address, self.prefix)),
+                           self.concurrency)
+
+
+def get_limiters(settings, resolve=True):
+    """Return limiters required by given settings. Without ``resolve`` host
+    given by name isn't resolved, :class:`UnresolvedLimiter` is returned
+    instead of limiter of it's subnet.
+
+    """
+    result = []
+    host = settings["host"]
+    if settings.get("concurrency") or settings.get("rate"):
+        result.append(get_limiter(("host", host),
+                                  settings.get("concurrency"),
+                                  settings.get("rate"),
+                                  settings.get("burst")))
+    if settings.get("subnet_concurrency"):
+        prefix = settings.get("subnet_prefix") or LIMIT_SUBNET_PREFIX
+        limiter = UnresolvedLimiter(host, prefix,
+                                    settings["subnet_concurrency"])
+        if resolve or parse_address(host) is not None:
+            limiter = limiter.resolve(host)
+        result.append(limiter)
+    return result
+
+
+def stats():
+    """Return counters of limiters by keys."""
+    return dict((key, limiter.stats())
+                for key, limiter in list(limiters.items()))
@@ -0,0 +1,132 @@
+"""Plans of requests that load many fields at once.
+
+Plan sorts fields to scalars and table columns and packs them into as few
+requests as possible. If there are columns to walk, scalars are requested
+as non-repeaters of the first GETBULK request, so group that contains both
+kinds of fields is usually loaded by one round trip:
+
+.. code-block:: python
+
+    group = DefaultDevice.meta.groups['ifTable']
+    plan = Plan([('ifNumber', ifNumber), ('ifDescr', group['ifDescr'])])
+    print(dict(plan.execute(adapter)))
+
+Plans don't depend on adapter, so devices build them once per class, see
+:meth:`snmp_orm.devices.base.DeviceMeta.get_plan`.
+
+"""
+from __future__ import absolute_import
+
+from snmp_orm.config import BATCH_MAX_VARBINDS, BATCH_MAX_SIZE
+from snmp_orm.fields import TableField
+from snmp_orm.adapters.batch import chunks
+
+
+class Plan(object):
+    """Requests to load given (key, field) pairs. Scalar fields are loaded
+    by GET requests or as non-repeaters of the first GETBULK request, table
+    fields are walked in lockstep. Each GET request contains no more than
+    ``max_varbinds`` variables and no more than ``max_size`` bytes of
+    encoded variables.
+
+    """
+
+    def __init__(self, items, max_varbinds=BATCH_MAX_VARBINDS,
+                 max_size=BATCH_MAX_SIZE):
+        self.scalars = []
+        self.columns = []
+        for key, field in items:
+            if isinstance(field, TableField):
+                self.columns.append((key, field))
+            else:
+                self.scalars.append((key, field))
+
+        # Scalar instance ``x.0`` is the next variable after ``x``, so it's
+        # requested by GETNEXT semantics of non-repeater.
+        budget = max_varbinds - len(self.columns) if self.columns else 0
+        self.next_scalars = [(key, field) for key, field in self.scalars
+                             if field.oid[-1] == 0][:max(budget, 0)]
+        self.next_oids = [field.oid[:-1] for _, field in self.next_scalars]
+        self.column_oids = [field.oid for _, field in self.columns]
+
+        next_keys = set(key for key, _ in self.next_scalars)
+        rest = [(key, field) for key, field in self.scalars
+                if key not in next_keys]
+        self.bulk_gets = self.split(rest, max_varbinds, max_size)
+        self.gets = self.split(self.scalars, max_varbinds, max_size)
+
+    @staticmethod
+    def split(scalars, max_varbinds, max_size):
+        """Split scalars to lists that fit to one GET request."""
+        result, position = [], 0
+        for chunk in chunks([(field.oid, None) for _, field in scalars],
+                            max_varbinds, max_size):
+            result.append(scalars[position:position + len(chunk)])
+            position += len(chunk)
+        return result
+
+    def use_bulk(self, adapter):
+        """Return True if scalars should be requested together with first
+        rows of columns.
+
+        """
+        settings = adapter.settings_read
+        return bool(self.columns and self.next_scalars and
+                    settings["use_bulk"] and settings["version"] != 1)
+
+    def execute(self, adapter):
+        """Send requests, return list of (key, value) pairs, scalars go
+        first. Value of table field is dictionary of row index to value.
+        With asynchronous adapter returned value should be awaited.
+
+        """
+        bulk = self.use_bulk(adapter)
+        gets = self.bulk_gets if bulk else self.gets
+        values = {}
+
+        def get(position):
+            if position < len(gets):
+                return adapter.then(
+                    adapter.get(*[field.oid for _, field in gets[position]]),
+                    lambda variables: collect_get(position, variables))
+            if bulk:
+                return adapter.then(
+                    adapter.getbulk(None, *(self.next_oids + self.column_oids),
+                                    non_repeaters=len(self.next_oids)),
+                    collect_bulk)
+            if self.columns:
+                return adapter.then(adapter.walk_many(self.column_oids),
+                                    collect_columns)
+            return result()
+
+        def collect_get(position, variables):
+            variables = dict(variables)
+            for key, field in gets[position]:
+                values[key] = field.prepare(variables.get(field.oid))
+            return get(position + 1)
+
+        def collect_bulk(variables):
+            count = len(self.next_oids)
+            for (key, field), (oid, value) in zip(self.next_scalars,
+                                                  variables[:count]):
+                values[key] = field.prepare(value if oid == field.oid
+                                            else None)
+            return adapter.then(
+                adapter.walk_many(self.column_oids, variables[count:]),
+                collect_columns)
+
+        def collect_columns(columns):
+            for (key, field), rows in zip(self.columns, columns):
+                values[key] = dict((field.get_index(oid), field.form(value))
+                                   for oid, value in rows)
+            return result()
+
+        def result():
+            return [(key, values.get(key))
+                    for key, _ in self.scalars + self.columns]
+
+        return get(0)
+
+    def __repr__(self):
+        return '<%s scalars=%d columns=%d>' % (
+            type(self).__name__, len(self.scalars), len(self.columns))
@@ -0,0 +1,196 @@
+"""Policies of request retransmission.
+
+Policy decides how long to wait for each attempt of request and whether
+to send duplicate (hedged) request before timeout. Policies are kept per
+host (or per custom ``policy_key`` setting) for whole process, their
+counters could be inspected by :func:`stats`:
+
+.. code-block:: python
+
+    adapter = get_adapter(host, class_name='snmp_orm.adapters.ber',
+                          hedge=95)
+    print(adapter.policy.stats())
+
+Adapters with own transports (:mod:`snmp_orm.adapters.ber` and
+:mod:`snmp_orm.adapters.asyncio`) follow policy, pysnmp adapter only reports
+round-trip times to it, because pysnmp retransmits requests by itself.
+
+"""
+from __future__ import absolute_import
+
+from threading import Lock
+from collections import deque
+
+from six import iteritems
+
+from snmp_orm.config import SNMP_TIMEOUT, SNMP_RETRIES, DEFAULT_POLICY, \
+    RTO_MIN, RTO_MAX, RTO_BACKOFF, RTO_MAX_TOTAL, HEDGE_BUDGET, \
+    HEDGE_MIN_SAMPLES
+from snmp_orm.utils import symbol_by_name
+
+
+class Policy(object):
+    """Fixed timeout for each attempt, no hedged requests."""
+
+    def __init__(self, timeout=SNMP_TIMEOUT, retries=SNMP_RETRIES,
+                 hedge=None):
+        self.timeout = timeout
+        self.retries = retries
+        self.hedge = hedge
+        self.lock = Lock()
+        self.requests = 0
+        self.failures = 0
+        self.retransmissions = 0
+        self.hedges = 0
+
+    def timeouts(self):
+        """Return list of timeouts for each attempt."""
+        return [self.timeout] * (self.retries + 1)
+
+    def hedge_delay(self, timeout):
+        """Return delay after which duplicate of first attempt should be
+        sent or None.
+
+        """
+        return None
+
+    def record(self, rtt, attempts=1, hedged=False):
+        """Record result of request: round-trip time of last attempt or
+        None if all attempts are timed out.
+
+        """
+        with self.lock:
+            self.requests += 1
+            self.retransmissions += attempts - 1
+            if hedged:
+                self.hedges += 1
+            if rtt is None:
+                self.failures += 1
+
+    def stats(self):
+        return {'requests': self.requests,
+                'failures': self.failures,
+                'retransmissions': self.retransmissions,
+                'hedges': self.hedges}
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, self.stats())
+
+
+class AdaptivePolicy(Policy):
+    """Estimate retransmission timeout by smoothed round-trip time like TCP
+    does (RFC 6298), double timeout for each next attempt. Round-trip times
+    of retransmitted and hedged requests aren't sampled, because it's
+    unknown which copy was answered. All attempts of request take no more
+    than ``max_total`` seconds, by default no more than attempts of fixed
+    policy, so unreachable hosts aren't waited for longer.
+
+    If ``hedge`` percentile is given, duplicate of request is sent when
+    response isn't received in this percentile of recent round-trip times.
+    No more than ``HEDGE_BUDGET`` part of requests are hedged.
+
+    """
+
+    #: Gains of smoothed round-trip time and it's variation.
+    alpha = 1.0 / 8
+    beta = 1.0 / 4
+
+    def __init__(self, timeout=SNMP_TIMEOUT, retries=SNMP_RETRIES,
+                 hedge=None, min_timeout=RTO_MIN, max_timeout=RTO_MAX,
+                 backoff=RTO_BACKOFF, max_total=RTO_MAX_TOTAL):
+        super(AdaptivePolicy, self).__init__(timeout, retries, hedge)
+        self.min_timeout = min(min_timeout, timeout)
+        self.max_timeout = max(max_timeout, timeout)
+        self.backoff = backoff
+        self.max_total = max_total or timeout * (retries + 1)
+        self.srtt = None
+        self.rttvar = None
+        self.penalty = 1
+        self.samples = deque(maxlen=100)
+
+    @property
+    def rto(self):
+        """Current retransmission timeout."""
+        if self.srtt is None:
+            rto = self.timeout
+        else:
+            rto = self.srtt + 4 * self.rttvar
+        rto = max(self.min_timeout, rto * self.penalty)
+        return min(self.max_timeout, rto)
+
+    def timeouts(self):
+        rto = self.rto
+        budget = self.max_total
+        result = []
+        for attempt in range(self.retries + 1):
+            timeout = min(self.max_timeout, rto * self.backoff ** attempt,
+                          budget)
+            # remainder of budget that is shorter than minimal timeout
+            # isn't worth one more attempt
+            if timeout <= 0 or (result and timeout < self.min_timeout):
+                break
+            result.append(timeout)
+            budget -= timeout
+        return result
+
+    def hedge_delay(self, timeout):
+        if not self.hedge or len(self.samples) < HEDGE_MIN_SAMPLES or \
+                self.hedges >= self.requests * HEDGE_BUDGET:
+            return None
+        samples = sorted(self.samples)
+        position = int(len(samples) * self.hedge / 100.0)
+        delay = samples[min(position, len(samples) - 1)]
+        return delay if delay < timeout else None
+
+    def record(self, rtt, attempts=1, hedged=False):
+        super(AdaptivePolicy, self).record(rtt, attempts, hedged)
+        with self.lock:
+            if rtt is None:
+                # keep backed off timeout until next sample
+                self.penalty = min(self.penalty * self.backoff,
+                                   self.backoff ** self.retries)
+            elif attempts == 1 and not hedged:
+                self.sample(rtt)
+
+    def sample(self, rtt):
+        self.penalty = 1
+        self.samples.append(rtt)
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2.0
+        else:
+            self.rttvar = (1 - self.beta) * self.rttvar + \
+                self.beta * abs(self.srtt - rtt)
+            self.srtt = (1 - self.alpha) * self.srtt + self.alpha * rtt
+
+    def stats(self):
+        result = super(AdaptivePolicy, self).stats()
+        result.update(srtt=self.srtt, rto=self.rto)
+        return result
+
+
+#: Policies by keys.
+policies = {}
+policies_lock = Lock()
+
+
+def get_policy(key, policy_cls=DEFAULT_POLICY, **kwargs):
+    """Return policy of given class for given key and arguments, create it
+    if it doesn't exist.
+
+    """
+    policy_cls = symbol_by_name(policy_cls)
+    key = (key, policy_cls, tuple(sorted(iteritems(kwargs))))
+    try:
+        return policies[key]
+    except KeyError:
+        with policies_lock:
+            if key not in policies:
+                policies[key] = policy_cls(**kwargs)
+            return policies[key]
+
+
+def stats():
+    """Return counters of policies by keys."""
+    return dict((key, policy.stats())
+                for key, policy in list(policies.items()))
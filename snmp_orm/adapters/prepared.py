@@ -0,0 +1,86 @@
+"""GET requests prepared once for fixed list of variables."""
+from __future__ import absolute_import
+
+from six import iteritems
+from pyasn1.type.univ import Null
+
+from snmp_orm.fields import Field, Group, TableField
+from snmp_orm.utils import str_to_oid
+
+
+class PreparedRequest(object):
+    """GET request for fixed list of variables, that is prepared once and
+    could be sent many times. Items of request are scalar fields, groups
+    (their table fields are skipped) or OIDs:
+
+    .. code-block:: python
+
+        request = adapter.prepare(DefaultDevice.meta.groups['system'],
+                                  '1.3.6.1.2.1.2.1.0')
+        while True:
+            print(dict(request.send()))
+            time.sleep(30)
+
+    Adapters could override it to encode request once too.
+
+    """
+
+    def __init__(self, adapter, items):
+        self.adapter = adapter
+        self.keys = []
+        self.fields = []
+        self.oids = []
+        for item in items:
+            if isinstance(item, Group):
+                self.add_group(item.fields)
+            elif isinstance(item, dict):
+                self.add_group(item)
+            elif isinstance(item, TableField):
+                raise TypeError("Table field %r can't be prepared" % item)
+            elif isinstance(item, Field):
+                self.add(item, item, item.oid)
+            else:
+                oid = str_to_oid(item)
+                self.add(oid, None, oid)
+        self.oids = tuple(self.oids)
+
+    def add(self, key, field, oid):
+        self.keys.append(key)
+        self.fields.append(field)
+        self.oids.append(oid)
+
+    def add_group(self, fields):
+        for name, field in sorted(iteritems(fields)):
+            if not isinstance(field, TableField):
+                self.add(name, field, field.oid)
+
+    def get(self):
+        """Send request, return list of variables."""
+        return self.adapter.get(*self.oids)
+
+    def send(self):
+        """Send request, return list of (key, value) pairs in order of
+        prepared items. Key is name of field for group's fields, field or
+        OID itself otherwise. With asynchronous adapter returned value should
+        be awaited.
+
+        """
+        return self.adapter.then(self.get(), self.match)
+
+    def match(self, variables):
+        """Match variables of response to prepared items by position."""
+        if len(variables) == len(self.oids) and \
+                all(oid == variable[0]
+                    for oid, variable in zip(self.oids, variables)):
+            values = [value for _, value in variables]
+        else:
+            found = dict(variables)
+            values = [found.get(oid) for oid in self.oids]
+        result = []
+        for key, field, value in zip(self.keys, self.fields, values):
+            if field is not None:
+                value = field.prepare(value)
+            elif isinstance(value, Null):
+                value = None
+            result.append((key, value))
+        return result
@@ -1,23 +1,75 @@
 """Abstract adapter class."""
 from __future__ import absolute_import
 
+import time
+import threading
+
 from pysnmp import error as pysnmp_error
+from pysnmp.proto import errind
 from pysnmp.entity.rfc3413.oneliner.cmdgen import CommunityData, UsmUserData, \
-    UdpTransportTarget, CommandGenerator
+    UdpTransportTarget, CommandGenerator, AsynCommandGenerator
 
+from snmp_orm.config import SNMP_TIMEOUT, SNMP_RETRIES
 from snmp_orm.utils import str_to_oid
-from snmp_orm.adapters.base import AbstractAdapter, AbstractException
+from snmp_orm.adapters import usm
+from snmp_orm.adapters.usm import get_engine_cache
+from snmp_orm.adapters.base import AbstractAdapter, AbstractException, \
+    TimeoutException, TooBigException
 
 
 class PySNMPError(AbstractException):
     pass
 
 
+class PySNMPTimeout(PySNMPError, TimeoutException):
+    pass
+
+
+class PySNMPTooBig(PySNMPError, TooBigException):
+    pass
+
+
+class PySNMPStaleEngine(PySNMPError):
+    pass
+
+
+#: Reports of agent, after which engine parameters should be discovered
+#: again.
+STALE_ENGINE_INDICATIONS = (errind.unknownEngineID, errind.notInTimeWindow)
+
+
 class AbstractSession(object):
-    def __init__(self, host, port=None):
-        self.transportTarget = UdpTransportTarget((host, port))
+    """Blocking session of pysnmp. Pooled session is shared by threads,
+    but dispatcher of pysnmp isn't thread-safe, so requests are sent one
+    by one under lock.
+
+    """
+
+    def __init__(self, host, port=None, timeout=SNMP_TIMEOUT,
+                 retries=SNMP_RETRIES, policy=None):
+        self.transportTarget = UdpTransportTarget((host, port),
+                                                  timeout, retries)
         self.authData = None
-        self.generator = CommandGenerator()
+        self.async_generator = AsynCommandGenerator()
+        self.generator = CommandGenerator(asynCmdGen=self.async_generator)
+        self.lock = threading.RLock()
+        self.timeout = timeout
+        self.retries = retries
+        self.policy = policy
+
+    def record(self, started, errorIndication):
+        """Report round-trip time of request to policy. pysnmp retransmits
+        requests by itself, so number of attempts is guessed by time.
+
+        """
+        if self.policy is None:
+            return
+        if isinstance(errorIndication, errind.RequestTimedOut):
+            self.policy.record(None, self.retries + 1)
+        elif not errorIndication:
+            elapsed = time.time() - started
+            attempts = min(self.retries + 1, int(elapsed // self.timeout) + 1)
+            self.policy.record(elapsed, attempts)
 
     def format_varBinds(self, varBinds):
         return [(str_to_oid(oid), value) for oid, value in varBinds]
@@ -31,76 +83,181 @@ class AbstractSession(object):
     def handle_error(self, errorIndication, errorStatus, errorIndex,
                      varBinds=None, varBindTable=None):
         if errorIndication:
+            if isinstance(errorIndication, errind.RequestTimedOut):
+                raise PySNMPTimeout(errorIndication)
             raise PySNMPError(errorIndication)
         elif errorStatus:
             variables = varBinds or varBindTable[-1]
             text = errorStatus.prettyPrint()
             position = errorIndex and variables[int(errorIndex) - 1] or '?'
-            raise PySNMPError("%s at %s" % (text, position))
+            error_cls = PySNMPTooBig if errorStatus == 1 else PySNMPError
+            status = errorStatus.getNamedValues().getName(errorStatus)
+            raise error_cls("%s at %s" % (text, position),
+                            status=status or text,
+                            index=int(errorIndex or 0))
 
     def get(self, *args):
+        started = time.time()
         try:
-            errorIndication, errorStatus, \
-                errorIndex, varBinds = self.generator.getCmd(
-                    self.authData, self.transportTarget, *args)
+            with self.lock:
+                errorIndication, errorStatus, \
+                    errorIndex, varBinds = self.generator.getCmd(
+                        self.authData, self.transportTarget, *args)
         except pysnmp_error.PySnmpError as e:
             # handle origin PySNMPError from pysnmp module.
             errorIndication = e
             errorStatus, errorIndex, varBinds = None, None, []
 
+        self.record(started, errorIndication)
         self.handle_error(errorIndication, errorStatus, errorIndex, varBinds)
         return self.format_varBinds(varBinds)
 
     def set(self, *args):
-        errorIndication, errorStatus, \
-            errorIndex, varBinds = self.generator.setCmd(
-                self.authData, self.transportTarget, *args)
+        started = time.time()
+        try:
+            with self.lock:
+                errorIndication, errorStatus, \
+                    errorIndex, varBinds = self.generator.setCmd(
+                        self.authData, self.transportTarget, *args)
+        except pysnmp_error.PySnmpError as e:
+            errorIndication = e
+            errorStatus, errorIndex, varBinds = None, None, []
+
+        self.record(started, errorIndication)
         self.handle_error(errorIndication, errorStatus, errorIndex, varBinds)
         return self.format_varBinds(varBinds)
 
     def getnext(self, *args):
-        errorIndication, errorStatus, errorIndex, \
-            varBindTable = self.generator.nextCmd(
-                self.authData, self.transportTarget, *args)
+        with self.lock:
+            errorIndication, errorStatus, errorIndex, \
+                varBindTable = self.generator.nextCmd(
+                    self.authData, self.transportTarget, *args)
         self.handle_error(
             errorIndication, errorStatus, errorIndex, None, varBindTable)
         return self.format_varBindTable(varBindTable)
 
-    def getbulk(self, rows, *args):
-        errorIndication, errorStatus, errorIndex, \
-            varBindTable = self.generator.bulkCmd(
-                self.authData, self.transportTarget, 0, rows, *args)
+    def getbulk(self, rows, *args, **kwargs):
+        # Synchronous bulkCmd of pysnmp sends requests until all columns
+        # leave their subtrees, so asynchronous one is used: callback
+        # returns nothing and exactly one request is sent, walkers do
+        # the paging.
+        def cbFun(sendRequestHandle, errorIndication, errorStatus,
+                  errorIndex, varBindTable, appReturn):
+            appReturn.extend([errorIndication, errorStatus, errorIndex,
+                              varBindTable])
+
+        non_repeaters = kwargs.get('non_repeaters', 0)
+        appReturn = []
+        with self.lock:
+            self.async_generator.bulkCmd(
+                self.authData, self.transportTarget, non_repeaters, rows,
+                args, (cbFun, appReturn))
+            self.async_generator.snmpEngine.transportDispatcher \
+                .runDispatcher()
+        errorIndication, errorStatus, errorIndex, varBindTable = appReturn
         self.handle_error(
             errorIndication, errorStatus, errorIndex, None, varBindTable)
+        if non_repeaters and varBindTable:
+            # Each row of table starts with values of non-repeaters, they
+            # are taken once from first row.
+            return self.format_varBinds(varBindTable[0][:non_repeaters]) + \
+                self.format_varBindTable(
+                    [varBinds[non_repeaters:] for varBinds in varBindTable])
         return self.format_varBindTable(varBindTable)
 
 
 class Session(AbstractSession):
-    def __init__(self, host, port, version, community):
-        super(Session, self).__init__(host, port)
+    def __init__(self, host, port, version, community,
+                 timeout=SNMP_TIMEOUT, retries=SNMP_RETRIES, policy=None):
+        super(Session, self).__init__(host, port, timeout, retries, policy)
         self.authData = CommunityData(
             'agent', community, None if version == 2 else 0)
 
 
 class UsmSession(AbstractSession):
+    """SNMPv3 session, that takes engine parameters of agent and keys of
+    user from shared caches, see :mod:`snmp_orm.adapters.usm`.
+
+    """
 
     def __init__(self, host, port=None, sec_name=None, sec_level=None,
                 auth_protocol=None, auth_passphrase=None,
-                priv_protocol=None, priv_passphrase=None):
-        super(UsmSession, self).__init__(host, port)
+                priv_protocol=None, priv_passphrase=None,
+                timeout=SNMP_TIMEOUT, retries=SNMP_RETRIES, policy=None,
+                engine_cache=None):
+        super(UsmSession, self).__init__(host, port, timeout, retries,
+                                         policy)
         self.authData = UsmUserData(sec_name, auth_passphrase, priv_passphrase)
+        usm.cache_keys()
+        self.engine_key = (host, port)
+        self.engine_cache = get_engine_cache(engine_cache)
+        self.transport = (self.transportTarget.transportDomain,
+                          self.transportTarget.transportAddr)
+        self.restored = False
+        self.restore_engine()
+
+    def restore_engine(self):
+        engine = self.engine_cache.get(self.engine_key)
+        if engine is not None:
+            self.restored = usm.restore(self.generator.snmpEngine,
+                                        self.transport, engine)
+
+    def handle_error(self, errorIndication, errorStatus, errorIndex,
+                     varBinds=None, varBindTable=None):
+        if errorIndication in STALE_ENGINE_INDICATIONS:
+            self.engine_cache.invalidate(self.engine_key)
+            usm.forget(self.generator.snmpEngine, self.transport)
+            if self.restored:
+                self.restored = False
+                raise PySNMPStaleEngine(errorIndication)
+        elif not errorIndication:
+            engine = usm.capture(self.generator.snmpEngine, self.transport)
+            if engine is not None:
+                self.engine_cache.put(self.engine_key, engine)
+        super(UsmSession, self).handle_error(
+            errorIndication, errorStatus, errorIndex, varBinds, varBindTable)
+
+    def rediscover(self, method, *args, **kwargs):
+        """Send request again with discovery if cached parameters of engine
+        are stale. Parameters of engine are captured and restored under
+        lock too.
+
+        """
+        with self.lock:
+            try:
+                return method(*args, **kwargs)
+            except PySNMPStaleEngine:
+                return method(*args, **kwargs)
+
+    def get(self, *args):
+        return self.rediscover(super(UsmSession, self).get, *args)
+
+    def set(self, *args):
+        return self.rediscover(super(UsmSession, self).set, *args)
+
+    def getnext(self, *args):
+        return self.rediscover(super(UsmSession, self).getnext, *args)
+
+    def getbulk(self, rows, *args, **kwargs):
+        return self.rediscover(super(UsmSession, self).getbulk, rows,
+                               *args, **kwargs)
 
 
 class Adapter(AbstractAdapter):
 
-    def get_snmp_v2_session(self, host, port, version, community, **kwargs):
+    def get_snmp_v2_session(self, host, port, version, community,
+                            timeout=SNMP_TIMEOUT, retries=SNMP_RETRIES,
+                            policy=None, **kwargs):
         if community is None:
             raise TypeError("community can`t be None")
-        return Session(host, port, version, community)
+        return Session(host, port, version, community, timeout, retries,
+                       policy)
 
     def get_snmp_v3_session(self, host, port, version, sec_name, sec_level,
                                    auth_protocol, auth_passphrase,
-                                   priv_protocol, priv_passphrase, **kwargs):
+                                   priv_protocol, priv_passphrase,
+                                   timeout=SNMP_TIMEOUT, retries=SNMP_RETRIES,
+                                   policy=None, engine_cache=None, **kwargs):
         if sec_name is None:
             raise TypeError("sec_name can`t be None")
         if auth_passphrase is None:
@@ -109,4 +266,5 @@ class Adapter(AbstractAdapter):
             raise TypeError("priv_passphrase can`t be None")
         return UsmSession(host, port, sec_name, sec_level,
                           auth_protocol, auth_passphrase,
-                          priv_protocol, priv_passphrase)
+                          priv_protocol, priv_passphrase,
+                          timeout, retries, policy, engine_cache)
@@ -0,0 +1,89 @@
+"""Adaptive tuning of max-repetitions for GETBULK requests.
+
+Tuners are kept per host (or per custom ``tuning_key`` setting, e.g. per
+device class) for whole process, so learned values survive recreation of
+adapters and could be inspected by :func:`stats`.
+
+"""
+from __future__ import absolute_import
+
+from threading import Lock
+
+from pysnmp.proto.rfc1905 import EndOfMibView
+
+from snmp_orm.config import BULK_ROW, BULK_ROW_MIN, BULK_ROW_MAX, \
+    BULK_FAST_RESPONSE
+
+
+class BulkRowsTuner(object):
+    """Tune max-repetitions by responses of device: grow value while
+    responses are fast and complete, halve it on tooBig, timeouts and
+    truncated responses.
+
+    """
+
+    def __init__(self, value=BULK_ROW, minimum=BULK_ROW_MIN,
+                 maximum=BULK_ROW_MAX, fast=BULK_FAST_RESPONSE):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.fast = fast
+        self.value = max(minimum, min(maximum, value))
+        self.grows = 0
+        self.shrinks = 0
+
+    def grow(self):
+        value = min(self.maximum, self.value + max(1, self.value // 4))
+        if value != self.value:
+            self.value = value
+            self.grows += 1
+
+    def shrink(self, value=None):
+        """Decrease value, return False if it's minimal already."""
+        if self.value <= self.minimum:
+            return False
+        if value is None:
+            value = self.value // 2
+        self.value = max(self.minimum, min(self.value - 1, value))
+        self.shrinks += 1
+        return True
+
+    def feedback(self, rows, columns, result, elapsed):
+        """Update value by successful response of GETBULK request with
+        given max-repetitions for given number of columns.
+
+        """
+        requested = rows * columns
+        if len(result) < requested:
+            if result and not isinstance(result[-1][1], EndOfMibView):
+                # agent has cut response to fit in message
+                self.shrink(len(result) // columns)
+        elif elapsed <= self.fast:
+            self.grow()
+
+    def __repr__(self):
+        return '<%s value=%d grows=%d shrinks=%d>' % (
+            type(self).__name__, self.value, self.grows, self.shrinks)
+
+
+#: Tuners by keys.
+tuners = {}
+tuners_lock = Lock()
+
+
+def get_tuner(key, value=BULK_ROW):
+    """Return tuner for given key, create it with given initial value if
+    it doesn't exist.
+
+    """
+    try:
+        return tuners[key]
+    except KeyError:
+        with tuners_lock:
+            if key not in tuners:
+                tuners[key] = BulkRowsTuner(value)
+            return tuners[key]
+
+
+def stats():
+    """Return learned max-repetitions by keys."""
+    return dict((key, tuner.value) for key, tuner in list(tuners.items()))
@@ -0,0 +1,295 @@
+"""Caches of SNMPv3 engines and keys of users.
+
+Before the first request to agent SNMPv3 session discovers engineID,
+boots and time of agent's engine by additional round trip. Discovered
+parameters are kept per (host, port) by cache shared by all sessions of
+process, so new sessions start without discovery. Cache could be stored to
+file and loaded again after restart of process by ``engine_cache`` setting
+or ``USM_ENGINE_CACHE`` option. File is rewritten after every
+``USM_ENGINE_CACHE_BATCH`` changes and at exit of process:
+
+.. code-block:: python
+
+    device = get_device(host, version=3, sec_name='user',
+                        auth_passphrase='secret', priv_passphrase='secret',
+                        engine_cache='/var/cache/snmp_orm/engines.json')
+
+Parameters of engine are forgotten when agent reports unknownEngineID or
+notInTimeWindow, so they are discovered again.
+
+Keys of users are derived from passphrases by hashing of megabyte of data,
+so hashed passphrases and keys localized for engines are memoized too.
+Sessions with the same credentials derive them once, see
+:func:`cache_keys`.
+
+"""
+from __future__ import absolute_import
+
+import atexit
+import hashlib
+import binascii
+from time import time
+from threading import Lock
+from collections import namedtuple
+
+from pyasn1.type import univ
+from pysnmp.entity import config as pysnmp_config
+from pysnmp.proto.secmod.rfc3414.service import SnmpUSMSecurityModel
+
+from snmp_orm.config import USM_ENGINE_CACHE, USM_ENGINE_TTL, \
+    USM_ENGINE_CACHE_BATCH, USM_KEY_CACHE_SIZE
+from snmp_orm.utils import LRUCache, load_json, save_json
+
+#: Parameters of agent's engine: engineID of security and context, name of
+#: context, boots and time of engine at ``updated`` moment.
+Engine = namedtuple('Engine', ('engine_id', 'context_engine_id',
+                               'context_name', 'boots', 'time', 'updated'))
+
+#: Greatest value of snmpEngineTime.
+ENGINE_TIME_MAX = 2147483647
+
+
+def to_hex(value):
+    return binascii.hexlify(value).decode('ascii')
+
+
+def from_hex(value):
+    return binascii.unhexlify(value.encode('ascii'))
+
+
+class EngineCache(object):
+    """Parameters of engines by (host, port). Cache is stored to ``path``
+    after ``batch`` engines are discovered or forgotten, but change of only
+    engine's time isn't counted, because time is estimated by clock. Call
+    :meth:`save` to store the rest.
+
+    """
+
+    def __init__(self, path=None, ttl=USM_ENGINE_TTL,
+                 batch=USM_ENGINE_CACHE_BATCH):
+        self.path = path
+        self.ttl = ttl
+        self.batch = batch
+        self.lock = Lock()
+        self.engines = {}
+        self.changed = 0
+        self.hits = 0
+        self.misses = 0
+        if path is not None:
+            self.load()
+
+    def get(self, key, now=None):
+        """Return parameters of engine or None if they are unknown or
+        expired.
+
+        """
+        now = time() if now is None else now
+        engine = self.engines.get(key)
+        if engine is None or now - engine.updated > self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return engine
+
+    def put(self, key, engine):
+        with self.lock:
+            previous = self.engines.get(key)
+            self.engines[key] = engine
+        if previous is None or previous[:4] != engine[:4]:
+            self.change()
+
+    def invalidate(self, key):
+        with self.lock:
+            engine = self.engines.pop(key, None)
+        if engine is not None:
+            self.change()
+
+    def change(self):
+        """Count change of cache, store it if there are enough of them."""
+        with self.lock:
+            self.changed += 1
+            full = self.changed >= self.batch
+        if full:
+            self.save()
+
+    def load(self):
+        items = load_json(self.path) or []
+        now = time()
+        with self.lock:
+            for host, port, engine_id, context_engine_id, context_name, \
+                    boots, engine_time, updated in items:
+                if now - updated > self.ttl:
+                    continue
+                self.engines[(host, port)] = Engine(
+                    from_hex(engine_id), from_hex(context_engine_id),
+                    from_hex(context_name), boots, engine_time, updated)
+
+    def save(self):
+        if self.path is None:
+            return
+        with self.lock:
+            self.changed = 0
+            items = [[host, port, to_hex(engine.engine_id),
+                      to_hex(engine.context_engine_id),
+                      to_hex(engine.context_name), engine.boots,
+                      engine.time, engine.updated]
+                     for (host, port), engine in self.engines.items()]
+        save_json(self.path, items)
+
+    def stats(self):
+        return {'engines': len(self.engines),
+                'hits': self.hits,
+                'misses': self.misses}
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, self.stats())
+
+
+#: Caches by paths of files.
+caches = {}
+caches_lock = Lock()
+
+
+def get_engine_cache(path=None):
+    """Return cache stored to given file or to ``USM_ENGINE_CACHE``, create
+    it if it doesn't exist.
+
+    """
+    path = path or USM_ENGINE_CACHE
+    try:
+        return caches[path]
+    except KeyError:
+        with caches_lock:
+            if path not in caches:
+                caches[path] = EngineCache(path)
+            return caches[path]
+
+
+@atexit.register
+def save_engine_caches():
+    """Store changes of all caches that weren't stored yet."""
+    for cache in list(caches.values()):
+        if cache.changed:
+            cache.save()
+
+
+def get_tables(snmp_engine):
+    """Return tables of engineIDs by transport and of engines' time by
+    engineID of pysnmp engine, their names are private in pysnmp.
+
+    """
+    mp_model = snmp_engine.messageProcessingSubsystems.get(3)
+    sec_model = snmp_engine.securityModels.get(3)
+    return (getattr(mp_model, '_SnmpV3MessageProcessingModel__engineIDs',
+                    None),
+            getattr(sec_model, '_SnmpUSMSecurityModel__timeline', None))
+
+
+def restore(snmp_engine, transport, engine, now=None):
+    """Put known parameters of engine to pysnmp engine, so it doesn't
+    discover them. Transport is pair of transport domain and address.
+    Return True if parameters are restored.
+
+    """
+    engine_ids, timeline = get_tables(snmp_engine)
+    if engine_ids is None or timeline is None or transport in engine_ids:
+        return False
+    now = time() if now is None else now
+    engine_id = univ.OctetString(engine.engine_id)
+    engine_time = min(ENGINE_TIME_MAX,
+                      engine.time + int(max(0, now - engine.updated)))
+    engine_ids[transport] = {
+        'securityEngineID': engine_id,
+        'contextEngineId': univ.OctetString(engine.context_engine_id),
+        'contextName': univ.OctetString(engine.context_name),
+    }
+    timeline[engine_id] = (univ.Integer(engine.boots),
+                           univ.Integer(engine_time),
+                           univ.Integer(engine_time), int(now))
+    return True
+
+
+def capture(snmp_engine, transport):
+    """Return parameters of engine known by pysnmp engine or None."""
+    engine_ids, timeline = get_tables(snmp_engine)
+    if engine_ids is None or timeline is None:
+        return None
+    data = engine_ids.get(transport)
+    if data is None:
+        return None
+    engine_id = data['securityEngineID']
+    if engine_id not in timeline:
+        return None
+    boots, engine_time, _, updated = timeline[engine_id]
+    return Engine(engine_id.asOctets(),
+                  univ.OctetString(data['contextEngineId']).asOctets(),
+                  univ.OctetString(data['contextName']).asOctets(),
+                  int(boots), int(engine_time), updated)
+
+
+def forget(snmp_engine, transport):
+    """Remove parameters of engine from pysnmp engine."""
+    engine_ids, timeline = get_tables(snmp_engine)
+    if engine_ids is None or timeline is None:
+        return
+    data = engine_ids.pop(transport, None)
+    if data is not None:
+        timeline.pop(data['securityEngineID'], None)
+
+
+def digest(value):
+    """Return hashable digest of argument of key derivation."""
+    if value is None or isinstance(value, univ.ObjectIdentifier):
+        return value and tuple(value)
+    return hashlib.sha256(univ.OctetString(value).asOctets()).digest()
+
+
+class CachedService(object):
+    """Proxy of pysnmp's auth or priv service, that memoizes hashed
+    passphrases and localized keys. Cache is keyed by digests of
+    arguments, so passphrases aren't kept by it.
+
+    """
+
+    def __init__(self, service, cache):
+        self.service = service
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.service, name)
+
+    def derive(self, name, *args):
+        key = (name, tuple(self.service.serviceID)) + \
+            tuple(digest(arg) for arg in args)
+        value = self.cache.get(key)
+        if value is None:
+            value = getattr(self.service, name)(*args)
+            self.cache.set(key, value)
+        return value
+
+    def hashPassphrase(self, *args):
+        return self.derive('hashPassphrase', *args)
+
+    def localizeKey(self, *args):
+        return self.derive('localizeKey', *args)
+
+
+#: Hashed passphrases and localized keys by digests of arguments.
+keys = LRUCache(USM_KEY_CACHE_SIZE)
+keys_lock = Lock()
+
+
+def cache_keys():
+    """Replace auth and priv services of pysnmp by proxies that memoize
+    keys in :data:`keys`. Services are shared by all pysnmp engines, so
+    it's enough to do this once per process.
+
+    """
+    with keys_lock:
+        for services in (pysnmp_config.authServices,
+                         pysnmp_config.privServices,
+                         SnmpUSMSecurityModel.authServices,
+                         SnmpUSMSecurityModel.privServices):
+            for service_id, service in list(services.items()):
+                if not isinstance(service, CachedService):
+                    services[service_id] = CachedService(service, keys)
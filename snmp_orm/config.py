@@ -14,8 +14,99 @@ SNMP_PORT = 161
 #: Default SNMP device's address to connect, used in unit-tests.
 SNMP_TEST_AGENT_ADDRESS = ('localhost', 60161)
 
+#: How long to wait for a response from SNMP agent (in seconds).
+SNMP_TIMEOUT = 1
+
+#: How many times request should be retried after timeout.
+SNMP_RETRIES = 5
+
+#: Which policy of request retransmission we should use by default?
+DEFAULT_POLICY = 'snmp_orm.adapters.policy:AdaptivePolicy'
+
+#: Limits of retransmission timeout estimated by round-trip times
+#: (in seconds).
+RTO_MIN = 0.5
+RTO_MAX = 10
+
+#: Resolution of timeouts of requests (in seconds) and size of timer wheel.
+TIMER_TICK = 0.01
+TIMER_WHEEL_SIZE = 1024
+
+#: How many times timeout grows for each next attempt.
+RTO_BACKOFF = 2
+
+#: Limit of time spent on all attempts of request (in seconds), None to
+#: spend no more than fixed policy does: ``timeout * (retries + 1)``.
+RTO_MAX_TOTAL = None
+
+#: Which part of requests could be hedged.
+HEDGE_BUDGET = 0.1
+
+#: How many round-trip times should be known before requests are hedged.
+HEDGE_MIN_SAMPLES = 20
+
+#: How many adapters and sessions are kept for reuse by same settings.
+ADAPTER_POOL_SIZE = 128
+
+#: Prefix length of subnets limited by ``subnet_concurrency`` setting.
+LIMIT_SUBNET_PREFIX = 24
+LIMIT_SUBNET_PREFIX6 = 64
+
+#: File that keeps discovered engine parameters of SNMPv3 agents between
+#: restarts of process, None to keep them in memory only.
+USM_ENGINE_CACHE = None
+
+#: How long discovered engine parameters of SNMPv3 agent are used without
+#: new discovery (in seconds).
+USM_ENGINE_TTL = 24 * 60 * 60
+
+#: How many engines are discovered or forgotten before file of engine cache
+#: is rewritten, the rest is stored at exit of process.
+USM_ENGINE_CACHE_BATCH = 100
+
+#: How many hashed passphrases and localized keys of SNMPv3 users are kept,
+#: 0 to derive them again for each session.
+USM_KEY_CACHE_SIZE = 1024
+
 #: How many rows should be read in bulk-mode at once.
 BULK_ROW = 50
 
+#: Limits of rows number while it's tuned by responses of device.
+BULK_ROW_MIN = 1
+BULK_ROW_MAX = 250
+
+#: Responses faster than this (in seconds) let rows number grow.
+BULK_FAST_RESPONSE = 0.2
+
+#: How many variables could be read in one request of batch.
+BATCH_MAX_VARBINDS = 32
+
+#: How many bytes of encoded variables could be sent in one request of batch.
+BATCH_MAX_SIZE = 1400
+
+#: How many hosts could be polled concurrently by poller.
+POLL_CONCURRENCY = 256
+
 #: Which OID should be used to detect device model.
 OID_OBJECT_ID = '1.3.6.1.2.1.1.2.0'
+
+#: How many hosts could be detected concurrently by device manager.
+DETECT_CONCURRENCY = 64
+
+#: How many detected objectIds of hosts are kept and how long (in seconds).
+DETECT_CACHE_SIZE = 65536
+DETECT_CACHE_TTL = 24 * 60 * 60
+
+#: File that keeps detected objectIds of hosts between restarts of process,
+#: None to keep them in memory only.
+DETECT_CACHE_FILE = None
+
+#: How many new objectIds are detected by ``get_class`` before cache file is
+#: rewritten, cache is also stored after ``get_classes`` and ``save_cache``.
+DETECT_CACHE_BATCH = 100
+
+#: How many values of fields with ``ttl`` are kept by cache of each device.
+FIELD_CACHE_SIZE = 256
+
+#: How many OIDs parsed from strings are memoized.
+OID_CACHE_SIZE = 4096
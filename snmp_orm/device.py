@@ -3,13 +3,18 @@ from __future__ import absolute_import
 
 import logging
 
-from six import b, u, string_types, binary_type
-from pyasn1.type.univ import ObjectIdentifier
+from six import b, u, iteritems, string_types, binary_type
 
 from snmp_orm import devices
-from snmp_orm.utils import find_classes, oid_to_str, symbol_by_name
+from snmp_orm.utils import find_classes, oid_to_str, symbol_by_name, \
+    is_instance, TTLCache, load_json, save_json, LazyModule
 from snmp_orm.adapter import get_adapter
-from snmp_orm.config import OID_OBJECT_ID
+from snmp_orm.registry import load_index, get_class_ids
+from snmp_orm.config import OID_OBJECT_ID, DETECT_CONCURRENCY, \
+    DETECT_CACHE_SIZE, DETECT_CACHE_TTL, DETECT_CACHE_FILE, \
+    DETECT_CACHE_BATCH
+
+multiprocessing_pool = LazyModule('multiprocessing.pool')
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +27,7 @@ def maybe_oid_to_str(objectId):
         return objectId
     elif isinstance(objectId, string_types):
         return b(objectId)
-    elif isinstance(objectId, ObjectIdentifier):
+    elif is_instance(objectId, 'pyasn1.type.univ', 'ObjectIdentifier'):
         return b(objectId)
     elif isinstance(objectId, (tuple, list)):
         return oid_to_str(objectId)
@@ -33,6 +38,10 @@ def maybe_oid_to_str(objectId):
 class DeviceClassRegistry(dict):
     """Store mapping of OID to device class.
 
+    Classes of packages with generated index (see :mod:`snmp_orm.registry`)
+    are imported when their OID is requested first time, other packages
+    are imported at once.
+
     Arguments:
 
     - **packages**, iterable, contains list of packages with defined
@@ -49,21 +58,27 @@ class DeviceClassRegistry(dict):
                               for maybe_path in (packages or [devices]))
         self.default_device = symbol_by_name(default or devices.DefaultDevice)
 
-        for cls in self.find_devices():
-            self.add(cls)
-
-    def find_devices(self):
+        #: Paths of classes by OID, which aren't imported yet.
+        self.index = {}
+        for package in self.packages:
+            index = load_index(package)
+            if index is None:
+                for cls in self.find_devices([package]):
+                    self.add(cls)
+            else:
+                for objectId, path in iteritems(index):
+                    self.index.setdefault(maybe_oid_to_str(objectId), path)
+
+    def find_devices(self, packages=None):
         """Find existed device classes."""
-        for cls in find_classes(self.AbstractDevice, self.packages):
+        for cls in find_classes(self.AbstractDevice,
+                                packages or self.packages):
             yield cls
 
     def add(self, cls):
         """Add class to registry."""
         assert issubclass(cls, self.AbstractDevice), 'wrong cls given'
-        objectIds = cls.classId
-        if not isinstance(objectIds, (list, tuple, set)):
-            objectIds = (objectIds, )
-        for objectId in objectIds:
+        for objectId in get_class_ids(cls):
             objectId = maybe_oid_to_str(objectId)
             if objectId and objectId not in self:
                 self[objectId] = cls
@@ -74,26 +89,67 @@ class DeviceClassRegistry(dict):
         try:
             return super(DeviceClassRegistry, self).__getitem__(objectId)
         except KeyError:
-            return self.default_device
+            path = self.index.get(objectId)
+            if path is None:
+                return self.default_device
+        cls = symbol_by_name(path)
+        self.add(cls)
+        self.index.pop(objectId, None)
+        return cls
     get_class = __getitem__
 
 
 class DeviceManager(object):
-    """Used to get class of given host."""
+    """Used to get class of given host.
+
+    Detected objectIds of hosts are cached for ``cache_ttl`` seconds, no
+    more than ``cache_size`` of them are kept. If ``cache_file`` is given,
+    cache is loaded from it on start and stored to it after detection of
+    many hosts or every ``cache_batch`` single detections, call
+    :meth:`save_cache` to store the rest.
+
+    """
 
     Registry = DeviceClassRegistry
 
-    def __init__(self, registry=None):
-        self._cache = {}
+    def __init__(self, registry=None, cache_file=DETECT_CACHE_FILE,
+                 cache_size=DETECT_CACHE_SIZE, cache_ttl=DETECT_CACHE_TTL,
+                 cache_batch=DETECT_CACHE_BATCH):
+        self._cache = TTLCache(cache_size, cache_ttl)
+        self._changed = 0
+        self.cache_file = cache_file
+        self.cache_batch = cache_batch
         self.registry = registry or self.Registry()
+        if cache_file is not None:
+            self.load_cache()
+
+    def load_cache(self):
+        """Load detected objectIds from cache file."""
+        items = load_json(self.cache_file) or []
+        for host, oid, expires in items:
+            self._cache.set(host, oid, expires)
+
+    def save_cache(self):
+        """Store detected objectIds to cache file."""
+        self._changed = 0
+        if self.cache_file is not None:
+            save_json(self.cache_file, self._cache.items())
+
+    def cached_id(self, host):
+        """Return cached objectId of host or None."""
+        return self._cache.get(u(host).lower())
+
+    def remember_id(self, host, oid):
+        """Put detected objectId of host to cache."""
+        self._cache.set(u(host).lower(), oid)
+        self._changed += 1
 
     def _get_device_id(self, host, **kwargs):
-        host = u(host).lower()
         logger.debug("Get device class for %s" % host)
-        try:
-            oid = self._cache[host]
-        except KeyError:
-            oid = self._cache[host] = self._autodetect_id(host, **kwargs)
+        oid = self.cached_id(host)
+        if oid is None:
+            oid = self._autodetect_id(u(host).lower(), **kwargs)
+            self.remember_id(host, oid)
         return oid
 
     def _autodetect_id(self, host, **kwargs):
@@ -108,9 +164,42 @@ class DeviceManager(object):
         registry = kwargs.pop('registry', None)
         registry = self.registry if registry is None else registry
         cls = registry[self._get_device_id(host, **kwargs)]
+        if self._changed >= self.cache_batch:
+            self.save_cache()
         logger.debug("Use %r for %s" % (cls, host))
         return cls
 
+    def get_classes(self, hosts, concurrency=DETECT_CONCURRENCY, **kwargs):
+        """Return dictionary of host to it's class or exception raised while
+        detection. Up to ``concurrency`` hosts are detected at once, other
+        arguments are the same as for :meth:`get_class`.
+
+        """
+        registry = kwargs.pop('registry', None)
+        registry = self.registry if registry is None else registry
+        hosts = list(hosts)
+
+        def detect(host):
+            try:
+                return host, registry[self._get_device_id(host, **kwargs)]
+            except Exception as e:
+                return host, e
+
+        missing = set(host for host in hosts
+                      if self.cached_id(host) is None)
+        result = dict(detect(host) for host in hosts if host not in missing)
+        if missing:
+            pool = multiprocessing_pool.ThreadPool(
+                min(concurrency, len(missing)))
+            try:
+                result.update(pool.imap_unordered(detect, missing))
+            finally:
+                pool.close()
+                pool.join()
+            if self._changed:
+                self.save_cache()
+        return result
+
 #: Default device manager instance.
 default_manager = DeviceManager()
 
@@ -125,13 +214,29 @@ def get_device(host, **kwargs):
     - **version** -- SNMP version, 1, 2 or 3;
     - **registry** -- custom registry class for class lookup;
     - **class_name** -- adapter class;
+    - **pooled** -- reuse adapter and sessions created with the same
+        settings, default True, threads that share session of pysnmp
+        adapter wait for each other's requests;
+    - **timeout** -- initial timeout of request in seconds;
+    - **retries** -- how many times request is retried;
+    - **policy** -- retransmission policy class;
+    - **hedge** -- percentile of round-trip times, after which duplicate
+        request is sent;
+    - **concurrency** -- how many requests could be sent to host at once;
+    - **rate** -- how many requests could be sent to host per second;
+    - **burst** -- how many requests could be sent at once within rate;
+    - **subnet_concurrency** -- how many requests could be sent to hosts of
+        subnet at once;
+    - **subnet_prefix** -- prefix length of subnet, default 24;
     - **community** -- SNMP community;
     - **sec_name** -- security name;
     - **sec_level** -- security level;
     - **auth_protocol** -- auth protocol;
     - **auth_passphrase** -- auth passphrase;
     - **priv_protocol** -- priv protocol;
-    - **priv_passphrase** -- priv passphrase.
+    - **priv_passphrase** -- priv passphrase;
+    - **engine_cache** -- file that keeps discovered SNMPv3 engines between
+        restarts.
 
     Other arguments:
 
@@ -0,0 +1,9 @@
+"""Generate index of device classes, see :mod:`snmp_orm.registry`."""
+from __future__ import absolute_import
+
+import sys
+
+from snmp_orm.registry import main
+
+if __name__ == '__main__':
+    sys.exit(main())
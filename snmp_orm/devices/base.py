@@ -2,13 +2,18 @@
 from __future__ import absolute_import
 
 import inspect
+from time import time
 from collections import namedtuple, defaultdict
 
-from six import with_metaclass, iteritems, iterkeys, next, integer_types
+from six import with_metaclass, iteritems, iterkeys, integer_types, \
+    string_types
 
 from snmp_orm.adapter import get_adapter
-from snmp_orm.fields import Field, TableField, Group
-from snmp_orm.utils import get_all_parents
+from snmp_orm.config import FIELD_CACHE_SIZE
+from snmp_orm.fields import Field, TableField, Group, format_key
+from snmp_orm.adapters.planner import Plan
+from snmp_orm.snapshot import Layout
+from snmp_orm.utils import get_all_parents, TTLCache, MISSING
 
 
 def load(fn):
@@ -21,6 +26,70 @@ def load(fn):
     return inner_wrapper
 
 
+class FieldCache(object):
+    """Values of fields read from one device, that are kept for ``ttl``
+    seconds of each field. Keys are (field, index) pairs, index is None
+    for scalar field and for whole table.
+
+    """
+
+    def __init__(self, maxsize=FIELD_CACHE_SIZE):
+        self.values = TTLCache(maxsize, 0)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return cached value or :data:`MISSING`."""
+        value = self.values.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, ttl):
+        self.values.set(key, value, time() + ttl)
+
+    def load(self, adapter, key, ttl, loader):
+        """Return cached value as result of request or call ``loader`` to
+        request it and cache result.
+
+        """
+        value = self.get(key)
+        if value is not MISSING:
+            return adapter.resolve(value)
+
+        def store(value):
+            self.set(key, value, ttl)
+            return value
+
+        return adapter.then(loader(), store)
+
+    def invalidate(self, fields=None):
+        """Forget values of given fields or all values."""
+        if fields is None:
+            self.values.clear()
+            return
+        fields = set(fields)
+        with self.values.lock:
+            for key in [key for key in self.values.data
+                        if key[0] in fields]:
+                del self.values.data[key]
+
+    def stats(self):
+        return {'size': len(self.values),
+                'hits': self.hits,
+                'misses': self.misses}
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, self.stats())
+
+
+def cached(cache, field):
+    """Return True if values of field should be cached."""
+    return cache is not None and bool(field.ttl)
+
+
 class TableListProxy(dict):
     """Proxy that support :class:`TableField`."""
 
@@ -28,11 +97,11 @@ class TableListProxy(dict):
     for method_name in set(dir(dict)) - set(dir(object)):
         locals()[method_name] = load(getattr(dict, method_name))
 
-    def __init__(self, adapter, field):
+    def __init__(self, adapter, field, cache=None):
         dict.__init__(self)
         self.adapter = adapter
-        self.d = None
         self.field = field
+        self.cache = cache
         self.loaded = False
 
     @load
@@ -47,37 +116,79 @@ class TableListProxy(dict):
         if isinstance(key, integer_types):
             key = (key,)
         if self.loaded:
-            if self.d is None:
-                self.d = dict(self)
-            return self.d.get(key, None)
+            # Rows are stored by the same keys as get_index returns.
+            return dict.get(self, key[0] if len(key) == 1 else key)
+        elif cached(self.cache, self.field):
+            return self.cache.load(self.adapter, (self.field, key),
+                                   self.field.ttl, lambda: self.load_one(key))
         else:
-            variables = self.field.load_one(self.adapter, key)
-            return self.field.prepare(variables)
+            return self.load_one(key)
+
+    def load_one(self, key):
+        return self.adapter.then(self.field.load_one(self.adapter, key),
+                                 self.field.prepare)
 
     def load(self):
-        if not self.loaded:
-            oid_len = len(self.field.oid)
-            variables = self.field.load_many(self.adapter)
-            self.loaded = True
-            for oid, v in self.field.prepare_many(variables):
-                idx = oid[oid_len:]
-                if len(idx) == 1:
-                    idx = idx[0]
-                self.update({idx: v})
+        """Load all table rows. With asynchronous adapter result of this
+        method should be awaited before access to rows.
+
+        """
+        if self.loaded:
+            return None
+        if cached(self.cache, self.field):
+            rows = self.cache.load(self.adapter, (self.field, None),
+                                   self.field.ttl, self.load_rows)
+            return self.adapter.then(rows, self.fill)
+        return self.adapter.then(self.field.load_many(self.adapter),
+                                 self.populate)
+
+    def load_rows(self):
+        """Request all table rows, return list of (index, value) pairs."""
+        return self.adapter.then(self.field.load_many(self.adapter),
+                                 self.prepare_rows)
+
+    def iter_rows(self):
+        """Iterate over (index, value) pairs of table without loading whole
+        table in memory, rows are requested from agent page by page even if
+        table is loaded. With asynchronous adapter it should be used with
+        ``async for`` statement.
+
+        """
+        return self.field.iter_many(self.adapter)
+
+    def prepare_rows(self, variables):
+        return [(self.field.get_index(oid), v)
+                for oid, v in self.field.prepare_many(variables)]
+
+    def populate(self, variables):
+        """Fill proxy with loaded variables."""
+        return self.fill(self.prepare_rows(variables))
+
+    def fill(self, rows):
+        """Fill proxy with (index, value) pairs."""
+        self.loaded = True
+        for index, v in rows:
+            dict.__setitem__(self, index, v)
+        return self
 
     def __setitem__(self, key, value):
+        if self.cache is not None:
+            self.cache.invalidate([self.field])
         self.field.set_one(self.adapter, key, value)
 
     def __getitem__(self, key):
         return self.get_by_index(key)
 
 
-def get(adapter, field, index=None):
+def get(adapter, field, index=None, cache=None):
     if isinstance(field, TableField):
-        return TableListProxy(adapter, field)
+        return TableListProxy(adapter, field, cache)
+    elif cached(cache, field):
+        return cache.load(adapter, (field, None), field.ttl,
+                          lambda: adapter.then(field.load(adapter),
+                                               field.prepare))
     else:
-        variables = field.load(adapter)
-        return field.prepare(variables)
+        return adapter.then(field.load(adapter), field.prepare)
 
 
 def set_one(adapter, field, value):
@@ -85,6 +196,28 @@ def set_one(adapter, field, value):
     return field.set(adapter, value)
 
 
+def to_variables(field, value):
+    """Return (OID, value) pairs to set field to given value. Value of
+    table field is dictionary of row index to value.
+
+    """
+    if isinstance(field, TableField):
+        return [(field.oid + format_key(key), field.toAsn1(item))
+                for key, item in iteritems(value)]
+    return [(field.oid, field.toAsn1(value))]
+
+
+def set_many(adapter, items, **kwargs):
+    """Set values of given (field, value) pairs by as few SET requests as
+    possible, see :meth:`snmp_orm.adapters.base.AbstractAdapter.set_many`.
+
+    """
+    variables = []
+    for field, value in items:
+        variables.extend(to_variables(field, value))
+    return adapter.set_many(variables, **kwargs)
+
+
 class DeviceMeta:
     """Meta-data for each device type."""
 
@@ -97,14 +230,73 @@ class DeviceMeta:
     #: Device's lookup table. OID to field mapping.
     lut = None
 
+    #: Indexes of group's fields by OIDs, see :class:`FieldIndex`.
+    indexes = None
+
+    #: Index of all fields of :attr:`lut`.
+    index = None
+
     def __init__(self):
         self.adapter_kwargs = {}
+        self.plans = {}
+        self.layouts = {}
 
     def get_adapter(self, host, **kwargs):
         params = self.adapter_kwargs.copy()
         params.update(kwargs)
         return get_adapter(host, **params)
 
+    def get_plan(self, names, group=None):
+        """Return plan of requests to load fields with given names, plan is
+        built once and cached. Names are group names, device's field names
+        or ``group.field`` names, keys of result are ``group.field`` names
+        and names of device's fields. If ``group`` is given, names are
+        names of it's fields and keys of result are the same.
+
+        """
+        names = tuple(names)
+        key = (group, names)
+        plan = self.plans.get(key)
+        if plan is None:
+            plan = self.plans[key] = Plan(self.resolve(names, group))
+        return plan
+
+    def get_layout(self, groups):
+        """Return layout of snapshot of given groups, layout is built once
+        and cached, see :class:`snmp_orm.snapshot.Layout`.
+
+        """
+        groups = tuple(groups)
+        layout = self.layouts.get(groups)
+        if layout is None:
+            layout = self.layouts[groups] = Layout(self, groups)
+        return layout
+
+    def resolve(self, names, group=None):
+        """Return (key, field) pairs for given names."""
+        if group is not None:
+            fields = self.groups[group]
+            return [(name, fields[name]) for name in names]
+        items = []
+        for name in names:
+            if name in self.groups:
+                items.extend(("%s.%s" % (name, field_name), field)
+                             for field_name, field
+                             in sorted(iteritems(self.groups[name])))
+                continue
+            items.append((name, self.get_field(name)))
+        return items
+
+    def get_field(self, name):
+        """Return field by name of device's field or ``group.field`` name."""
+        group, _, field_name = name.rpartition('.')
+        try:
+            if group:
+                return self.groups[group][field_name]
+            return self.fields[field_name]
+        except KeyError:
+            raise KeyError("key %r is not defined" % name)
+
 
 class AbstractContainer(object):
     """Container for group of fields. Created for each device and provide
@@ -116,44 +308,84 @@ class AbstractContainer(object):
     group = None
     items_list = None
 
-    def __init__(self, adapter, meta):
+    def __init__(self, adapter, meta, cache=None):
         self.adapter = adapter
         self.meta = meta
+        self.cache = cache
 
     def __iter__(self):
-        cls = type(self)
-        prefix = cls.prefix
-        if prefix is None:
-            result = ((name, prop.__get__(self, cls))
-                      for name, prop in iteritems(vars(cls))
-                      if type(prop) == property)
-        else:
-            result = list()
-            result_dict = defaultdict(dict)
-            fields = dict((field.oid, (name, field))
-                          for name, field in iteritems(self.meta.groups[cls.group]))
-            prefix_len = len(prefix)
-            for oid, variables in self.adapter.getbulk(len(fields), prefix):
-                if oid[:prefix_len] != prefix:
-                    break
-                if oid in fields:
-                    name, field = fields[oid]
-                    result.append((name, field.form(variables)))
-                else:
-                    # TODO: better way to handle table
-                    for field_oid in fields:
-                        field_oid_len = len(field_oid)
-                        if oid[:field_oid_len] == field_oid:
-                            name, field = fields[field_oid]
-                            if isinstance(field, TableField):
-                                idx = oid[field_oid_len:]
-                                if len(idx) == 1:
-                                    idx = idx[0]
-                                result_dict[name][idx] = field.form(variables)
-                                break
-            result.extend(iteritems(result_dict))
-
-        return iter(result)
+        if type(self).prefix is None:
+            return iter(self.fetch())
+        return iter(self.walk())
+
+    def walk(self):
+        """Walk whole prefix of group page by page, return list of (name,
+        value) pairs of group fields. Unlike :meth:`fetch` it requests
+        variables of prefix that aren't declared by group too, but single
+        walk of subtree is cheaper when group has many fields. With
+        asynchronous adapter returned value should be awaited.
+
+        """
+        return self.adapter.then(self.adapter.walk(type(self).prefix),
+                                 self.collect)
+
+    def collect(self, variables):
+        """Return (name, value) pairs of group fields found in given
+        variables.
+
+        """
+        index = self.meta.indexes[type(self).group]
+        values = {}
+        for oid, value in variables:
+            info = index.find(oid)
+            if info is None:
+                continue
+            name, field = info
+            if isinstance(field, TableField):
+                values.setdefault(name, {})[field.get_index(oid)] = \
+                    field.form(value)
+            else:
+                values[name] = field.form(value)
+        return sorted(iteritems(values))
+
+    def fetch(self):
+        """Load all group fields at once, return list of (name, value) pairs.
+        Scalar fields and first rows of table fields are loaded by one
+        request if possible, table fields are walked in lockstep, see
+        :class:`snmp_orm.adapters.planner.Plan`. With asynchronous adapter
+        returned value should be awaited.
+
+        """
+        group = type(self).group
+        plan = self.meta.get_plan(sorted(self.meta.groups[group]), group)
+        return plan.execute(self.adapter)
+
+    def fetch_table(self, *names):
+        """Load given (or all) table fields of group in lockstep, return
+        dictionary of rows, where each row is dictionary of field's name to
+        value. With asynchronous adapter returned value should be awaited.
+
+        .. code-block:: python
+
+            >>> device.ifTable.fetch_table('ifDescr', 'ifType')
+            {1: {'ifDescr': u'lo', 'ifType': 'softwareLoopback'}, ...}
+
+        """
+        group = self.meta.groups[type(self).group]
+        names = names or sorted(name for name, field in iteritems(group)
+                                if isinstance(field, TableField))
+        fields = [(name, group[name]) for name in names]
+
+        def collect(columns):
+            rows = defaultdict(dict)
+            for (name, field), column in zip(fields, columns):
+                for oid, value in column:
+                    rows[field.get_index(oid)][name] = field.form(value)
+            return dict(rows)
+
+        return self.adapter.then(
+            self.adapter.walk_many([field.oid for _, field in fields]),
+            collect)
 
     def keys(self):
         """Return all field's names."""
@@ -169,13 +401,41 @@ class AbstractContainer(object):
 
     def _get(self, field):
         """Shortcut to get function."""
-        return get(self.adapter, field)
+        return get(self.adapter, field, cache=self.cache)
 
     def _set(self, field, value):
         """Shortcut to set_one function."""
+        if self.cache is not None:
+            self.cache.invalidate([field])
         # FIXME: how could I handle the return value
         return set_one(self.adapter, field, value)
 
+    def invalidate(self, *names):
+        """Forget cached values of given (or all) fields of group."""
+        if self.cache is None:
+            return
+        group = self.meta.groups[type(self).group]
+        self.cache.invalidate([group[name] for name in names or group])
+
+    def set_many(self, values, **kwargs):
+        """Set values of many group fields by as few SET requests as
+        possible. Value of table field is dictionary of row index to value:
+
+        .. code-block:: python
+
+            device.ifTable.set_many({'ifAdminStatus': {5: 'down', 6: 'up'}})
+
+        """
+        items = []
+        for name, value in iteritems(values):
+            field = self._get_field_by_name(name)
+            if field is None:
+                raise KeyError("key %r is not defined" % name)
+            items.append((field, value))
+        if self.cache is not None:
+            self.cache.invalidate([field for field, _ in items])
+        return set_many(self.adapter, items, **kwargs)
+
     def __setattr__(self, name, value):
         if name in type(self).items_list:
             self._set(self._get_field_by_name(name), value)
@@ -215,6 +475,50 @@ class AbstractContainer(object):
 FieldInfo = namedtuple('FieldInfo', ('name', 'cls'))
 
 
+class FieldIndex(object):
+    """Trie of fields by arcs of their OIDs, that finds field of scalar by
+    OID of it's instance and field of table column by OID of any it's
+    cell in time proportional to length of OID. Each node is dictionary of
+    arc to child node, field of node is kept by None key. Index isn't
+    changed after it's built.
+
+    """
+
+    def __init__(self, fields):
+        self.root = {}
+        for name, field in fields:
+            node = self.root
+            for arc in field.oid:
+                node = node.setdefault(arc, {})
+            node[None] = FieldInfo(name, field)
+
+    def match(self, oid):
+        """Return (:data:`FieldInfo`, length of it's OID) of field with
+        the longest OID that is prefix of given one, or (None, 0).
+
+        """
+        node = self.root
+        info, length = None, 0
+        for position, arc in enumerate(oid):
+            node = node.get(arc)
+            if node is None:
+                break
+            if None in node:
+                info, length = node[None], position + 1
+        return info, length
+
+    def find(self, oid):
+        """Return :data:`FieldInfo` of field that owns given OID or
+        None.
+
+        """
+        info, length = self.match(oid)
+        if info is None or (length < len(oid) and
+                            not isinstance(info.cls, TableField)):
+            return None
+        return info
+
+
 class DeviceBase(type):
 
     def __new__(cls, name, bases, attrs):
@@ -232,16 +536,18 @@ class DeviceBase(type):
             adapter_kwargs.update(vars(klass))
         meta.adapter_kwargs = dict((k, v)
                                    for (k, v) in iteritems(adapter_kwargs)
-                                   if not k.starstwith("_"))
+                                   if not k.startswith("_"))
 
         # get parent fields and groups and populate ours dictionaries
         meta.fields = all_fields = {}
         meta.groups = all_groups = {}
         meta.lut = all_lut = {}
+        meta.indexes = all_indexes = {}
         for klass in parents:
             all_fields.update(klass.meta.fields)
             all_groups.update(klass.meta.groups)
             all_lut.update(klass.meta.lut)
+            all_indexes.update(klass.meta.indexes)
 
         # get class fields and groups
         fields = {}
@@ -265,6 +571,9 @@ class DeviceBase(type):
         all_fields.update(fields)
         all_groups.update(groups)
         all_lut.update(lut)
+        all_indexes.update((name, FieldIndex(iteritems(group)))
+                           for name, group in iteritems(groups))
+        meta.index = FieldIndex(all_lut.values())
 
         # create containers class
         for group_name in iterkeys(groups):
@@ -288,40 +597,126 @@ class AbstractDevice(with_metaclass(DeviceBase)):
     #: Used to find device class by object OID.
     classId = None
 
+    #: How many values of fields with ``ttl`` are cached.
+    cache_size = FIELD_CACHE_SIZE
+
     def __init__(self, host, **kwargs):
         self.host = host
         cls = type(self)
         meta = cls.meta
         adapter = self.adapter = meta.get_adapter(host, **kwargs)
+        cache = self.cache = FieldCache(cls.cache_size)
         # initialize associated containers
         for name in iterkeys(meta.groups):
-            setattr(self, name, getattr(cls, name)(adapter, meta))
+            setattr(self, name, getattr(cls, name)(adapter, meta, cache))
 
     def _get(self, field):
-        return get(self.adapter, field)
+        return get(self.adapter, field, cache=self.cache)
+
+    def invalidate(self, *names):
+        """Forget cached values of given (or all) fields and groups. Names
+        are group names, device's field names or ``group.field`` names.
+        Values are cached only for fields declared with ``ttl``, hits and
+        misses of cache are counted by ``device.cache.stats()``.
+
+        """
+        self.cache.invalidate([field for _, field
+                               in self.meta.resolve(names)]
+                              if names else None)
+
+    def batch(self, **kwargs):
+        """Return context manager that collects reads of device fields and
+        loads them at exit by as few requests as possible, see
+        :meth:`snmp_orm.adapters.base.AbstractAdapter.batch`.
+
+        """
+        return self.adapter.batch(**kwargs)
+
+    def prepare(self, *items):
+        """Return GET request for given group names, fields or OIDs, that
+        could be sent many times, see
+        :meth:`snmp_orm.adapters.base.AbstractAdapter.prepare`.
+
+        """
+        groups = self.meta.groups
+        return self.adapter.prepare(*[groups.get(item, item)
+                                      if isinstance(item, string_types)
+                                      else item for item in items])
+
+    def fetch(self, *names):
+        """Load given fields and groups by as few requests as possible,
+        return list of (name, value) pairs. Names are group names, names of
+        device's fields or ``group.field`` names:
+
+        .. code-block:: python
+
+            >>> device.fetch('system.sysName', 'ifTable.ifDescr')
+            [('system.sysName', u'switch'), ('ifTable.ifDescr', {1: u'lo'})]
+
+        Plan of requests is built once per device class, see
+        :meth:`DeviceMeta.get_plan`. With asynchronous adapter returned value
+        should be awaited.
+
+        """
+        return self.meta.get_plan(names).execute(self.adapter)
+
+    def snapshot(self, groups=None):
+        """Load all fields of given (or all) groups by as few requests as
+        possible, return immutable snapshot of their values:
+
+        .. code-block:: python
+
+            >>> snapshot = device.snapshot(groups=('system', 'ifTable'))
+            >>> snapshot.system.sysName, snapshot.ifTable.ifDescr[1]
+            (u'switch', u'lo')
+
+        See :mod:`snmp_orm.snapshot`. With asynchronous adapter returned
+        value should be awaited.
+
+        """
+        if groups is None:
+            groups = sorted(self.meta.groups)
+        layout = self.meta.get_layout(groups)
+        return self.adapter.then(layout.plan.execute(self.adapter),
+                                 layout.build)
+
+    def set_many(self, values, **kwargs):
+        """Set values of many fields by as few SET requests as possible.
+        Keys are names of device's fields or ``group.field`` names, value
+        of table field is dictionary of row index to value:
+
+        .. code-block:: python
+
+            device.set_many({'system.sysLocation': 'rack 4',
+                             'ifTable.ifAdminStatus': {5: 'down'}})
+
+        """
+        items = [(self.meta.get_field(name), value)
+                 for name, value in iteritems(values)]
+        self.cache.invalidate([field for field, _ in items])
+        return set_many(self.adapter, items, **kwargs)
 
     def prepare_val_by_oid(self, oid, var):
-        """Prepare value for given OID."""
-        meta = self.meta
-        field = name = index = prep_var = None
-        oid = tuple(oid)
-        if oid in meta.lut.viewkeys():
-            # OID found, use field associated with it
-            name, field = meta.lut[oid]
-        else:
-            # Try to find first matching OID
-            g = (key for key in iterkeys(meta.lut)
-                 if oid[:len(key)] == key)
-            try:
-                toid = next(g)
-            except StopIteration:
-                pass
-            else:
-                name, field = meta.lut[toid]
-                index = oid[len(toid):]
-        if field is not None:
-            prep_var = field.prepare(var)
-        return (name, prep_var, index)
+        """Prepare value for given OID, return (name, value, index) of field
+        with the longest OID that is prefix of given one. Index is None
+        for OID of field itself, (None, None, None) is returned for unknown
+        OID.
+
+        """
+        info, length = self.meta.index.match(oid)
+        if info is None:
+            return (None, None, None)
+        name, field = info
+        index = tuple(oid[length:]) if length < len(oid) else None
+        return (name, field.prepare(var), index)
+
+    def prepare_many_by_oid(self, variables):
+        """Prepare values of (OID, value) pairs like traps or results of
+        walk, return list of (name, value, index) tuples, see
+        :meth:`prepare_val_by_oid`.
+
+        """
+        return [self.prepare_val_by_oid(oid, var) for oid, var in variables]
 
     def __repr__(self):
         cls = type(self)
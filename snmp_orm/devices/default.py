@@ -11,6 +11,10 @@ from snmp_orm.defines import IANAifType, ifStatus, ipForwarding, ipRouteType, \
 
 from .base import AbstractDevice
 
+#: How long (in seconds) values that change only on reconfiguration or
+#: replacement of hardware are cached by devices.
+STATIC_TTL = 60 * 60
+
 
 class Device(AbstractDevice):
     """Device with default OID's defined."""
@@ -18,13 +22,13 @@ class Device(AbstractDevice):
     #: SNMP MIB-2 System (1.3.6.1.2.1.1)
     system = Group(
         prefix=(1, 3, 6, 1, 2, 1, 1),
-        sysDescr=UnicodeField((1, 3, 6, 1, 2, 1, 1, 1, 0)),
-        sysObjectID=OIDField((1, 3, 6, 1, 2, 1, 1, 2, 0)),
+        sysDescr=UnicodeField((1, 3, 6, 1, 2, 1, 1, 1, 0), ttl=STATIC_TTL),
+        sysObjectID=OIDField((1, 3, 6, 1, 2, 1, 1, 2, 0), ttl=STATIC_TTL),
         sysUpTime=TimeTickField((1, 3, 6, 1, 2, 1, 1, 3, 0)),
         sysContact=UnicodeField((1, 3, 6, 1, 2, 1, 1, 4, 0)),
         sysName=UnicodeField((1, 3, 6, 1, 2, 1, 1, 5, 0)),
         sysLocation=UnicodeField((1, 3, 6, 1, 2, 1, 1, 6, 0)),
-        sysServices=IntegerField((1, 3, 6, 1, 2, 1, 1, 7, 0)),
+        sysServices=IntegerField((1, 3, 6, 1, 2, 1, 1, 7, 0), ttl=STATIC_TTL),
     )
 
     #: SNMP MIB-2 Interfaces (1.3.6.1.2.1.2)
@@ -32,11 +36,11 @@ class Device(AbstractDevice):
     ifTable = Group(
         prefix=(1, 3, 6, 1, 2, 1, 2, 2),
         ifIndex=IntegerTableField((1, 3, 6, 1, 2, 1, 2, 2, 1, 1)),
-        ifDescr=UnicodeTableField((1, 3, 6, 1, 2, 1, 2, 2, 1, 2)),
-        ifType=FromDictTableField((1, 3, 6, 1, 2, 1, 2, 2, 1, 3), IANAifType, int),
+        ifDescr=UnicodeTableField((1, 3, 6, 1, 2, 1, 2, 2, 1, 2), ttl=STATIC_TTL),
+        ifType=FromDictTableField((1, 3, 6, 1, 2, 1, 2, 2, 1, 3), IANAifType, int, ttl=STATIC_TTL),
         ifMtu=IntegerTableField((1, 3, 6, 1, 2, 1, 2, 2, 1, 4)),
         ifSpeed=IntegerTableField((1, 3, 6, 1, 2, 1, 2, 2, 1, 5)),
-        ifPhysAddress=MacTableField((1, 3, 6, 1, 2, 1, 2, 2, 1, 6)),
+        ifPhysAddress=MacTableField((1, 3, 6, 1, 2, 1, 2, 2, 1, 6), ttl=STATIC_TTL),
         ifAdminStatus=FromDictTableField((1, 3, 6, 1, 2, 1, 2, 2, 1, 7), ifStatus, int),
         ifOperStatus=FromDictTableField((1, 3, 6, 1, 2, 1, 2, 2, 1, 8), ifStatus, int),
         ifLastChange=TimeTickTableField((1, 3, 6, 1, 2, 1, 2, 2, 1, 9)),
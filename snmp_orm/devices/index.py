@@ -0,0 +1,7 @@
+"""Index of device classes by their classId.
+
+Generated by ``python -m snmp_orm.devices snmp_orm.devices``, don't edit it.
+
+"""
+
+INDEX = {'1.3.6.1.4.1.171.10.94.1': 'snmp_orm.devices.dlink.sw3100:Device'}
@@ -4,13 +4,17 @@ from __future__ import absolute_import
 import math
 from datetime import timedelta
 
-from netaddr import EUI, IPAddress
-from pyasn1.type.univ import Null, ObjectIdentifier
-from pyasn1.type.base import Asn1ItemBase
-from pysnmp.proto import rfc1902
-from six import itervalues, integer_types, string_types
+from six import itervalues, integer_types, string_types, text_type, PY3
 
-from snmp_orm.utils import str_to_oid
+from snmp_orm.utils import str_to_oid, LazyModule
+
+netaddr = LazyModule('netaddr')
+univ = LazyModule('pyasn1.type.univ')
+base = LazyModule('pyasn1.type.base')
+rfc1902 = LazyModule('pysnmp.proto.rfc1902')
+
+if PY3:
+    long = int
 
 
 def format_key(key):
@@ -25,7 +29,7 @@ class Mapper(object):
 
     def form(self, var):
         """Form method must convert pyasn1 format to base python objects"""
-        if isinstance(var, Null):
+        if isinstance(var, univ.Null):
             return None
         else:
             return var
@@ -33,15 +37,21 @@ class Mapper(object):
     def toAsn1(self, var):
         """toAsn1 method must convert base python objects to pyasn1 format"""
         if var is None:
-            return Null
+            return univ.Null
         else:
             return var
 
 
 class Field(Mapper):
+    """Base of fields. ``ttl`` is how long (in seconds) value of field read
+    by attribute access could be served from cache of device, None or 0 for
+    values that change all the time like counters.
+
+    """
 
-    def __init__(self, oid):
+    def __init__(self, oid, ttl=None):
         self.oid = str_to_oid(oid)
+        self.ttl = ttl
 
     def __get__(self, instance, owner):
         """Descriptor for retrieving a value from a field."""
@@ -89,6 +99,14 @@ class TableField(object):
     def load_many(self, adapter):
         return adapter.walk(self.oid)
 
+    def iter_many(self, adapter):
+        """Iterate over (index, value) pairs of table rows as they are
+        received.
+
+        """
+        return adapter.iter_walk(
+            self.oid, lambda row: (self.get_index(row[0]), self.form(row[1])))
+
     def load_one(self, adapter, key):
         key = format_key(key)
         return adapter.get_one(self.oid + key)
@@ -101,6 +119,13 @@ class TableField(object):
     def prepare_many(self, vars):
         return [(oid, self.form(value)) for oid, value in vars]
 
+    def get_index(self, oid):
+        """Return index of table row for given OID."""
+        idx = tuple(oid[len(self.oid):])
+        if len(idx) == 1:
+            idx = idx[0]
+        return idx
+
 
 class SingleValueField(Field):
 
@@ -129,7 +154,7 @@ class FromDictMapper(Mapper):
         var = super(FromDictMapper, self).toAsn1(var)
         if not (not var in self.d.values() and isinstance(var, integer_types)):
             # var is value but not index
-            var = self.d.keys()[self.d.values().index(var)]
+            var = list(self.d.keys())[list(self.d.values()).index(var)]
         var = rfc1902.Integer(var)
         return var
 
@@ -137,8 +162,8 @@ class FromDictMapper(Mapper):
 class FromDictField(SingleValueField, FromDictMapper):
     """Convert data to dict value"""
 
-    def __init__(self, oid, d, conv_to=None):
-        super(FromDictField, self).__init__(oid)
+    def __init__(self, oid, d, conv_to=None, ttl=None):
+        super(FromDictField, self).__init__(oid, ttl)
         self.d = d
         self.conv_to = conv_to or (lambda x: x)
 
@@ -155,7 +180,7 @@ class UnicodeMapper(Mapper):
         if var is None:
             return None
         else:
-            return unicode(var)
+            return text_type(var)
 
     def toAsn1(self, var):
         var = super(UnicodeMapper, self).toAsn1(var)
@@ -184,10 +209,10 @@ class OIDMapper(Mapper):
 
     def toAsn1(self, var):
         var = super(OIDMapper, self).toAsn1(var)
-        if not isinstance(var, Asn1ItemBase):
+        if not isinstance(var, base.Asn1ItemBase):
             if isinstance(var, string_types):
                 var = tuple(map(int, var.split('.')))
-            var = ObjectIdentifier(var)
+            var = univ.ObjectIdentifier(var)
         return var
 
 
@@ -212,7 +237,7 @@ class IntegerMapper(Mapper):
 
     def toAsn1(self, var):
         var = super(IntegerMapper, self).toAsn1(var)
-        if not isinstance(var, Asn1ItemBase):
+        if not isinstance(var, base.Asn1ItemBase):
             var = rfc1902.Integer(var)
         return var
 
@@ -239,7 +264,7 @@ class LongIntegerMapper(Mapper):
     def toAsn1(self, var):
         # FIXME: should the LongInteger type be equal to Integer?
         var = super(IntegerMapper, self).toAsn1(var)
-        if not isinstance(var, Asn1ItemBase):
+        if not isinstance(var, base.Asn1ItemBase):
             var = rfc1902.Integer(var)
         return var
 
@@ -291,15 +316,15 @@ class MacMapper(Mapper):
             if var == '':
                 return ''
             else:
-                return EUI(':'.join([('%x' % ord(x)).ljust(2, "0") for x in var]))
+                return netaddr.EUI(':'.join([('%x' % ord(x)).ljust(2, "0") for x in var]))
 
     def toAsn1(self, var):
         var = super(IntegerMapper, self).toAsn1(var)
         if isinstance(var, string_types) and len(var) != 6:
-            var = EUI(var)
-        if isinstance(var, EUI):
+            var = netaddr.EUI(var)
+        if isinstance(var, netaddr.EUI):
             var = var.packed
-        if not isinstance(var, Asn1ItemBase):
+        if not isinstance(var, base.Asn1ItemBase):
             var = rfc1902.OctetString(var)
         return var
 
@@ -321,15 +346,15 @@ class IPAddressMapper(Mapper):
         if var is None:
             return None
         else:
-            return IPAddress(var.prettyPrint())
+            return netaddr.IPAddress(var.prettyPrint())
 
     def toAsn1(self, var):
         var = super(IPAddressMapper, self).toAsn1(var)
         if isinstance(var, string_types) and len(var) != 4:
-            var = IPAddress(var)
-        if isinstance(var, IPAddress):
+            var = netaddr.IPAddress(var)
+        if isinstance(var, netaddr.IPAddress):
             var = var.packed
-        if not isinstance(var, Asn1ItemBase):
+        if not isinstance(var, base.Asn1ItemBase):
             var = rfc1902.IpAddress(var)
         return var
 
@@ -0,0 +1,330 @@
+"""Poll fleet of hosts at once through shared engine of asyncio adapter.
+
+.. code-block:: python
+
+    from snmp_orm.poller import poll_many
+
+    for host, result in poll_many(hosts, ['system.sysName', 'ifNumber']):
+        if isinstance(result, Exception):
+            print(host, 'failed', result)
+        else:
+            print(host, result['system.sysName'])
+
+Results are returned as soon as host answers, so poll of whole fleet takes
+about as long as poll of the slowest host. Module requires Python 3.5+.
+
+Decoding of responses and conversion of values are bound by CPU, so
+single process polls hosts using only one core. Pass ``processes`` to
+:func:`poll_many` to shard hosts across worker processes:
+
+.. code-block:: python
+
+    for host, result in poll_many(hosts, fields, processes=8):
+        ...
+
+Each worker runs one event loop for whole poll, takes next host from
+shared queue when it has free slot and sends result of each host back as
+soon as it's polled. Workers keep their own adapters, values of results
+are converted to plain Python types before they are returned to parent
+process.
+
+"""
+from __future__ import absolute_import
+
+import queue
+import pickle
+import asyncio
+import multiprocessing
+
+from six import string_types
+from pyasn1.type import univ
+from pyasn1.type.base import Asn1ItemBase
+
+from snmp_orm import devices
+from snmp_orm.adapter import get_adapter
+from snmp_orm.adapters.asyncio import get_engine
+from snmp_orm.adapters.base import AbstractException
+from snmp_orm.config import POLL_CONCURRENCY, OID_OBJECT_ID
+from snmp_orm.device import default_manager
+from snmp_orm.devices.base import TableListProxy
+from snmp_orm.fields import Field, TableField, SingleValueField
+from snmp_orm.utils import oid_to_str, symbol_by_name
+
+#: Adapter used to poll hosts.
+ADAPTER = 'snmp_orm.adapters.asyncio'
+
+
+def resolve_field(spec, device_cls):
+    """Return field by it's specification: field instance, name of device
+    field (``ifNumber``), name of field in group (``system.sysName``)
+    or OID.
+
+    """
+    if isinstance(spec, Field):
+        return spec
+    if isinstance(spec, string_types) and \
+            not spec.replace('.', '').isdigit():
+        meta = device_cls.meta
+        group, _, name = spec.rpartition('.')
+        try:
+            return meta.groups[group][name] if group else meta.fields[name]
+        except KeyError:
+            raise ValueError('Unknown field %r of %r' % (spec, device_cls))
+    return SingleValueField(spec)
+
+
+async def poll(adapter, fields):
+    """Load fields from one host, fields are list of (spec, field) pairs.
+    All scalar fields are read by one request.
+
+    """
+    result = {}
+    scalars = [(spec, field) for spec, field in fields
+               if not isinstance(field, TableField)]
+    if scalars:
+        variables = dict(await adapter.get(
+            *[field.oid for _, field in scalars]))
+        for spec, field in scalars:
+            result[spec] = field.prepare(variables.get(field.oid))
+    for spec, field in fields:
+        if isinstance(field, TableField):
+            proxy = await TableListProxy(adapter, field).load()
+            result[spec] = dict(proxy.items())
+    return result
+
+
+async def apoll_many(hosts, fields, concurrency=POLL_CONCURRENCY, **kwargs):
+    """Asynchronously poll given fields from hosts, yield (host, result)
+    pairs in order of answers. Result is dictionary of field specification
+    to value, or exception raised while polling of host.
+
+    Arguments:
+
+    - **hosts** -- iterable or asynchronous iterable of hosts, next host
+        is taken from it only when there is free slot;
+    - **fields** -- iterable of field specifications,
+        see :func:`resolve_field`;
+    - **concurrency** -- how many hosts could be polled at once;
+    - **device_cls** -- device class used to find fields by name;
+
+    other arguments are passed to :func:`snmp_orm.adapter.get_adapter`.
+
+    """
+    device_cls = symbol_by_name(kwargs.pop('device_cls', None) or
+                                devices.DefaultDevice)
+    kwargs['class_name'] = ADAPTER
+    fields = [(spec, resolve_field(spec, device_cls)) for spec in fields]
+    semaphore = asyncio.Semaphore(concurrency)
+    results = asyncio.Queue()
+    tasks = set()
+
+    async def run(host):
+        try:
+            result = await poll(get_adapter(host, **kwargs), fields)
+        except Exception as e:
+            result = e
+        results.put_nowait((host, result))
+        semaphore.release()
+
+    async def feed():
+        iterator = aiterate(hosts)
+        while True:
+            await semaphore.acquire()
+            try:
+                host = await iterator.__anext__()
+            except StopAsyncIteration:
+                semaphore.release()
+                break
+            task = asyncio.ensure_future(run(host))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        # wait for hosts that are polled at the moment
+        for _ in range(concurrency):
+            await semaphore.acquire()
+
+    feeder = asyncio.ensure_future(feed())
+    feeder.add_done_callback(lambda _: results.put_nowait(None))
+    try:
+        while True:
+            item = await results.get()
+            if item is None:
+                break
+            yield item
+        feeder.result()
+    finally:
+        feeder.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+
+async def aiterate(iterable):
+    """Iterate over synchronous or asynchronous iterable."""
+    if hasattr(iterable, '__aiter__'):
+        async for item in iterable:
+            yield item
+    else:
+        for item in iterable:
+            yield item
+
+
+async def aget_devices(hosts, concurrency=POLL_CONCURRENCY, **kwargs):
+    """Asynchronously detect classes of given hosts, yield (host, device)
+    pairs in order of answers. Device is exception if detection failed.
+    Hosts, which objectIds are cached by device manager, aren't detected
+    again.
+
+    Arguments are the same as for :func:`snmp_orm.device.get_device`,
+    devices are created with them.
+
+    """
+    manager = symbol_by_name(kwargs.pop('manager', default_manager))
+    registry = kwargs.pop('registry', None)
+    registry = manager.registry if registry is None else registry
+    detect_kwargs = dict(kwargs, class_name=ADAPTER)
+    missing = []
+    for host in hosts:
+        objectId = manager.cached_id(host)
+        if objectId is None:
+            missing.append(host)
+        else:
+            yield host, registry[objectId](host, **kwargs)
+    async for host, result in apoll_many(missing, [OID_OBJECT_ID],
+                                         concurrency, **detect_kwargs):
+        if not isinstance(result, Exception):
+            try:
+                objectId = result[OID_OBJECT_ID]
+                if objectId is None:
+                    raise ValueError('empty OID returned')
+                manager.remember_id(host, oid_to_str(objectId))
+                result = registry[oid_to_str(objectId)](host, **kwargs)
+            except Exception as e:
+                result = e
+        yield host, result
+    if missing:
+        manager.save_cache()
+
+
+def iterate(agen):
+    """Iterate over asynchronous generator in own event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(agen.aclose())
+        get_engine(loop).close()
+        loop.close()
+
+
+def poll_many(hosts, fields, concurrency=POLL_CONCURRENCY, processes=None,
+              **kwargs):
+    """Synchronous version of :func:`apoll_many`. If number of
+    ``processes`` is given, hosts are polled by :func:`poll_sharded`.
+
+    """
+    if processes:
+        return poll_sharded(hosts, fields, processes, concurrency, **kwargs)
+    return iterate(apoll_many(hosts, fields, concurrency, **kwargs))
+
+
+def compact(value):
+    """Convert ASN.1 values to plain Python types."""
+    if isinstance(value, dict):
+        return dict((key, compact(item)) for key, item in value.items())
+    if not isinstance(value, Asn1ItemBase):
+        return value
+    if isinstance(value, univ.Null) or not value.hasValue():
+        return None
+    if isinstance(value, univ.Integer):
+        return int(value)
+    if isinstance(value, univ.OctetString):
+        return value.asOctets()
+    if isinstance(value, univ.ObjectIdentifier):
+        return tuple(value)
+    return value.prettyPrint()
+
+
+def compact_result(result):
+    """Make result of host's poll picklable and small."""
+    if isinstance(result, Exception):
+        try:
+            pickle.dumps(result)
+        except Exception:
+            result = AbstractException('%s: %s' % (type(result).__name__,
+                                                   result))
+        return result
+    return compact(result)
+
+
+def poll_shard(hosts, results, fields, concurrency, kwargs):
+    """Poll hosts taken from ``hosts`` queue until None is taken in worker
+    process, put (host, result) pairs to ``results`` queue and None when
+    worker is finished.
+
+    """
+    async def take():
+        loop = asyncio.get_running_loop()
+        while True:
+            host = await loop.run_in_executor(None, hosts.get)
+            if host is None:
+                break
+            yield host
+
+    try:
+        for host, result in iterate(apoll_many(take(), fields, concurrency,
+                                               **kwargs)):
+            results.put((host, compact_result(result)))
+    finally:
+        results.put(None)
+
+
+def poll_sharded(hosts, fields, processes=None, concurrency=POLL_CONCURRENCY,
+                 **kwargs):
+    """Poll hosts by ``processes`` worker processes (number of CPUs by
+    default), yield (host, result) pairs in order of answers. Each worker
+    polls up to ``concurrency`` hosts at once in own event loop. Fields and
+    arguments should be picklable.
+
+    """
+    processes = processes or multiprocessing.cpu_count()
+    fields = list(fields)
+    host_queue = multiprocessing.Queue()
+    result_queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(
+        target=poll_shard,
+        args=(host_queue, result_queue, fields, concurrency, kwargs))
+        for _ in range(processes)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    try:
+        for host in hosts:
+            host_queue.put(host)
+        for _ in workers:
+            host_queue.put(None)
+        running = len(workers)
+        while running:
+            try:
+                item = result_queue.get(timeout=1)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    raise AbstractException('Worker processes exited '
+                                            'unexpectedly')
+                continue
+            if item is None:
+                running -= 1
+            else:
+                yield item
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+
+
+def get_devices(hosts, concurrency=POLL_CONCURRENCY, **kwargs):
+    """Synchronous version of :func:`aget_devices`."""
+    return iterate(aget_devices(hosts, concurrency, **kwargs))
@@ -0,0 +1,117 @@
+"""Index of device classes by their classId.
+
+Registry of device classes imports module of class only when it's classId
+is seen first time, if package of classes contains generated ``index``
+module. Otherwise all modules of package are imported to find classes.
+
+Index should be regenerated after device classes are added or changed:
+
+.. code-block:: bash
+
+    python -m snmp_orm.devices snmp_orm.devices
+
+and could be verified by ``--check`` option, which fails if index is
+outdated.
+
+"""
+from __future__ import absolute_import
+
+import os
+import sys
+import pprint
+import importlib
+from optparse import OptionParser
+
+from six import string_types
+
+from snmp_orm import devices
+from snmp_orm.utils import find_classes, symbol_by_name
+
+#: Name of index module in package of device classes.
+INDEX_MODULE = 'index'
+
+INDEX_TEMPLATE = '''"""Index of device classes by their classId.
+
+Generated by ``python -m snmp_orm.devices %(package)s``, don't edit it.
+
+"""
+
+INDEX = %(index)s
+'''
+
+
+def get_class_ids(cls):
+    """Return list of classIds of device class."""
+    class_ids = cls.classId
+    if not isinstance(class_ids, (list, tuple, set)):
+        class_ids = (class_ids, )
+    return [class_id for class_id in class_ids if class_id]
+
+
+def load_index(package):
+    """Return index of package as dictionary of classId to path of class
+    or None if package isn't indexed.
+
+    """
+    package = symbol_by_name(package)
+    try:
+        module = importlib.import_module('%s.%s' % (package.__name__,
+                                                    INDEX_MODULE))
+    except ImportError:
+        return None
+    return module.INDEX
+
+
+def build_index(package, base=devices.AbstractDevice):
+    """Import all modules of package and return index of device classes
+    found in them.
+
+    """
+    package = symbol_by_name(package)
+    index = {}
+    for cls in find_classes(base, [package]):
+        for class_id in get_class_ids(cls):
+            if not isinstance(class_id, string_types):
+                class_id = '.'.join(str(part) for part in class_id)
+            index.setdefault(class_id,
+                             '%s:%s' % (cls.__module__, cls.__name__))
+    return index
+
+
+def get_index_path(package):
+    package = symbol_by_name(package)
+    return os.path.join(package.__path__[0], INDEX_MODULE + '.py')
+
+
+def render_index(package, index):
+    package = symbol_by_name(package)
+    return INDEX_TEMPLATE % {'package': package.__name__,
+                             'index': pprint.pformat(index)}
+
+
+def write_index(package):
+    """Generate index of package and write it to index module."""
+    with open(get_index_path(package), 'w') as f:
+        f.write(render_index(package, build_index(package)))
+
+
+def check_index(package):
+    """Return True if index module of package is up to date."""
+    return load_index(package) == build_index(package)
+
+
+def main(argv=None):
+    parser = OptionParser(usage='python -m snmp_orm.devices [--check] '
+                                '[package ...]',
+                          description='Generate index of device classes.')
+    parser.add_option('--check', action='store_true', default=False,
+                      help="don't write index, fail if it's outdated")
+    options, packages = parser.parse_args(argv)
+    failed = False
+    for package in packages or [devices.__name__]:
+        if not options.check:
+            write_index(package)
+        elif not check_index(package):
+            sys.stderr.write('Index of %s is outdated\n' % package)
+            failed = True
+    return 1 if failed else 0
@@ -3,7 +3,8 @@ from __future__ import absolute_import
 
 from six import iteritems, with_metaclass
 
-from snmp_orm.config import SNMP_PORT, BULK_ROW
+from snmp_orm.config import SNMP_PORT, SNMP_TIMEOUT, SNMP_RETRIES, BULK_ROW, \
+    DEFAULT_POLICY
 
 
 class SettingsMeta(type):
@@ -24,11 +25,18 @@ class SettingsMeta(type):
 
 class BaseSettings(with_metaclass(SettingsMeta, dict)):
 
-    allowed_keys = ("host", "port", "version", "use_bulk", "bulk_rows")
+    allowed_keys = ("host", "port", "version", "use_bulk", "bulk_rows",
+                    "adaptive_bulk", "tuning_key", "timeout", "retries",
+                    "policy", "policy_key", "hedge", "concurrency", "rate",
+                    "burst", "subnet_concurrency", "subnet_prefix")
     default_values = {"port": SNMP_PORT,
+                      "timeout": SNMP_TIMEOUT,
+                      "retries": SNMP_RETRIES,
+                      "policy": DEFAULT_POLICY,
                       "version": lambda v: v if v in (1, 2, 3) else 2,
                       "use_bulk": True,
                       "bulk_rows": BULK_ROW,
+                      "adaptive_bulk": True,
                       }
 
     def __init__(self, **kwargs):
@@ -39,8 +47,8 @@ class BaseSettings(with_metaclass(SettingsMeta, dict)):
     def set_default(self, key, default):
         if key in self.allowed_keys_set:
             if callable(default):
-                self[key] = default(key)
-            elif key not in self or not self[key]:
+                self[key] = default(self.get(key))
+            elif self.get(key) is None:
                 self[key] = default
 
     def prepare_kwargs(self):
@@ -48,6 +56,10 @@ class BaseSettings(with_metaclass(SettingsMeta, dict)):
                     for key, value in iteritems(self)
                     if key in self.allowed_keys_set)
 
+    def get_key(self):
+        """Return hashable key of settings content."""
+        return (type(self), tuple(sorted(iteritems(self.prepare_kwargs()))))
+
 
 class SnmpV2Settings(BaseSettings):
     allowed_keys = ("community", )
@@ -57,4 +69,4 @@ class SnmpV2Settings(BaseSettings):
 class SnmpV3Settings(BaseSettings):
     allowed_keys = ("sec_name", "sec_level",
                     "auth_protocol", "auth_passphrase",
-                    "priv_protocol", "priv_passphrase")
+                    "priv_protocol", "priv_passphrase", "engine_cache")
@@ -0,0 +1,121 @@
+"""Immutable snapshots of groups of device.
+
+Snapshot is loaded by one plan of requests, so all fields of given groups
+are usually received by one or few round trips, see
+:class:`snmp_orm.adapters.planner.Plan`. Groups are attributes of
+snapshot, scalar fields are attributes of groups and table fields are
+read-only dictionaries of row index to value:
+
+.. code-block:: python
+
+    >>> snapshot = device.snapshot(groups=('system', 'ifTable'))
+    >>> snapshot.system.sysName
+    u'switch'
+    >>> snapshot.ifTable.ifDescr[1]
+    u'lo'
+
+Snapshots don't keep reference to device and don't send requests. Classes
+of snapshots define ``__slots__``, they are built once per device class
+and set of groups, see :meth:`snmp_orm.devices.base.DeviceMeta.get_layout`.
+
+"""
+from __future__ import absolute_import
+
+from collections import defaultdict
+
+from six import iteritems
+
+from snmp_orm.fields import TableField
+
+
+class FrozenDict(dict):
+    """Dictionary that can't be changed."""
+
+    def readonly(self, *args, **kwargs):
+        raise TypeError("%s is read-only" % type(self).__name__)
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = \
+        update = readonly
+
+
+class Snapshot(object):
+    """Base of snapshot classes, values are kept in ``__slots__`` of
+    subclass and can't be changed.
+
+    """
+
+    __slots__ = ()
+
+    def __init__(self, values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values.get(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is read-only" % type(self).__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError("%s is read-only" % type(self).__name__)
+
+    def keys(self):
+        return list(self.__slots__)
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.__slots__]
+
+    def __iter__(self):
+        return iter(self.items())
+
+    def __getitem__(self, name):
+        if name not in self.__slots__:
+            raise KeyError("key %r is not defined" % name)
+        return getattr(self, name)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.items() == other.items()
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<%s %r>' % (type(self).__name__, dict(self.items()))
+
+
+def make_class(name, names):
+    """Return snapshot class with given slots."""
+    return type(str(name), (Snapshot, ), {'__slots__': tuple(sorted(names))})
+
+
+class Layout(object):
+    """Plan of requests and classes of snapshot of given groups."""
+
+    def __init__(self, meta, groups):
+        self.groups = tuple(groups)
+        self.plan = meta.get_plan(self.groups)
+        self.classes = {}
+        self.tables = set()
+        for group in self.groups:
+            fields = meta.groups[group]
+            self.classes[group] = make_class(group + 'Snapshot', fields)
+            self.tables.update("%s.%s" % (group, name)
+                               for name, field in iteritems(fields)
+                               if isinstance(field, TableField))
+        self.cls = make_class('DeviceSnapshot', self.groups)
+
+    def build(self, items):
+        """Return snapshot of (``group.field``, value) pairs loaded by
+        plan.
+
+        """
+        values = defaultdict(dict)
+        for key, value in items:
+            group, _, name = key.partition('.')
+            if key in self.tables:
+                value = FrozenDict(value or {})
+            values[group][name] = value
+        return self.cls(dict((group, self.classes[group](values[group]))
+                             for group in self.groups))
+
+    def __repr__(self):
+        return '<%s groups=%r>' % (type(self).__name__, self.groups)
@@ -6,7 +6,7 @@ import select
 from threading import Thread
 
 from pyasn1.codec.ber import encoder, decoder
-from pysnmp.proto import api
+from pysnmp.proto import api, rfc1905
 from pysnmp.carrier.asynsock.dispatch import AsynsockDispatcher
 from pysnmp.carrier.asynsock.dgram import udp
 
@@ -21,6 +21,12 @@ class Instr(object):
     def __cmp__(self, other):
         return cmp(self.name, other)
 
+    def __lt__(self, other):
+        return tuple(self.name) < tuple(getattr(other, 'name', other))
+
+    def __gt__(self, other):
+        return tuple(self.name) > tuple(getattr(other, 'name', other))
+
     def execute(self, module, *args, **kwargs):
         raise NotImplementedError()
 
@@ -49,6 +55,31 @@ class Uptime(Instr):
         )
 
 
+class Variable(Instr):
+    """MIB variable with static value of given type."""
+
+    name = None
+
+    def __init__(self, name, type_name, value):
+        self.name = name
+        self.type_name = type_name
+        self.value = value
+
+    def execute(self, module):
+        return getattr(module, self.type_name)(self.value)
+
+    def write(self, module, value):
+        """Return True if value could be written to variable."""
+        return value.tagSet == self.execute(module).tagSet
+
+
+class ReadOnlyVariable(Variable):
+    """MIB variable that can't be written."""
+
+    def write(self, module, value):
+        return False
+
+
 class Agent(object):
 
     def __init__(self, host, port):
@@ -78,11 +109,18 @@ class Agent(object):
 
     def registerInstr(self, instr):
         assert callable(instr)
-        self._mibInstr.append(instr)
+        bisect.insort(self._mibInstr, instr)
         self._mibInstrIdx[instr.name] = instr
 
-    def cbFun(self, transportDispatcher, transportDomain, transportAddress, wholeMsg):
+    def lookupNext(self, msgVer, oid):
+        """Return next variable after given OID or None if out of MIB."""
         mibInstr = self._mibInstr
+        nextIdx = bisect.bisect(mibInstr, oid)
+        if nextIdx == len(mibInstr):
+            return None
+        return (mibInstr[nextIdx].name, mibInstr[nextIdx](msgVer))
+
+    def cbFun(self, transportDispatcher, transportDomain, transportAddress, wholeMsg):
         mibInstrIdx = self._mibInstrIdx
         while wholeMsg:
             msgVer = api.decodeMessageVersion(wholeMsg)
@@ -105,29 +143,62 @@ class Agent(object):
                 for oid, val in pMod.apiPDU.getVarBinds(reqPDU):
                     errorIndex = errorIndex + 1
                     # Search next OID to report
-                    nextIdx = bisect.bisect(mibInstr, oid)
-                    if nextIdx == len(mibInstr):
-                        # Out of MIB
-                        pMod.apiPDU.setEndOfMibError(rspPDU, errorIndex)
-                    else:
+                    varBind = self.lookupNext(msgVer, oid)
+                    if varBind is not None:
                         # Report value if OID is found
-                        varBinds.append(
-                            (mibInstr[nextIdx].name, mibInstr[nextIdx](msgVer))
-                        )
+                        varBinds.append(varBind)
+                    elif msgVer == api.protoVersion2c:
+                        varBinds.append((oid, rfc1905.endOfMibView))
+                    else:
+                        # Out of MIB
+                        pMod.apiPDU.setEndOfMibError(rspPDU, errorIndex + 1)
+                        varBinds = pMod.apiPDU.getVarBinds(reqPDU)
+                        break
             elif reqPDU.isSameTypeWith(pMod.GetRequestPDU()):
                 for oid, val in pMod.apiPDU.getVarBinds(reqPDU):
+                    errorIndex = errorIndex + 1
                     if oid in mibInstrIdx:
                         varBinds.append(
                             (oid, mibInstrIdx[oid](msgVer))
                         )
+                    elif msgVer == api.protoVersion2c:
+                        varBinds.append((oid, rfc1905.noSuchInstance))
                     else:
                         # No such instance
-                        try:
-                            pMod.apiPDU.setNoSuchInstanceError(rspPDU, errorIndex)
-                        except IndexError:
-                            pass
+                        pMod.apiPDU.setNoSuchInstanceError(rspPDU, errorIndex + 1)
                         varBinds = pMod.apiPDU.getVarBinds(reqPDU)
                         break
+            elif msgVer == api.protoVersion2c and \
+                    reqPDU.isSameTypeWith(pMod.GetBulkRequestPDU()):
+                nonRepeaters = int(pMod.apiBulkPDU.getNonRepeaters(reqPDU))
+                maxRepetitions = int(pMod.apiBulkPDU.getMaxRepetitions(reqPDU))
+                oids = [oid for oid, val in pMod.apiBulkPDU.getVarBinds(reqPDU)]
+                for oid in oids[:nonRepeaters]:
+                    varBinds.append(self.lookupNext(msgVer, oid) or
+                                    (oid, rfc1905.endOfMibView))
+                repeaters = oids[nonRepeaters:]
+                for _ in range(maxRepetitions):
+                    row = [self.lookupNext(msgVer, oid) or
+                           (oid, rfc1905.endOfMibView)
+                           for oid in repeaters]
+                    varBinds.extend(row)
+                    if all(val is rfc1905.endOfMibView for _, val in row):
+                        break
+                    repeaters = [oid for oid, val in row]
+            elif reqPDU.isSameTypeWith(pMod.SetRequestPDU()):
+                varBinds = pMod.apiPDU.getVarBinds(reqPDU)
+                for errorIndex, (oid, val) in enumerate(varBinds, 1):
+                    instr = mibInstrIdx.get(oid)
+                    if not isinstance(instr, Variable) or \
+                            not instr.write(pMod, val):
+                        # notWritable or noSuchName, nothing is set
+                        pMod.apiPDU.setErrorStatus(
+                            rspPDU, 17 if msgVer == api.protoVersion2c else 2)
+                        pMod.apiPDU.setErrorIndex(rspPDU, errorIndex)
+                        break
+                else:
+                    for oid, val in varBinds:
+                        mibInstrIdx[oid].value = val
             else:
                 # Report unsupported request type
                 pMod.apiPDU.setErrorStatus(rspPDU, 'genErr')
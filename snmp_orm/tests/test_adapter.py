@@ -1,13 +1,29 @@
 """Load and store all existed adapter's classes."""
 from __future__ import absolute_import
 
+import time
 import unittest
+from threading import Thread
 
-from pysnmp.proto.rfc1902 import TimeTicks
+from mock import Mock, patch
+from pysnmp.proto.rfc1902 import TimeTicks, Integer, OctetString
+from pysnmp.proto.rfc1905 import EndOfMibView
 
 from snmp_orm.tests.utils import TestCase
-from snmp_orm.adapters.base import AbstractAdapter
+from snmp_orm.tests.agent import SysDescr, Uptime, Variable, \
+    ReadOnlyVariable
+from snmp_orm.tests.test_device import ObjectID
+from snmp_orm.adapters.base import AbstractAdapter, TooBigException, \
+    SetException, NotAppliedException, TimeoutException, Walker
+from snmp_orm.adapters.batch import Deferred
+from snmp_orm.adapters.pysnmp import Adapter
+from snmp_orm.adapters.tuning import BulkRowsTuner
+from snmp_orm.adapters.policy import Policy, AdaptivePolicy
+from snmp_orm.adapters.limits import Limiter, LimitedSession, get_subnet
+from snmp_orm.devices import DefaultDevice
 from snmp_orm.adapter import get_adapter
+from snmp_orm.device import get_device
+from snmp_orm.utils import LRUCache, TTLCache, OID, str_to_oid
 from snmp_orm import config
 
 
@@ -28,5 +44,491 @@ class TestSequenceFunctions(TestCase):
         self.assertTrue(isinstance(self.adapter.get_one("1.3.6.1.2.1.1.3.0"), TimeTicks))
 
 
+class TestOID(unittest.TestCase):
+
+    def test_parse(self):
+        oid = str_to_oid('1.3.6.1.2.1.1.5.0')
+        self.assertTrue(isinstance(oid, OID))
+        self.assertEqual((1, 3, 6, 1, 2, 1, 1, 5, 0), oid)
+        self.assertEqual(hash((1, 3, 6, 1, 2, 1, 1, 5, 0)), hash(oid))
+        self.assertTrue(oid is str_to_oid('1.3.6.1.2.1.1.5.0'))
+        self.assertTrue(oid is str_to_oid(oid))
+        self.assertEqual(oid, str_to_oid('.1.3.6.1.2.1.1.5.0'))
+        self.assertEqual(oid, str_to_oid((1, 3, 6, 1, 2, 1, 1, 5, 0)))
+        self.assertEqual('1.3.6.1.2.1.1.5.0', str(oid))
+
+    def test_prefix(self):
+        oid = OID((1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 7))
+        self.assertTrue(oid.startswith((1, 3, 6, 1, 2, 1, 2, 2, 1, 2)))
+        self.assertFalse(oid.startswith((1, 3, 6, 1, 2, 1, 2, 2, 1, 3)))
+        self.assertEqual((7, ), oid.index_after((1, 3, 6, 1, 2, 1, 2, 2, 1,
+                                                 2)))
+        self.assertEqual(None, oid.index_after((1, 3, 6, 1, 4)))
+
+    def test_ordering(self):
+        oids = [str_to_oid(s) for s in ('1.3.6.1.2.1.2', '1.3.6.1.2.1.1.9',
+                                        '1.3.6.1.2.1.10', '1.3.6.1.2.1.1')]
+        self.assertEqual(['1.3.6.1.2.1.1', '1.3.6.1.2.1.1.9',
+                          '1.3.6.1.2.1.2', '1.3.6.1.2.1.10'],
+                         [str(oid) for oid in sorted(oids)])
+
+
+class TestWalker(unittest.TestCase):
+
+    def test_sibling_of_same_length(self):
+        rows = [(str_to_oid('1.3.6.1.4.1.99.1.1'), Integer(1)),
+                (str_to_oid('1.3.6.1.4.1.99.1.2'), Integer(2)),
+                (str_to_oid('1.3.6.1.4.1.100.0'), Integer(3))]
+        agent = Mock()
+        agent.getbulk.return_value = rows
+        walker = Walker(agent, '1.3.6.1.4.1.99.1')
+        self.assertEqual(rows[:2], next(walker))
+        self.assertTrue(walker.raise_stop)
+        self.assertRaises(StopIteration, next, walker)
+
+
+class TestPool(TestCase):
+
+    instructions = (SysDescr(), ObjectID(), Uptime())
+
+    def test_lru(self):
+        cache = LRUCache(2)
+        cache.set(1, 'a')
+        cache.set(2, 'b')
+        self.assertEqual('a', cache.get(1))
+        cache.set(3, 'c')
+        self.assertEqual([1, 3], list(cache.data))
+        self.assertEqual('d', cache.get_or_create(4, lambda: 'd'))
+        self.assertEqual([3, 4], list(cache.data))
+        cache.set(5, None)
+        self.assertEqual(None, cache.get_or_create(5, lambda: 'e'))
+
+    def test_ttl(self):
+        cache = TTLCache(2, 60)
+        cache.set(1, 'a')
+        cache.set(2, 'b', expires=0)
+        self.assertEqual('a', cache.get(1))
+        self.assertEqual(None, cache.get(2))
+        self.assertEqual([1], list(cache.data))
+        self.assertEqual([1], [key for key, _, _ in cache.items()])
+
+    def test_adapter_reuse(self):
+        host, port = config.SNMP_TEST_AGENT_ADDRESS
+        adapter = get_adapter(host, port=port)
+        self.assertTrue(adapter is get_adapter(host, port=port))
+        self.assertFalse(adapter is get_adapter(host, port=port,
+                                                community='private'))
+        other = get_adapter(host, port=port, pooled=False)
+        self.assertFalse(adapter is other)
+        self.assertFalse(adapter.session_read is other.session_read)
+
+    def test_shared_session(self):
+        host, port = config.SNMP_TEST_AGENT_ADDRESS
+        adapter = get_adapter(host, port=port)
+        values = []
+
+        def run():
+            for _ in range(10):
+                values.append(adapter.get_one("1.3.6.1.2.1.1.1.0"))
+
+        threads = [Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(40, len(values))
+        self.assertTrue(all(str(value).startswith("PySNMP")
+                            for value in values))
+
+    def test_device_reuse(self):
+        with patch.object(Adapter, 'get_snmp_v2_session', autospec=True,
+                          side_effect=Adapter.get_snmp_v2_session) as getter:
+            first = get_device(self.test_host, port=self.test_port,
+                               community='pool-test')
+            second = get_device(self.test_host, port=self.test_port,
+                                community='pool-test',
+                                device_cls=type(first))
+            self.assertTrue(first.adapter is second.adapter)
+            self.assertEqual(1, getter.call_count)
+
+
+class TestBatch(TestCase):
+
+    def setUp(self):
+        super(TestBatch, self).setUp()
+        host, port = config.SNMP_TEST_AGENT_ADDRESS
+        self.adapter = get_adapter(host, port=port)
+
+    def test_batch_per_thread(self):
+        values = []
+        with self.adapter.batch():
+            thread = Thread(target=lambda: values.append(
+                self.adapter.get_one("1.3.6.1.2.1.1.1.0")))
+            thread.start()
+            thread.join()
+            deferred = self.adapter.get_one("1.3.6.1.2.1.1.1.0")
+        self.assertFalse(isinstance(values[0], Deferred))
+        self.assertEqual(values[0], deferred.value)
+
+    def test_batch_values(self):
+        with self.adapter.batch():
+            descr = self.adapter.get_one("1.3.6.1.2.1.1.1.0")
+            uptime = self.adapter.get_one("1.3.6.1.2.1.1.3.0")
+            self.assertTrue(isinstance(descr, Deferred))
+            self.assertRaises(ValueError, lambda: descr.value)
+        self.assertTrue(str(descr.value).startswith("PySNMP"))
+        self.assertTrue(isinstance(uptime.value, TimeTicks))
+
+    def test_batch_requests(self):
+        with patch.object(self.adapter, 'get', wraps=self.adapter.get) as get:
+            with self.adapter.batch():
+                self.adapter.get_one("1.3.6.1.2.1.1.1.0")
+                self.adapter.get_one("1.3.6.1.2.1.1.3.0")
+                self.adapter.get_one("1.3.6.1.2.1.1.3.0")
+            self.assertEqual(1, get.call_count)
+            self.assertEqual(2, len(get.call_args[0]))
+
+    def test_batch_split(self):
+        with patch.object(self.adapter, 'get', wraps=self.adapter.get) as get:
+            with self.adapter.batch(max_varbinds=1):
+                self.adapter.get_one("1.3.6.1.2.1.1.1.0")
+                self.adapter.get_one("1.3.6.1.2.1.1.3.0")
+            self.assertEqual(2, get.call_count)
+            with self.adapter.batch(max_size=20):
+                self.adapter.get_one("1.3.6.1.2.1.1.1.0")
+                self.adapter.get_one("1.3.6.1.2.1.1.3.0")
+            self.assertEqual(4, get.call_count)
+
+    def test_device_batch(self):
+        device = DefaultDevice(self.test_host, port=self.test_port)
+        with device.batch():
+            descr = device.system.sysDescr
+            uptime = device.system.sysUpTime
+        self.assertTrue(descr.value.startswith("PySNMP"))
+        self.assertTrue(uptime.value.total_seconds() >= 0)
+
+
+class TestSet(TestCase):
+
+    @property
+    def instructions(self):
+        return (
+            Variable((1, 3, 6, 1, 2, 1, 1, 5, 0), 'OctetString', 'host'),
+            Variable((1, 3, 6, 1, 2, 1, 1, 6, 0), 'OctetString', ''),
+            Variable((1, 3, 6, 1, 2, 1, 2, 2, 1, 7, 1), 'Integer', 1),
+            Variable((1, 3, 6, 1, 2, 1, 2, 2, 1, 7, 2), 'Integer', 1),
+            ReadOnlyVariable((1, 3, 6, 1, 2, 1, 1, 1, 0), 'OctetString',
+                             'descr'),
+        )
+
+    def setUp(self):
+        super(TestSet, self).setUp()
+        self.adapter = get_adapter(self.test_host, port=self.test_port)
+
+    def test_set(self):
+        self.adapter.set("1.3.6.1.2.1.1.5.0", OctetString('switch'))
+        self.assertEqual(OctetString('switch'),
+                         self.adapter.get_one("1.3.6.1.2.1.1.5.0"))
+
+    def test_set_many(self):
+        variables = [((1, 3, 6, 1, 2, 1, 1, 5, 0), OctetString('switch')),
+                     ((1, 3, 6, 1, 2, 1, 1, 6, 0), OctetString('rack')),
+                     ((1, 3, 6, 1, 2, 1, 2, 2, 1, 7, 1), Integer(2))]
+        with patch.object(self.adapter.session_write, 'set',
+                          wraps=self.adapter.session_write.set) as set:
+            result = self.adapter.set_many(variables)
+            self.assertEqual(1, set.call_count)
+            self.adapter.set_many(variables, max_varbinds=2)
+            self.assertEqual(3, set.call_count)
+        self.assertEqual(variables, result)
+        self.assertEqual(variables, self.adapter.get(*[oid for oid, _ in
+                                                       variables]))
+
+    def test_set_errors(self):
+        variables = [((1, 3, 6, 1, 2, 1, 1, 5, 0), OctetString('switch')),
+                     ((1, 3, 6, 1, 2, 1, 1, 1, 0), OctetString('descr')),
+                     ((1, 3, 6, 1, 2, 1, 2, 2, 1, 7, 1), Integer(2)),
+                     ((1, 3, 6, 1, 2, 1, 2, 2, 1, 7, 2), Integer(2))]
+        try:
+            self.adapter.set_many(variables, max_varbinds=2)
+        except SetException as e:
+            errors = e.errors
+            self.assertEqual(variables[2:], e.variables)
+        else:
+            self.fail("SetException isn't raised")
+        self.assertEqual([oid for oid, _ in variables[:2]], list(errors))
+        self.assertTrue(isinstance(errors[variables[0][0]],
+                                   NotAppliedException))
+        self.assertEqual('notWritable', errors[variables[1][0]].status)
+        self.assertEqual(2, errors[variables[1][0]].index)
+        self.assertEqual(OctetString('host'),
+                         self.adapter.get_one("1.3.6.1.2.1.1.5.0"))
+
+    def test_device_set_many(self):
+        device = DefaultDevice(self.test_host, port=self.test_port)
+        with patch.object(device.adapter.session_write, 'set',
+                          wraps=device.adapter.session_write.set) as set:
+            device.set_many({'system.sysName': 'switch',
+                             'ifTable.ifAdminStatus': {1: 'down', 2: 'down'}})
+            device.system.set_many({'sysLocation': 'rack'})
+            self.assertEqual(2, set.call_count)
+        self.assertEqual('switch', device.system.sysName)
+        self.assertEqual('rack', device.system.sysLocation)
+        self.assertEqual({1: {'ifAdminStatus': 'down'},
+                          2: {'ifAdminStatus': 'down'}},
+                         device.ifTable.fetch_table('ifAdminStatus'))
+        self.assertRaises(KeyError, device.set_many, {'system.foo': 1})
+
+    def test_batch_set(self):
+        device = DefaultDevice(self.test_host, port=self.test_port)
+        with patch.object(device.adapter, 'set_many',
+                          wraps=device.adapter.set_many) as set_many:
+            with device.batch():
+                device.system.sysName = 'switch'
+                device.system.sysDescr = 'other'
+                device.ifTable.ifAdminStatus[1] = 'down'
+                name = device.system.sysName
+            self.assertEqual(1, set_many.call_count)
+        self.assertEqual('host', name.value)
+        self.assertEqual('host', device.system.sysName)
+        self.assertEqual('up', device.ifTable.ifAdminStatus[1])
+
+
+class TestPrepared(TestCase):
+
+    instructions = (SysDescr(), ObjectID(), Uptime())
+
+    def test_prepared_group(self):
+        device = DefaultDevice(self.test_host, port=self.test_port)
+        request = device.prepare('system', '1.3.6.1.2.1.1.2.0')
+        with patch.object(device.adapter, 'get',
+                          wraps=device.adapter.get) as get:
+            values = dict(request.send())
+            self.assertEqual(1, get.call_count)
+        self.assertTrue(values['sysDescr'].startswith('PySNMP'))
+        self.assertEqual(None, values['sysContact'])
+        self.assertEqual((1, 3, 6, 1, 4, 1, 8072, 3, 2, 10),
+                         tuple(values[(1, 3, 6, 1, 2, 1, 1, 2, 0)]))
+
+    def test_prepared_fields(self):
+        group = DefaultDevice.meta.groups['system']
+        adapter = get_adapter(self.test_host, port=self.test_port)
+        request = adapter.prepare(group['sysUpTime'], group['sysDescr'])
+        self.assertEqual([group['sysUpTime'], group['sysDescr']],
+                         [key for key, _ in request.send()])
+        self.assertRaises(TypeError, adapter.prepare,
+                          DefaultDevice.meta.groups['ifTable']['ifDescr'])
+
+
+class TestTuning(TestCase):
+
+    def setUp(self):
+        super(TestTuning, self).setUp()
+        host, port = config.SNMP_TEST_AGENT_ADDRESS
+        self.adapter = get_adapter(host, port=port, tuning_key='test-tuning')
+        self.adapter.tuner.value = 40
+
+    def rows(self, count, last=None):
+        result = [((1, 3, 6, 1, i), Integer(i)) for i in range(count)]
+        if last is not None:
+            result[-1] = (result[-1][0], last)
+        return result
+
+    def test_tuner_feedback(self):
+        tuner = BulkRowsTuner(40, minimum=2, maximum=50, fast=1)
+        tuner.feedback(40, 1, self.rows(40), 0.1)
+        self.assertEqual(50, tuner.value)
+        tuner.feedback(50, 1, self.rows(50), 0.1)
+        self.assertEqual(50, tuner.value)
+        tuner.feedback(50, 2, self.rows(100), 2)
+        self.assertEqual(50, tuner.value)
+        tuner.feedback(50, 2, self.rows(30), 0.1)
+        self.assertEqual(15, tuner.value)
+        tuner.feedback(15, 1, self.rows(3, EndOfMibView()), 0.1)
+        self.assertEqual(15, tuner.value)
+        while tuner.shrink():
+            pass
+        self.assertEqual(2, tuner.value)
+
+    def test_getbulk_shrink(self):
+        session = self.adapter.session_read
+        result = self.rows(10)
+        with patch.object(session, 'getbulk',
+                          side_effect=[TooBigException(), result]) as getbulk:
+            self.assertEqual(result, self.adapter.getbulk(None, '1.3.6.1'))
+            self.assertEqual([40, 20], [call[0][0]
+                                        for call in getbulk.call_args_list])
+        self.assertEqual(10, self.adapter.tuner.value)
+
+    def test_getbulk_timeout(self):
+        session = self.adapter.session_read
+        with patch.object(session, 'getbulk',
+                          side_effect=TimeoutException()) as getbulk:
+            self.assertRaises(TimeoutException, self.adapter.getbulk,
+                              None, '1.3.6.1')
+            self.assertEqual(1, getbulk.call_count)
+        self.assertEqual(20, self.adapter.tuner.value)
+
+    def test_getbulk_explicit_rows(self):
+        with patch.object(self.adapter.session_read, 'getbulk',
+                          return_value=[]) as getbulk:
+            self.adapter.getbulk(5, '1.3.6.1')
+            self.assertEqual(5, getbulk.call_args[0][0])
+        self.assertEqual(40, self.adapter.tuner.value)
+
+    def test_session_rows(self):
+        session = self.adapter.session_read
+        dispatcher = session.generator.snmpEngine.msgAndPduDsp
+        with patch.object(dispatcher, 'sendPdu',
+                          wraps=dispatcher.sendPdu) as sendPdu:
+            rows = session.getbulk(1, '1.3.6.1.2.1.1')
+            self.assertEqual(1, sendPdu.call_count)
+        self.assertEqual([(1, 3, 6, 1, 2, 1, 1, 1, 0)],
+                         [oid for oid, _ in rows])
+
+    def test_disabled(self):
+        host, port = config.SNMP_TEST_AGENT_ADDRESS
+        adapter = get_adapter(host, port=port, adaptive_bulk=False)
+        self.assertEqual(None, adapter.tuner)
+
+
+class TestPolicy(unittest.TestCase):
+
+    def test_fixed(self):
+        policy = Policy(timeout=2, retries=2)
+        self.assertEqual([2, 2, 2], policy.timeouts())
+        self.assertEqual(None, policy.hedge_delay(2))
+        policy.record(0.1)
+        policy.record(None, 3)
+        self.assertEqual({'requests': 2, 'failures': 1,
+                          'retransmissions': 2, 'hedges': 0}, policy.stats())
+
+    def test_rto(self):
+        policy = AdaptivePolicy(timeout=1, retries=3, min_timeout=0.05,
+                                max_timeout=4, max_total=11)
+        self.assertEqual([1, 2, 4, 4], policy.timeouts())
+        for _ in range(50):
+            policy.record(0.02)
+        self.assertAlmostEqual(0.05, policy.rto)
+        for _ in range(50):
+            policy.record(0.2)
+        self.assertTrue(0.2 < policy.rto < 0.3)
+        # retransmitted requests aren't sampled
+        policy.record(3, attempts=2)
+        self.assertTrue(policy.rto < 0.3)
+        rto = policy.rto
+        policy.record(None, 4)
+        self.assertAlmostEqual(rto * 2, policy.rto)
+        policy.record(0.2)
+        self.assertTrue(policy.rto < 0.3)
+
+    def test_hedge(self):
+        policy = AdaptivePolicy(timeout=1, retries=1, hedge=90)
+        self.assertEqual(None, policy.hedge_delay(1))
+        for i in range(100):
+            policy.record(0.01 * (i % 10 + 1))
+        self.assertAlmostEqual(0.1, policy.hedge_delay(1))
+        self.assertEqual(None, policy.hedge_delay(0.05))
+        for _ in range(12):
+            policy.record(0.5, hedged=True)
+        # budget is spent
+        self.assertEqual(None, policy.hedge_delay(1))
+
+    def test_dead_host(self):
+        policy = AdaptivePolicy(timeout=1, retries=5)
+        self.assertEqual([1, 2, 3], policy.timeouts())
+        for _ in range(10):
+            policy.record(None, 6)
+        # backed off timeout doesn't exceed time of fixed policy
+        self.assertEqual([6], policy.timeouts())
+        self.assertTrue(sum(policy.timeouts()) <=
+                        sum(Policy(timeout=1, retries=5).timeouts()))
+
+    def test_budget_remainder(self):
+        policy = AdaptivePolicy(timeout=0.3, retries=3, min_timeout=0.1,
+                                max_total=0.9000001)
+        # 0.3 + 0.6 leaves remainder below minimal timeout
+        self.assertEqual(2, len(policy.timeouts()))
+        policy = AdaptivePolicy(timeout=1, retries=3, min_timeout=0.5,
+                                max_total=3.7)
+        timeouts = policy.timeouts()
+        self.assertEqual([1, 2], timeouts[:2])
+        self.assertAlmostEqual(0.7, timeouts[2])
+        self.assertEqual(3, len(timeouts))
+
+    def test_adapter_policy(self):
+        host, port = config.SNMP_TEST_AGENT_ADDRESS
+        adapter = get_adapter(host, port=port, timeout=2, retries=1,
+                              class_name='snmp_orm.adapters.ber')
+        self.assertTrue(isinstance(adapter.policy, AdaptivePolicy))
+        self.assertTrue(adapter.session_read.policy is adapter.policy)
+        self.assertEqual([2, 2], adapter.policy.timeouts())
+        adapter = get_adapter(host, port=port,
+                              policy='snmp_orm.adapters.policy:Policy')
+        self.assertEqual(Policy, type(adapter.policy))
+
+
+class LimitedDevice(DefaultDevice):
+
+    class AdapterParams:
+        concurrency = 1
+        rate = 1000
+        subnet_concurrency = 4
+
+
+class TestLimits(TestCase):
+
+    def test_rate(self):
+        limiter = Limiter(rate=20, burst=2)
+        started = time.time()
+        for _ in range(4):
+            limiter.acquire()
+            limiter.release()
+        self.assertTrue(time.time() - started >= 0.09)
+        self.assertEqual(2, limiter.waits)
+        self.assertTrue(limiter.poll() > 0)
+
+    def test_concurrency(self):
+        limiter = Limiter(concurrency=2)
+        session = LimitedSession(Mock(), [limiter])
+        active = []
+
+        def get(*args):
+            active.append(limiter.active)
+            time.sleep(0.01)
+
+        session.session.get.side_effect = get
+        threads = [Thread(target=session.get, args=((1, 3, 6), ))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(8, len(active))
+        self.assertTrue(max(active) <= 2)
+        self.assertEqual(0, limiter.active)
+        self.assertEqual(None, limiter.poll())
+        self.assertEqual(None, limiter.poll())
+        self.assertTrue(limiter.poll() > 0)
+
+    def test_subnet(self):
+        self.assertEqual('10.1.2.0/24', get_subnet('10.1.2.3'))
+        self.assertEqual('10.0.0.0/8', get_subnet('10.1.2.3', 8))
+        self.assertEqual('2001:db8::/64', get_subnet('2001:db8::1'))
+
+    def test_adapter_params(self):
+        device = LimitedDevice(self.test_host, port=self.test_port)
+        adapter = device.adapter
+        self.assertTrue(isinstance(adapter.session_read, LimitedSession))
+        self.assertTrue(adapter.session_write is adapter.session_read)
+        self.assertEqual([1, 4], [limiter.concurrency
+                                  for limiter in adapter.limiters])
+        self.assertTrue(device.system.sysDescr.startswith('PySNMP'))
+        self.assertEqual(1, adapter.limiters[0].requests)
+        self.assertEqual(0, adapter.limiters[0].active)
+        unlimited = DefaultDevice(self.test_host, port=self.test_port)
+        self.assertEqual([], unlimited.adapter.limiters)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,157 @@
+from __future__ import absolute_import
+
+import socket
+import unittest
+
+from mock import patch
+from pysnmp.proto.rfc1902 import TimeTicks, OctetString
+
+from snmp_orm.tests.utils import TestCase
+from snmp_orm.adapter import get_adapter
+from snmp_orm.adapters.base import SetException
+from snmp_orm.adapters.limits import UnresolvedLimiter, get_limiter
+from snmp_orm.devices import DefaultDevice
+
+try:
+    import asyncio
+    from snmp_orm.adapters.asyncio import Adapter, AsyncioTimeout, \
+        get_engine
+except (ImportError, SyntaxError):
+    asyncio = None
+
+ADAPTER = 'snmp_orm.adapters.asyncio'
+
+
+@unittest.skipIf(asyncio is None, 'asyncio is not available')
+class TestAsyncioAdapter(TestCase):
+
+    def setUp(self):
+        super(TestAsyncioAdapter, self).setUp()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.adapter = get_adapter(self.test_host, port=self.test_port,
+                                   class_name=ADAPTER)
+
+    def tearDown(self):
+        get_engine(self.loop).close()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        super(TestAsyncioAdapter, self).tearDown()
+
+    def run_until_complete(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_adapter_class(self):
+        self.assertTrue(isinstance(self.adapter, Adapter))
+
+    def test_adapter_get(self):
+        value = self.run_until_complete(
+            self.adapter.get_one("1.3.6.1.2.1.1.1.0"))
+        self.assertTrue(str(value).startswith("PySNMP"))
+
+    def test_adapter_result_type(self):
+        value = self.run_until_complete(
+            self.adapter.get_one("1.3.6.1.2.1.1.3.0"))
+        self.assertTrue(isinstance(value, TimeTicks))
+
+    def test_adapter_getnext(self):
+        rows = self.run_until_complete(
+            self.adapter.getnext("1.3.6.1.2.1.1.1.0"))
+        self.assertEqual([(1, 3, 6, 1, 2, 1, 1, 3, 0)],
+                         [oid for oid, _ in rows])
+
+    def test_adapter_walk(self):
+        rows = self.run_until_complete(self.adapter.walk("1.3.6.1.2.1.1"))
+        self.assertEqual([(1, 3, 6, 1, 2, 1, 1, 1, 0),
+                          (1, 3, 6, 1, 2, 1, 1, 3, 0)],
+                         [oid for oid, _ in rows])
+
+    def test_adapter_iter_walk(self):
+        rows = self.adapter.iter_walk("1.3.6.1.2.1.1")
+        oids = []
+        while True:
+            try:
+                oids.append(self.run_until_complete(rows.__anext__())[0])
+            except StopAsyncIteration:
+                break
+        self.assertEqual([(1, 3, 6, 1, 2, 1, 1, 1, 0),
+                          (1, 3, 6, 1, 2, 1, 1, 3, 0)], oids)
+
+    def test_adapter_walk_many(self):
+        columns = self.run_until_complete(self.adapter.walk_many(
+            ["1.3.6.1.2.1.1.1", "1.3.6.1.2.1.1.2", "1.3.6.1.2.1.1.3"]))
+        self.assertEqual([[(1, 3, 6, 1, 2, 1, 1, 1, 0)], [],
+                          [(1, 3, 6, 1, 2, 1, 1, 3, 0)]],
+                         [[oid for oid, _ in rows] for rows in columns])
+
+    def test_set_many_errors(self):
+        with self.assertRaises(SetException) as context:
+            self.run_until_complete(self.adapter.set_many(
+                [("1.3.6.1.2.1.1.1.0", OctetString('descr'))]))
+        error = context.exception.errors[(1, 3, 6, 1, 2, 1, 1, 1, 0)]
+        self.assertEqual(('notWritable', 1), (error.status, error.index))
+
+    def test_concurrent_requests(self):
+        values = self.run_until_complete(asyncio.gather(*[
+            self.adapter.get_one("1.3.6.1.2.1.1.1.0") for _ in range(20)
+        ]))
+        self.assertEqual(20, len(values))
+        self.assertTrue(all(str(value).startswith("PySNMP")
+                            for value in values))
+        engine = get_engine(self.loop)
+        self.assertEqual({}, engine.pending)
+        self.assertEqual(1, len(engine.protocols))
+
+    def test_request_timeout(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(server.close)
+        server.bind(('127.0.0.1', 0))
+        adapter = get_adapter('127.0.0.1', port=server.getsockname()[1],
+                              class_name=ADAPTER, timeout=0.05, retries=1)
+        with self.assertRaises(AsyncioTimeout):
+            self.run_until_complete(adapter.get_one("1.3.6.1.2.1.1.1.0"))
+        self.assertEqual(2, adapter.session_read.policy.retransmissions + 1)
+        engine = get_engine(self.loop)
+        self.assertEqual(({}, None), (engine.pending, engine.handle))
+
+    def test_limited_requests(self):
+        adapter = get_adapter(self.test_host, port=self.test_port,
+                              class_name=ADAPTER, concurrency=2, rate=1000)
+        values = self.run_until_complete(asyncio.gather(*[
+            adapter.get_one("1.3.6.1.2.1.1.1.0") for _ in range(10)
+        ]))
+        self.assertEqual(10, len(values))
+        limiter = adapter.limiters[0]
+        self.assertEqual((10, 0), (limiter.requests, limiter.active))
+
+    def test_subnet_resolved_lazily(self):
+        with patch('snmp_orm.adapters.limits.socket.getaddrinfo') as resolve:
+            adapter = get_adapter('localhost', port=self.test_port,
+                                  class_name=ADAPTER, subnet_concurrency=2)
+        self.assertFalse(resolve.called)
+        self.assertTrue(isinstance(adapter.limiters[0], UnresolvedLimiter))
+        self.assertTrue(str(self.run_until_complete(
+            adapter.get_one("1.3.6.1.2.1.1.1.0"))).startswith("PySNMP"))
+        limiter = adapter.limiters[0]
+        self.assertTrue(limiter is get_limiter(('subnet', '127.0.0.0/24'), 2))
+        self.assertEqual(1, limiter.requests)
+
+    def test_device_access(self):
+        device = DefaultDevice(self.test_host, port=self.test_port,
+                               class_name=ADAPTER)
+        self.assertTrue(self.run_until_complete(
+            device.system.sysDescr).startswith("PySNMP"))
+        values = dict(self.run_until_complete(device.system.fetch()))
+        self.assertTrue(values['sysDescr'].startswith("PySNMP"))
+
+    def test_cached_field(self):
+        device = DefaultDevice(self.test_host, port=self.test_port,
+                               class_name=ADAPTER)
+        first = self.run_until_complete(device.system.sysDescr)
+        self.assertEqual(first,
+                         self.run_until_complete(device.system.sysDescr))
+        self.assertEqual(1, device.cache.stats()['hits'])
+
+
+if __name__ == "__main__":
+    unittest.main()
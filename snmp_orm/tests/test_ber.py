@@ -0,0 +1,213 @@
+from __future__ import absolute_import
+
+import unittest
+
+from mock import patch
+from pyasn1.type import univ
+from pyasn1.codec.ber import encoder, decoder
+from pysnmp.proto import api, rfc1902, rfc1905
+
+from snmp_orm.tests.utils import TestCase
+from snmp_orm.tests.test_device import ObjectID, IF_TABLE
+from snmp_orm.tests.agent import SysDescr, Uptime
+from snmp_orm.adapter import get_adapter
+from snmp_orm.adapters import ber
+from snmp_orm.devices import DefaultDevice
+
+ADAPTER = 'snmp_orm.adapters.ber'
+
+OIDS = [(1, 3, 6, 1, 2, 1, 1, 1, 0),
+        (1, 3, 6, 1, 4, 1, 200000, 3, 127, 128),
+        (2, 100, 3)]
+
+
+def make_message(pMod, pdu, community='public'):
+    msg = pMod.Message()
+    pMod.apiMessage.setDefaults(msg)
+    pMod.apiMessage.setCommunity(msg, community)
+    pMod.apiMessage.setPDU(msg, pdu)
+    return encoder.encode(msg)
+
+
+class TestCodec(unittest.TestCase):
+
+    def encode_request(self, version, pdu, request_id, oids):
+        pMod = api.protoModules[version]
+        pMod.apiPDU.setDefaults(pdu)
+        pMod.apiPDU.setRequestID(pdu, request_id)
+        pMod.apiPDU.setVarBinds(pdu, [(oid, pMod.null) for oid in oids])
+        return pMod, pdu
+
+    def test_encode_get(self):
+        for version, message_version in ((api.protoVersion1, 0),
+                                         (api.protoVersion2c, 1)):
+            pMod = api.protoModules[version]
+            for pdu_cls, tag in ((pMod.GetRequestPDU, ber.GET_REQUEST),
+                                 (pMod.GetNextRequestPDU,
+                                  ber.GET_NEXT_REQUEST)):
+                for request_id in (0, 127, 128, 300000, 0x7fffffff):
+                    _, pdu = self.encode_request(version, pdu_cls(),
+                                                 request_id, OIDS)
+                    self.assertEqual(
+                        make_message(pMod, pdu),
+                        ber.encode_message(message_version, b'public', tag,
+                                           request_id, OIDS))
+
+    def test_encode_getbulk(self):
+        pMod = api.protoModules[api.protoVersion2c]
+        oids = OIDS * 20  # long form of lengths
+        pdu = pMod.GetBulkRequestPDU()
+        pMod.apiBulkPDU.setDefaults(pdu)
+        pMod.apiBulkPDU.setRequestID(pdu, 42)
+        pMod.apiBulkPDU.setNonRepeaters(pdu, 1)
+        pMod.apiBulkPDU.setMaxRepetitions(pdu, 250)
+        pMod.apiBulkPDU.setVarBinds(pdu, [(oid, pMod.null) for oid in oids])
+        self.assertEqual(
+            make_message(pMod, pdu, 'private'),
+            ber.encode_message(1, b'private', ber.GET_BULK_REQUEST, 42,
+                               oids, 1, 250))
+
+    def test_decode_response(self):
+        pMod = api.protoModules[api.protoVersion2c]
+        variables = [
+            ((1, 3, 6, 1, 1), rfc1902.Integer(-129)),
+            ((1, 3, 6, 1, 2), rfc1902.Integer(2147483647)),
+            ((1, 3, 6, 1, 3), rfc1902.OctetString(b'\x00\xffabc' * 50)),
+            ((1, 3, 6, 1, 4), univ.ObjectIdentifier((1, 3, 6, 1, 4, 1, 9))),
+            ((1, 3, 6, 1, 5), rfc1902.IpAddress('10.0.0.1')),
+            ((1, 3, 6, 1, 6), rfc1902.Counter32(4294967295)),
+            ((1, 3, 6, 1, 7), rfc1902.Gauge32(0)),
+            ((1, 3, 6, 1, 8), rfc1902.TimeTicks(512281800)),
+            ((1, 3, 6, 1, 9), rfc1902.Opaque(b'\x9f\x78\x04')),
+            ((1, 3, 6, 1, 10), rfc1902.Counter64(18446744073709551615)),
+            ((1, 3, 6, 1, 11), rfc1905.noSuchObject),
+            ((1, 3, 6, 1, 12), rfc1905.noSuchInstance),
+            ((1, 3, 6, 1, 13), rfc1905.endOfMibView),
+            ((1, 3, 6, 1, 14), univ.Null('')),
+        ]
+        pdu = pMod.GetResponsePDU()
+        pMod.apiPDU.setDefaults(pdu)
+        pMod.apiPDU.setRequestID(pdu, 1000)
+        pMod.apiPDU.setErrorStatus(pdu, 2)
+        pMod.apiPDU.setErrorIndex(pdu, 3)
+        pMod.apiPDU.setVarBinds(pdu, variables)
+        data = make_message(pMod, pdu)
+
+        version, community, request_id, status, index, result = \
+            ber.decode_response(data)
+        self.assertEqual((1, b'public', 1000, 2, 3),
+                         (version, community, request_id, status, index))
+        expected = pMod.apiPDU.getVarBinds(pMod.apiMessage.getPDU(
+            decoder.decode(data, asn1Spec=pMod.Message())[0]))
+        self.assertEqual(len(expected), len(result))
+        for (oid, value), (expected_oid, expected_value) in \
+                zip(result, expected):
+            self.assertEqual(tuple(expected_oid), oid)
+            self.assertTrue(isinstance(oid, tuple))
+            self.assertEqual(expected_value.tagSet, value.tagSet)
+            self.assertEqual(expected_value, value)
+
+    def test_decode_unsupported(self):
+        pMod = api.protoModules[api.protoVersion2c]
+        pdu = pMod.GetRequestPDU()
+        pMod.apiPDU.setDefaults(pdu)
+        pMod.apiPDU.setVarBinds(pdu, [((1, 3, 6), pMod.null)])
+        self.assertRaises(ber.UnsupportedError, ber.decode_response,
+                          make_message(pMod, pdu))
+        data = ber.encode_message(1, b'public', ber.GET_RESPONSE, 1, OIDS)
+        self.assertRaises(ber.UnsupportedError, ber.decode_response,
+                          data[:-3])
+
+
+class TestBERAdapter(TestCase):
+
+    instructions = (SysDescr(), ObjectID(), Uptime()) + IF_TABLE
+
+    def setUp(self):
+        super(TestBERAdapter, self).setUp()
+        self.adapter = get_adapter(self.test_host, port=self.test_port,
+                                   class_name=ADAPTER)
+
+    def test_adapter_get(self):
+        self.assertTrue(isinstance(self.adapter, ber.Adapter))
+        self.assertTrue(str(self.adapter.get_one("1.3.6.1.2.1.1.1.0"))
+                        .startswith("PySNMP"))
+        self.assertTrue(isinstance(self.adapter.get_one("1.3.6.1.2.1.1.3.0"),
+                                   rfc1902.TimeTicks))
+
+    def test_adapter_walk(self):
+        rows = self.adapter.walk("1.3.6.1.2.1.1")
+        self.assertEqual([(1, 3, 6, 1, 2, 1, 1, 1, 0),
+                          (1, 3, 6, 1, 2, 1, 1, 2, 0),
+                          (1, 3, 6, 1, 2, 1, 1, 3, 0)],
+                         [oid for oid, _ in rows])
+
+    def test_adapter_v1(self):
+        adapter = get_adapter(self.test_host, port=self.test_port,
+                              version=1, class_name=ADAPTER)
+        self.assertEqual(0, adapter.session_read.message_version)
+        rows = adapter.walk("1.3.6.1.2.1.1")
+        self.assertEqual(3, len(rows))
+
+    def test_device(self):
+        device = DefaultDevice(self.test_host, port=self.test_port,
+                               class_name=ADAPTER)
+        self.assertEqual({1: 'lo', 2: 'eth0'},
+                         dict(iter(device.ifTable))['ifDescr'])
+
+    def test_fetch_plan(self):
+        device = DefaultDevice(self.test_host, port=self.test_port,
+                               class_name=ADAPTER)
+        session = device.adapter.session_read
+        with patch.object(session, 'request',
+                          wraps=session.request) as request:
+            values = dict(device.fetch('system.sysUpTime', 'ifTable.ifDescr'))
+            self.assertEqual(1, request.call_count)
+        self.assertTrue(values['system.sysUpTime'].total_seconds() >= 0)
+        self.assertEqual({1: 'lo', 2: 'eth0'}, values['ifTable.ifDescr'])
+
+    def test_prepared(self):
+        request = self.adapter.prepare('1.3.6.1.2.1.1.1.0',
+                                       '1.3.6.1.2.1.1.3.0')
+        self.assertTrue(isinstance(request, ber.PreparedRequest))
+        with patch.object(ber, 'encode_message') as encode_message, \
+                patch.object(ber, 'decode_oid',
+                             wraps=ber.decode_oid) as decode_oid:
+            for _ in range(2):
+                values = dict(request.send())
+                self.assertTrue(str(values[(1, 3, 6, 1, 2, 1, 1, 1, 0)])
+                                .startswith("PySNMP"))
+                self.assertTrue(isinstance(values[(1, 3, 6, 1, 2, 1, 1, 3, 0)],
+                                           rfc1902.TimeTicks))
+            self.assertFalse(encode_message.called)
+            self.assertFalse(decode_oid.called)
+
+    def test_prepared_limited(self):
+        adapter = get_adapter(self.test_host, port=self.test_port,
+                              class_name=ADAPTER, concurrency=2)
+        request = adapter.prepare('1.3.6.1.2.1.1.1.0')
+        self.assertTrue(isinstance(request, ber.PreparedRequest))
+        self.assertTrue(str(dict(request.send())[(1, 3, 6, 1, 2, 1, 1, 1, 0)])
+                        .startswith("PySNMP"))
+        self.assertEqual(1, adapter.limiters[0].requests)
+
+    def test_prepare_message(self):
+        session = self.adapter.session_read
+        oids = [(1, 3, 6, 1, 2, 1, 1, 1, 0)]
+        message, offset = session.prepare(oids)
+        self.assertEqual(
+            ber.encode_message(1, b'public', ber.GET_REQUEST, 0x12345678,
+                               oids),
+            message[:offset] + b'\x12\x34\x56\x78' + message[offset + 4:])
+
+    def test_fallback(self):
+        session = self.adapter.session_read
+        with patch.object(ber, 'decode_response',
+                          side_effect=ber.UnsupportedError()):
+            value = self.adapter.get_one("1.3.6.1.2.1.1.1.0")
+        self.assertTrue(str(value).startswith("PySNMP"))
+        self.assertTrue(session._fallback is not None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,21 @@
 from __future__ import absolute_import
 
+import os
+import shutil
+import tempfile
 import unittest
 
-from mock import Mock, MagicMock
+from mock import Mock, MagicMock, patch
 
+from six import b
+
+from snmp_orm import devices, registry
 from snmp_orm.tests.utils import TestCase
-from snmp_orm.tests.agent import Instr
+from snmp_orm.tests.agent import Instr, Variable, SysDescr, Uptime
 from snmp_orm.device import DeviceClassRegistry, DeviceManager, get_device
 from snmp_orm.devices import DefaultDevice, AbstractDevice
+from snmp_orm.devices.base import FieldCache, MISSING
+from snmp_orm.devices.dlink import sw3100
 
 
 class ObjectID(Instr):
@@ -20,8 +28,40 @@ class ObjectID(Instr):
         )
 
 
+#: Part of ifTable with two interfaces.
+IF_TABLE = (
+    Variable((1, 3, 6, 1, 2, 1, 2, 2, 1, 1, 1), 'Integer', 1),
+    Variable((1, 3, 6, 1, 2, 1, 2, 2, 1, 1, 2), 'Integer', 2),
+    Variable((1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 1), 'OctetString', 'lo'),
+    Variable((1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 2), 'OctetString', 'eth0'),
+    Variable((1, 3, 6, 1, 2, 1, 2, 2, 1, 3, 1), 'Integer', 24),
+    Variable((1, 3, 6, 1, 2, 1, 2, 2, 1, 3, 2), 'Integer', 6),
+)
+
+
 class TestDeviceClassRegistry(TestCase):
-    pass
+
+    def test_index_is_fresh(self):
+        self.assertEqual(registry.load_index(devices),
+                         registry.build_index(devices))
+        self.assertEqual(registry.main(['--check']), 0)
+
+    def test_lazy_import(self):
+        with patch('snmp_orm.device.find_classes') as find_classes:
+            classes = DeviceClassRegistry()
+        self.assertFalse(find_classes.called)
+        objectId = '1.3.6.1.4.1.171.10.94.1'
+        self.assertFalse(b(objectId) in classes)
+        self.assertTrue(classes[objectId] is sw3100.Device)
+        self.assertTrue(b(objectId) in classes)
+        self.assertEqual(classes.index, {})
+        self.assertTrue(classes['1.3.6.1.4.1.171.10.94.2'] is DefaultDevice)
+
+    def test_package_without_index(self):
+        with patch.object(registry, 'INDEX_MODULE', 'missing'):
+            classes = DeviceClassRegistry()
+        self.assertEqual(classes.index, {})
+        self.assertTrue(classes['1.3.6.1.4.1.171.10.94.1'] is sw3100.Device)
 
 
 class TestDeviceManager(TestCase):
@@ -41,6 +81,43 @@ class TestDeviceManager(TestCase):
                                      registry=registry)
         self.assertTrue(obj is cls)
 
+    def test_get_classes(self):
+        classes = self.manager.get_classes(
+            [self.test_host, self.test_host, '127.0.0.2'],
+            port=self.test_port, timeout=0.3, retries=0)
+        self.assertEqual(set(classes), set([self.test_host, '127.0.0.2']))
+        self.assertTrue(classes[self.test_host] is DefaultDevice)
+        self.assertTrue(isinstance(classes['127.0.0.2'], Exception))
+        self.assertEqual(self.manager.cached_id(self.test_host),
+                         '1.3.6.1.4.1.8072.3.2.10')
+
+    def test_cache_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'classes.json')
+        manager = DeviceManager(cache_file=path)
+        manager.get_class(host=self.test_host, port=self.test_port)
+        self.assertFalse(os.path.exists(path))
+        manager.save_cache()
+        manager = DeviceManager(cache_file=path, cache_batch=1)
+        with patch.object(manager, '_autodetect_id') as autodetect:
+            self.assertTrue(manager.get_classes([self.test_host])
+                            [self.test_host] is DefaultDevice)
+        self.assertFalse(autodetect.called)
+
+    def test_cache_batch(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'classes.json')
+        manager = DeviceManager(cache_file=path, cache_batch=2)
+        with patch.object(manager, '_autodetect_id',
+                          return_value='1.3.6.1.4.1.8072.3.2.10'):
+            manager.get_class('first')
+            self.assertFalse(os.path.exists(path))
+            manager.get_class('second')
+            self.assertTrue(os.path.exists(path))
+        self.assertEqual(0, manager._changed)
+
 
 class TestGetDevice(TestCase):
 
@@ -66,5 +143,271 @@ class TestGetDevice(TestCase):
         self.assertTrue(obj is device)
 
 
+class TestContainer(TestCase):
+
+    instructions = (SysDescr(), Uptime()) + IF_TABLE
+
+    def setUp(self):
+        super(TestContainer, self).setUp()
+        self.device = DefaultDevice(self.test_host, port=self.test_port)
+
+    def test_walk_many(self):
+        adapter = self.device.adapter
+        with patch.object(adapter, 'getbulk',
+                          wraps=adapter.getbulk) as getbulk:
+            columns = adapter.walk_many(['1.3.6.1.2.1.2.2.1.2',
+                                         '1.3.6.1.2.1.2.2.1.3',
+                                         '1.3.6.1.2.1.2.2.1.4'])
+        self.assertEqual(1, getbulk.call_count)
+        self.assertEqual([[(1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 1),
+                           (1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 2)],
+                          [(1, 3, 6, 1, 2, 1, 2, 2, 1, 3, 1),
+                           (1, 3, 6, 1, 2, 1, 2, 2, 1, 3, 2)],
+                          []],
+                         [[oid for oid, _ in rows] for rows in columns])
+
+    def test_walk_many_truncated(self):
+        adapter = self.device.adapter
+        getbulk = adapter.getbulk
+
+        def short_getbulk(rows, *args, **kwargs):
+            # Agent could send fewer variables than there are columns.
+            return getbulk(rows, *args, **kwargs)[:2]
+
+        with patch.object(adapter, 'getbulk', side_effect=short_getbulk):
+            columns = adapter.walk_many(['1.3.6.1.2.1.2.2.1.1',
+                                         '1.3.6.1.2.1.2.2.1.2',
+                                         '1.3.6.1.2.1.2.2.1.3'])
+        self.assertEqual([[(1, 3, 6, 1, 2, 1, 2, 2, 1, 1, 1),
+                           (1, 3, 6, 1, 2, 1, 2, 2, 1, 1, 2)],
+                          [(1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 1),
+                           (1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 2)],
+                          [(1, 3, 6, 1, 2, 1, 2, 2, 1, 3, 1),
+                           (1, 3, 6, 1, 2, 1, 2, 2, 1, 3, 2)]],
+                         [[oid for oid, _ in rows] for rows in columns])
+
+    def test_iter_walk(self):
+        adapter = self.device.adapter
+        rows = adapter.iter_walk('1.3.6.1.2.1.2.2.1.2')
+        with patch.object(adapter, 'getbulk',
+                          wraps=adapter.getbulk) as getbulk:
+            self.assertEqual((1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 1), next(rows)[0])
+            self.assertEqual(1, getbulk.call_count)
+            self.assertEqual([(1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 2)],
+                             [oid for oid, _ in rows])
+        self.assertEqual(adapter.walk('1.3.6.1.2.1.2.2.1.3'),
+                         list(adapter.iter_walk('1.3.6.1.2.1.2.2.1.3')))
+
+    def test_iter_rows(self):
+        proxy = self.device.ifTable.ifDescr
+        rows = proxy.iter_rows()
+        self.assertEqual((1, 'lo'), next(rows))
+        self.assertEqual([(2, 'eth0')], list(rows))
+        self.assertFalse(proxy.loaded)
+
+    def test_fetch_table(self):
+        rows = self.device.ifTable.fetch_table('ifDescr', 'ifType')
+        self.assertEqual({1: {'ifDescr': 'lo', 'ifType': 'softwareLoopback'},
+                          2: {'ifDescr': 'eth0', 'ifType': 'ethernetCsmacd'}},
+                         rows)
+
+    def test_fetch_plan(self):
+        adapter = self.device.adapter
+        dispatcher = adapter.session_read.generator.snmpEngine.msgAndPduDsp
+        with patch.object(adapter, 'getbulk',
+                          wraps=adapter.getbulk) as getbulk, \
+                patch.object(adapter, 'get', wraps=adapter.get) as get, \
+                patch.object(dispatcher, 'sendPdu',
+                             wraps=dispatcher.sendPdu) as sendPdu:
+            values = self.device.fetch('system.sysDescr', 'system.sysContact',
+                                       'ifTable.ifDescr', 'ifTable.ifType')
+            self.assertFalse(get.called)
+            self.assertEqual(1, getbulk.call_count)
+            self.assertEqual(2, getbulk.call_args[1]['non_repeaters'])
+            self.assertEqual(1, sendPdu.call_count)
+        values = dict(values)
+        self.assertTrue(values['system.sysDescr'].startswith('PySNMP'))
+        self.assertEqual(None, values['system.sysContact'])
+        self.assertEqual({1: 'lo', 2: 'eth0'}, values['ifTable.ifDescr'])
+        self.assertEqual({1: 'softwareLoopback', 2: 'ethernetCsmacd'},
+                         values['ifTable.ifType'])
+        self.assertTrue(DefaultDevice.meta.get_plan(
+            ('system.sysDescr', 'system.sysContact', 'ifTable.ifDescr',
+             'ifTable.ifType')) is DefaultDevice.meta.get_plan(
+            ['system.sysDescr', 'system.sysContact', 'ifTable.ifDescr',
+             'ifTable.ifType']))
+
+    def test_fetch_plan_without_bulk(self):
+        device = DefaultDevice(self.test_host, port=self.test_port,
+                               use_bulk=False)
+        with patch.object(device.adapter, 'getbulk') as getbulk:
+            values = dict(device.fetch('system.sysDescr', 'ifTable.ifDescr'))
+            self.assertFalse(getbulk.called)
+        self.assertTrue(values['system.sysDescr'].startswith('PySNMP'))
+        self.assertEqual({1: 'lo', 2: 'eth0'}, values['ifTable.ifDescr'])
+        self.assertEqual(['system.sysContact', 'system.sysDescr'],
+                         [name for name, _ in device.fetch('system')][:2])
+
+    def test_group_iteration(self):
+        values = dict(iter(self.device.ifTable))
+        self.assertEqual({1: 'lo', 2: 'eth0'}, values['ifDescr'])
+        self.assertNotIn('ifMtu', values)
+        values = dict(iter(self.device.system))
+        self.assertTrue(values['sysDescr'].startswith('PySNMP'))
+        self.assertNotIn('sysContact', values)
+
+    def test_paged_group_iteration(self):
+        adapter = self.device.adapter
+        getbulk = adapter.getbulk
+
+        def short_getbulk(rows, *args, **kwargs):
+            # Agent ignores max-repetitions, so cut responses.
+            return getbulk(rows, *args, **kwargs)[:2]
+
+        with patch.object(adapter, 'getbulk',
+                          side_effect=short_getbulk) as mock:
+            values = dict(iter(self.device.ifTable))
+            self.assertEqual(4, mock.call_count)
+        self.assertEqual({1: 'lo', 2: 'eth0'}, values['ifDescr'])
+        self.assertEqual({1: 'softwareLoopback', 2: 'ethernetCsmacd'},
+                         values['ifType'])
+        self.assertEqual({1: 1, 2: 2}, values['ifIndex'])
+
+    def test_field_index(self):
+        index = DefaultDevice.meta.indexes['ifTable']
+        self.assertEqual('ifDescr',
+                         index.find((1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 7)).name)
+        self.assertEqual(None, index.find((1, 3, 6, 1, 2, 1, 2, 2, 1, 99, 7)))
+        index = DefaultDevice.meta.indexes['system']
+        self.assertEqual('sysName',
+                         index.find((1, 3, 6, 1, 2, 1, 1, 5, 0)).name)
+        self.assertEqual(None, index.find((1, 3, 6, 1, 2, 1, 1, 5, 0, 1)))
+
+
+class TestPrepareByOid(unittest.TestCase):
+
+    def setUp(self):
+        self.device = DefaultDevice.__new__(DefaultDevice)
+
+    def test_prepare_val_by_oid(self):
+        self.assertEqual(
+            ('sysName', 'switch', None),
+            self.device.prepare_val_by_oid((1, 3, 6, 1, 2, 1, 1, 5, 0),
+                                           'switch'))
+        self.assertEqual(
+            ('ifDescr', 'eth0', (2, )),
+            self.device.prepare_val_by_oid(
+                (1, 3, 6, 1, 2, 1, 2, 2, 1, 2, 2), 'eth0'))
+        self.assertEqual(
+            (None, None, None),
+            self.device.prepare_val_by_oid((1, 3, 6, 1, 4, 1, 1), 1))
+
+    def test_prepare_many_by_oid(self):
+        self.assertEqual(
+            [('ifType', 'ethernetCsmacd', (2, )),
+             ('ipForwarding', 'forwarding', None),
+             (None, None, None)],
+            self.device.prepare_many_by_oid([
+                ((1, 3, 6, 1, 2, 1, 2, 2, 1, 3, 2), 6),
+                ((1, 3, 6, 1, 2, 1, 4, 1, 0), 1),
+                ((1, 3, 6, 1, 2, 1, 2, 2, 1, 99, 1), 1)]))
+
+
+class TestFieldCache(TestCase):
+
+    instructions = (SysDescr(), Uptime()) + IF_TABLE
+
+    def setUp(self):
+        super(TestFieldCache, self).setUp()
+        self.device = DefaultDevice(self.test_host, port=self.test_port)
+
+    def test_scalar(self):
+        adapter = self.device.adapter
+        with patch.object(adapter, 'get', wraps=adapter.get) as get:
+            descr = self.device.system.sysDescr
+            self.assertEqual(descr, self.device.system.sysDescr)
+            self.assertEqual(1, get.call_count)
+            # Field without ttl isn't cached.
+            self.device.system.sysUpTime
+            self.device.system.sysUpTime
+            self.assertEqual(3, get.call_count)
+            self.device.invalidate('system.sysDescr')
+            self.assertEqual(descr, self.device.system.sysDescr)
+            self.assertEqual(4, get.call_count)
+        self.assertEqual({'size': 1, 'hits': 1, 'misses': 2},
+                         self.device.cache.stats())
+
+    def test_table(self):
+        adapter = self.device.adapter
+        with patch.object(adapter, 'walk', wraps=adapter.walk) as walk:
+            self.assertEqual({1: 'lo', 2: 'eth0'},
+                             dict(self.device.ifTable.ifDescr))
+            self.assertEqual({1: 'lo', 2: 'eth0'},
+                             dict(self.device.ifTable.ifDescr))
+            self.assertEqual(1, walk.call_count)
+            self.device.ifTable.invalidate()
+            self.assertEqual('eth0', self.device.ifTable.ifDescr[2])
+            self.assertEqual(1, walk.call_count)
+            self.assertEqual({1: 'lo', 2: 'eth0'},
+                             dict(self.device.ifTable.ifDescr))
+            self.assertEqual(2, walk.call_count)
+        self.assertEqual({'size': 2, 'hits': 1, 'misses': 3},
+                         self.device.cache.stats())
+
+    def test_batch(self):
+        descr = self.device.system.sysDescr
+        with self.device.batch():
+            deferred = self.device.system.sysDescr
+        self.assertEqual(descr, deferred.value)
+
+    def test_size(self):
+        cache = FieldCache(maxsize=1)
+        cache.set('a', 1, 60)
+        cache.set('b', None, 60)
+        self.assertIs(MISSING, cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        cache.set('c', 1, -1)
+        self.assertIs(MISSING, cache.get('c'))
+
+
+
+class TestSnapshot(TestCase):
+
+    instructions = (SysDescr(), Uptime()) + IF_TABLE
+
+    def setUp(self):
+        super(TestSnapshot, self).setUp()
+        self.device = DefaultDevice(self.test_host, port=self.test_port)
+
+    def test_snapshot(self):
+        adapter = self.device.adapter
+        with patch.object(adapter, 'getbulk',
+                          wraps=adapter.getbulk) as getbulk, \
+                patch.object(adapter, 'get', wraps=adapter.get) as get:
+            snapshot = self.device.snapshot(groups=('system', 'ifTable'))
+            self.assertFalse(get.called)
+            self.assertEqual(1, getbulk.call_count)
+        self.assertTrue(snapshot.system.sysDescr.startswith('PySNMP'))
+        self.assertEqual(None, snapshot.system.sysContact)
+        self.assertEqual({1: 'lo', 2: 'eth0'}, snapshot.ifTable.ifDescr)
+        self.assertEqual('softwareLoopback', snapshot.ifTable.ifType[1])
+        self.assertEqual({}, snapshot.ifTable.ifMtu)
+        self.assertEqual(['ifTable', 'system'], snapshot.keys())
+        self.assertFalse(hasattr(snapshot, 'ip'))
+
+    def test_immutable(self):
+        snapshot = self.device.snapshot(groups=['system', 'ifTable'])
+        self.assertFalse(hasattr(snapshot, '__dict__'))
+        self.assertFalse(hasattr(snapshot.system, '__dict__'))
+        self.assertRaises(AttributeError, setattr, snapshot.system,
+                          'sysName', 'name')
+        self.assertRaises(AttributeError, setattr, snapshot, 'system', None)
+        self.assertRaises(TypeError, snapshot.ifTable.ifDescr.__setitem__,
+                          3, 'eth1')
+        self.assertTrue(self.device.meta.get_layout(('system', 'ifTable'))
+                        is self.device.meta.get_layout(['system',
+                                                        'ifTable']))
+
+
 if __name__ == "__main__":
     unittest.main()
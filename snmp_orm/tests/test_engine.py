@@ -0,0 +1,145 @@
+from __future__ import absolute_import
+
+import socket
+import threading
+import unittest
+
+from snmp_orm.tests.utils import TestCase
+from snmp_orm.tests.agent import SysDescr, Uptime
+from snmp_orm.adapter import get_adapter
+from snmp_orm.adapters import ber
+from snmp_orm.adapters.engine import Engine, EngineTimeout, TimerWheel
+from snmp_orm.adapters.policy import Policy, AdaptivePolicy
+
+
+class HedgePolicy(AdaptivePolicy):
+
+    def hedge_delay(self, timeout):
+        return 0.05
+
+
+class TestTimerWheel(unittest.TestCase):
+
+    def test_expire(self):
+        wheel = TimerWheel(tick=1, size=4, now=0)
+        fired = []
+        wheel.schedule(2, lambda: fired.append(2))
+        wheel.schedule(9, lambda: fired.append(9))
+        wheel.schedule(0, lambda: fired.append(0)).cancel()
+        for callback in wheel.advance(1):
+            callback()
+        self.assertEqual([], fired)
+        for callback in wheel.advance(5):
+            callback()
+        self.assertEqual([2], fired)
+        for callback in wheel.advance(100):
+            callback()
+        self.assertEqual([2, 9], fired)
+        self.assertEqual(0, wheel.count)
+
+
+class TestEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = Engine(ber.get_request_id)
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.server.settimeout(5)
+        self.server.bind(('127.0.0.1', 0))
+        self.address = (socket.AF_INET, self.server.getsockname())
+
+    def tearDown(self):
+        self.engine.close()
+        self.server.close()
+
+    def build(self, request_id):
+        return ber.encode_message(1, b'public', ber.GET_REQUEST,
+                                  request_id, [(1, 3, 6, 1)])
+
+    def serve(self, skip=0, count=1):
+        """Answer requests after skipping of given number of them, stop
+        when server is idle or closed.
+
+        """
+        def run():
+            for i in range(skip + count):
+                try:
+                    data, address = self.server.recvfrom(65535)
+                except socket.error:
+                    return
+                if i < skip:
+                    continue
+                request_id = ber.decode_header(data, ber.GET_REQUEST)[2]
+                self.server.sendto(ber.encode_message(
+                    1, b'public', ber.GET_RESPONSE, request_id, []), address)
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def test_request_timeout(self):
+        policy = Policy(timeout=0.05, retries=1)
+        self.assertRaises(EngineTimeout, self.engine.request,
+                          self.address, self.build, policy)
+        self.assertEqual({'requests': 1, 'failures': 1,
+                          'retransmissions': 1, 'hedges': 0},
+                         policy.stats())
+
+    def test_retransmit(self):
+        policy = AdaptivePolicy(timeout=0.1, retries=1)
+        thread = self.serve(skip=1)
+        response = self.engine.request(self.address, self.build, policy)
+        thread.join()
+        self.assertEqual([], ber.decode_response(response)[5])
+        self.assertEqual(1, policy.retransmissions)
+        self.assertEqual(None, policy.srtt)
+
+    def test_hedge(self):
+        policy = HedgePolicy(timeout=1, retries=0)
+        thread = self.serve(skip=1)
+        self.engine.request(self.address, self.build, policy)
+        thread.join()
+        self.assertEqual(1, policy.hedges)
+        self.assertEqual(0, policy.retransmissions)
+
+    def test_concurrent(self):
+        # Datagrams could be dropped under load, so lost requests are
+        # retransmitted and server answers retransmissions too.
+        policy = Policy(timeout=1, retries=2)
+        count = 500
+        self.serve(count=count * 3)
+        done = threading.Event()
+        responses = []
+
+        def callback(response):
+            responses.append(response)
+            if len(responses) == count:
+                done.set()
+
+        for _ in range(count):
+            self.engine.submit(self.address, self.build, policy, callback)
+        done.wait(10)
+        self.assertEqual(count, len([r for r in responses if r]))
+        self.assertEqual(1, len(self.engine.sockets))
+        self.assertEqual({}, self.engine.pending)
+
+
+class TestBEREngine(TestCase):
+
+    instructions = (SysDescr(), Uptime())
+
+    def test_shared_engine(self):
+        first = get_adapter(self.test_host, port=self.test_port,
+                            class_name='snmp_orm.adapters.ber')
+        second = get_adapter(self.test_host, port=self.test_port,
+                             community='other',
+                             class_name='snmp_orm.adapters.ber')
+        self.assertTrue(first.session_read.engine is
+                        second.session_read.engine)
+        self.assertTrue(str(first.get_one('1.3.6.1.2.1.1.1.0'))
+                        .startswith('PySNMP'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+from __future__ import absolute_import
+
+import sys
+import subprocess
+import unittest
+
+#: How long import of snmp_orm could take (in seconds).
+IMPORT_TIME_BUDGET = 0.5
+
+#: Dependencies that should be loaded only when they are used.
+HEAVY_MODULES = ('pysnmp', 'pyasn1', 'netaddr')
+
+SCRIPT = '''
+import sys, time
+started = time.time()
+import snmp_orm
+print(time.time() - started)
+print(' '.join(sorted(set(name.split('.')[0] for name in sys.modules))))
+'''
+
+
+class TestImport(unittest.TestCase):
+
+    def import_snmp_orm(self):
+        output = subprocess.check_output([sys.executable, '-c', SCRIPT])
+        elapsed, modules = output.decode('ascii').splitlines()
+        return float(elapsed), modules.split()
+
+    def test_heavy_modules_are_lazy(self):
+        _, modules = self.import_snmp_orm()
+        for name in HEAVY_MODULES:
+            self.assertFalse(name in modules, '%s is imported' % name)
+
+    def test_import_time(self):
+        elapsed = min(self.import_snmp_orm()[0] for _ in range(3))
+        self.assertTrue(elapsed < IMPORT_TIME_BUDGET,
+                        'import took %.3fs' % elapsed)
+
+
+if __name__ == "__main__":
+    unittest.main()
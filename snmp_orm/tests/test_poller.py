@@ -0,0 +1,87 @@
+from __future__ import absolute_import
+
+import time
+import unittest
+from datetime import timedelta
+
+from pyasn1.type.univ import Null, ObjectIdentifier
+from pysnmp.proto.rfc1902 import Integer, OctetString
+
+from snmp_orm.tests.utils import TestCase
+from snmp_orm.tests.agent import SysDescr, Uptime
+from snmp_orm.tests.test_device import ObjectID
+from snmp_orm.devices import DefaultDevice
+from snmp_orm.config import OID_OBJECT_ID
+
+try:
+    from snmp_orm.poller import poll_many, get_devices, compact
+except (ImportError, SyntaxError):
+    poll_many = get_devices = compact = None
+
+
+@unittest.skipIf(poll_many is None, 'asyncio is not available')
+class TestPoller(TestCase):
+
+    instructions = (SysDescr(), ObjectID(), Uptime())
+
+    def test_poll_many(self):
+        results = dict(poll_many(
+            [self.test_host] * 3 + ['127.0.0.2'],
+            ['system.sysDescr', '1.3.6.1.2.1.1.2.0'],
+            port=self.test_port, timeout=0.3, retries=0))
+        result = results[self.test_host]
+        self.assertTrue(result['system.sysDescr'].startswith('PySNMP'))
+        self.assertEqual((1, 3, 6, 1, 4, 1, 8072, 3, 2, 10),
+                         tuple(result['1.3.6.1.2.1.1.2.0']))
+        self.assertTrue(isinstance(results['127.0.0.2'], Exception))
+
+    def test_poll_many_order(self):
+        hosts = [host for host, _ in poll_many(
+            ['127.0.0.2', self.test_host], ['system.sysDescr'],
+            port=self.test_port, timeout=0.3, retries=0)]
+        self.assertEqual([self.test_host, '127.0.0.2'], hosts)
+
+    def test_poll_sharded(self):
+        hosts = [self.test_host, '127.0.0.1', '127.0.0.2']
+        results = dict(poll_many(
+            hosts, ['system.sysDescr', 'system.sysUpTime', OID_OBJECT_ID],
+            processes=2, port=self.test_port,
+            timeout=0.3, retries=0))
+        self.assertEqual(set(hosts), set(results))
+        for host in hosts[:2]:
+            result = results[host]
+            self.assertTrue(result['system.sysDescr'].startswith('PySNMP'))
+            self.assertEqual((1, 3, 6, 1, 4, 1, 8072, 3, 2, 10),
+                             result[OID_OBJECT_ID])
+            self.assertTrue(isinstance(result['system.sysUpTime'],
+                                       timedelta))
+        self.assertTrue(isinstance(results['127.0.0.2'], Exception))
+
+    def test_poll_sharded_streaming(self):
+        results = poll_many(['127.0.0.2', self.test_host],
+                            ['system.sysDescr'], processes=1,
+                            port=self.test_port, timeout=1, retries=0)
+        started = time.time()
+        self.assertEqual(self.test_host, next(results)[0])
+        # answer of host is returned before slow host is timed out
+        self.assertTrue(time.time() - started < 1)
+        self.assertEqual(['127.0.0.2'], [host for host, _ in results])
+
+    def test_compact(self):
+        self.assertEqual({'a': 1, 'b': b'x', 'c': (1, 3), 'd': None},
+                         compact({'a': Integer(1), 'b': OctetString(b'x'),
+                                  'c': ObjectIdentifier((1, 3)),
+                                  'd': Null('')}))
+
+    def test_unknown_field(self):
+        self.assertRaises(ValueError, list,
+                          poll_many([self.test_host], ['system.unknown'],
+                                    port=self.test_port))
+
+    def test_get_devices(self):
+        devices = dict(get_devices([self.test_host], port=self.test_port))
+        self.assertTrue(isinstance(devices[self.test_host], DefaultDevice))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import unittest
+from time import time
+
+from mock import patch
+
+from pyasn1.type.univ import OctetString
+from pysnmp.entity import config as pysnmp_config
+from pysnmp.proto import errind
+from pysnmp.proto.secmod.rfc3414 import localkey
+
+from snmp_orm.adapters import usm
+from snmp_orm.adapters.pysnmp import UsmSession, PySNMPError
+from snmp_orm.adapters.usm import Engine, EngineCache, CachedService
+from snmp_orm.utils import LRUCache
+
+
+ENGINE = Engine(b'\x80\x00\x1f\x88\x04test', b'\x80\x00\x1f\x88\x04test',
+                b'', 3, 1000, 1000000)
+
+
+class TestEngineCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'engines.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_ttl(self):
+        cache = EngineCache(ttl=60)
+        cache.put(('localhost', 161), ENGINE)
+        self.assertEqual(cache.get(('localhost', 161), ENGINE.updated + 30),
+                         ENGINE)
+        self.assertIsNone(cache.get(('localhost', 161), ENGINE.updated + 90))
+        self.assertIsNone(cache.get(('localhost', 162), ENGINE.updated))
+        self.assertEqual(cache.stats(),
+                         {'engines': 1, 'hits': 1, 'misses': 2})
+
+    def test_persistence(self):
+        cache = EngineCache(self.path, ttl=float('inf'))
+        cache.put(('localhost', 161), ENGINE)
+        cache.put(('localhost', 162), ENGINE)
+        cache.invalidate(('localhost', 162))
+        cache.save()
+        cache = EngineCache(self.path, ttl=float('inf'))
+        self.assertEqual(cache.engines, {('localhost', 161): ENGINE})
+
+    def test_batch(self):
+        cache = EngineCache(self.path, ttl=float('inf'), batch=2)
+        cache.put(('localhost', 161), ENGINE)
+        self.assertFalse(os.path.exists(self.path))
+        cache.put(('localhost', 162), ENGINE)
+        self.assertEqual(
+            len(EngineCache(self.path, ttl=float('inf')).engines), 2)
+        self.assertEqual(0, cache.changed)
+
+    def test_time_isnt_saved(self):
+        cache = EngineCache(self.path, ttl=float('inf'), batch=1)
+        cache.put(('localhost', 161), ENGINE)
+        cache.put(('localhost', 161), ENGINE._replace(time=2000))
+        self.assertEqual(
+            EngineCache(self.path, ttl=float('inf')).engines,
+            {('localhost', 161): ENGINE})
+
+    def test_broken_file(self):
+        with open(self.path, 'w') as f:
+            f.write('[')
+        self.assertEqual(EngineCache(self.path).engines, {})
+
+
+class TestKeys(unittest.TestCase):
+
+    def test_cached_service(self):
+        sha = pysnmp_config.usmHMACSHAAuthProtocol
+        service = pysnmp_config.authServices[sha]
+        service = getattr(service, 'service', service)
+        cached = CachedService(service, LRUCache(8))
+        engine_id = OctetString(ENGINE.engine_id)
+        with patch.object(localkey, 'hashPassphraseSHA',
+                          wraps=localkey.hashPassphraseSHA) as hash_sha:
+            for _ in range(3):
+                key = cached.localizeKey(cached.hashPassphrase('password'),
+                                         engine_id)
+            self.assertEqual(hash_sha.call_count, 1)
+        self.assertEqual(
+            key, localkey.passwordToKeySHA('password', engine_id))
+        self.assertNotEqual(cached.hashPassphrase('other'),
+                            cached.hashPassphrase('password'))
+        self.assertEqual(len(cached.cache), 3)
+
+    def test_sessions_share_keys(self):
+        UsmSession('127.0.0.1', 60199, 'user', None, None,
+                   'authpassword', None, 'privpassword')
+        for services in (pysnmp_config.authServices,
+                         pysnmp_config.privServices):
+            for service in services.values():
+                self.assertIsInstance(service, CachedService)
+                self.assertIs(service.cache, usm.keys)
+
+
+class TestUsmSession(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = usm.get_engine_cache()
+        self.key = ('127.0.0.1', 60199)
+        self.cache.put(self.key, ENGINE._replace(updated=time()))
+
+    def tearDown(self):
+        self.cache.invalidate(self.key)
+
+    def get_session(self):
+        return UsmSession('127.0.0.1', 60199, 'user', None, None,
+                          'authpassword', None, 'privpassword')
+
+    def test_restore(self):
+        session = self.get_session()
+        self.assertTrue(session.restored)
+        engine = usm.capture(session.generator.snmpEngine, session.transport)
+        self.assertEqual(engine[:4], ENGINE[:4])
+        self.assertTrue(engine.time >= ENGINE.time)
+
+    def test_stale_engine(self):
+        session = self.get_session()
+        self.assertRaises(PySNMPError, session.handle_error,
+                          errind.unknownEngineID, None, None, [])
+        self.assertIsNone(self.cache.get(self.key))
+        self.assertIsNone(usm.capture(session.generator.snmpEngine,
+                                      session.transport))
+        self.assertFalse(session.restored)
+
+    def test_rediscover(self):
+        session = self.get_session()
+        responses = [(errind.unknownEngineID, 0, 0, []),
+                     (None, 0, 0, [('1.3.6.1.2.1.1.5.0', 'name')])]
+        with patch.object(session.generator, 'getCmd',
+                          side_effect=responses) as getCmd:
+            self.assertEqual(session.get('1.3.6.1.2.1.1.5.0'),
+                             [((1, 3, 6, 1, 2, 1, 1, 5, 0), 'name')])
+        self.assertEqual(getCmd.call_count, 2)
+        self.assertIsNone(self.cache.get(self.key))
@@ -1,13 +1,54 @@
 """Some useful tools."""
 from __future__ import absolute_import
 
+import os
 import sys
+import json
+import errno
 import inspect
+import logging
 import pkgutil
 import importlib
+from time import time
+from threading import Lock
+from collections import OrderedDict
 
 from six import string_types, binary_type, b, reraise
-from pyasn1.type.univ import ObjectIdentifier
+
+from snmp_orm.config import OID_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModule(object):
+    """Proxy of module, that imports it on first access to it's attribute.
+    Used for heavy dependencies (pysnmp, pyasn1, netaddr), so they are
+    loaded only when some value should be converted or sent.
+
+    """
+
+    def __init__(self, name):
+        self.__dict__['__name__'] = name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        value = getattr(module, attr)
+        # next access to the same attribute doesn't go here
+        self.__dict__[attr] = value
+        return value
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, self.__name__)
+
+
+def is_instance(value, module_name, class_name):
+    """Check that value is instance of class from module without import of
+    module: value can't be instance of class that isn't imported yet.
+
+    """
+    module = sys.modules.get(module_name)
+    return module is not None and \
+        isinstance(value, getattr(module, class_name))
 
 
 def get_all_parents(cls):
@@ -24,11 +65,54 @@ def get_all_parents(cls):
     return tuple(parents)
 
 
+class OID(tuple):
+    """Object identifier, tuple of integer arcs. OIDs are ordered like
+    variables of MIB and are equal to tuples of the same arcs with the same
+    hash, so they could be mixed with tuples in keys of dictionaries.
+
+    """
+
+    __slots__ = ()
+
+    def startswith(self, prefix):
+        """Return True if OID starts with given tuple of arcs."""
+        size = len(prefix)
+        return len(self) >= size and self[:size] == prefix
+
+    def index_after(self, prefix):
+        """Return tuple of arcs after given prefix or None if OID doesn't
+        start with it.
+
+        """
+        if not self.startswith(prefix):
+            return None
+        return self[len(prefix):]
+
+    def __str__(self):
+        return '.'.join(map(str, self))
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, str(self))
+
+
 def str_to_oid(s):
-    if isinstance(s, string_types + (binary_type, )):
-        return tuple(int(val) for val in s.split("."))
-    elif isinstance(s, ObjectIdentifier):
-        return tuple(s)
+    """Return :class:`OID` for dotted string, tuple of arcs or pyasn1's
+    ObjectIdentifier, other values are returned as is. Parsed strings are
+    memoized, so the same string gives the same OID object.
+
+    """
+    if isinstance(s, OID):
+        return s
+    elif isinstance(s, string_types + (binary_type, )):
+        oid = parsed_oids.get(s)
+        if oid is None:
+            text = s.decode('ascii') if isinstance(s, binary_type) else s
+            oid = OID(int(val) for val in text.strip('.').split('.'))
+            parsed_oids.set(s, oid)
+        return oid
+    elif isinstance(s, tuple) or \
+            is_instance(s, 'pyasn1.type.univ', 'ObjectIdentifier'):
+        return OID(s)
     else:
         return s
 
@@ -105,7 +189,7 @@ def load_modules(packages):
         for _, name, _ in pkgutil.walk_packages(package.__path__,
                                                 package.__name__ + '.'):
             yield importlib.import_module(name)
-    raise StopIteration()
+    return
 
 
 def find_classes(cls, packages):
@@ -120,4 +204,122 @@ def find_classes(cls, packages):
                 if entity not in entities:
                     yield entity
                     entities.add(entity)
-    raise StopIteration()
+    return
+
+
+#: Marker of missing value, caches could keep None.
+MISSING = object()
+
+
+class LRUCache(object):
+    """Mapping with limited size, that evicts least recently used items
+    when it's full.
+
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data.pop(key)
+            except KeyError:
+                return default
+            self.data[key] = value
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = value
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def get_or_create(self, key, factory):
+        """Return cached value or create and cache new one."""
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+
+#: OIDs parsed by :func:`str_to_oid` by strings.
+parsed_oids = LRUCache(OID_CACHE_SIZE)
+
+
+class TTLCache(LRUCache):
+    """LRU cache, which items expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        super(TTLCache, self).__init__(maxsize)
+        self.ttl = ttl
+
+    def get(self, key, default=None):
+        item = super(TTLCache, self).get(key)
+        if item is None:
+            return default
+        value, expires = item
+        if expires < time():
+            with self.lock:
+                self.data.pop(key, None)
+            return default
+        return value
+
+    def set(self, key, value, expires=None):
+        if expires is None:
+            expires = time() + self.ttl
+        super(TTLCache, self).set(key, (value, expires))
+
+    def items(self):
+        """Return list of (key, value, expires) tuples of alive items."""
+        now = time()
+        with self.lock:
+            return [(key, value, expires)
+                    for key, (value, expires) in self.data.items()
+                    if expires >= now]
+
+
+def load_json(path):
+    """Load JSON document from file, return None if file doesn't exist or
+    can't be read.
+
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError) as e:
+        if e.errno != errno.ENOENT:
+            logger.warning("Can't load %s: %s" % (path, e))
+    except ValueError as e:
+        logger.warning("Can't load %s: %s" % (path, e))
+    return None
+
+
+def save_json(path, document):
+    """Write JSON document to file, file is replaced atomically, so readers
+    never see partially written document.
+
+    """
+    temp_path = '%s.%d' % (path, os.getpid())
+    try:
+        with open(temp_path, 'w') as f:
+            json.dump(document, f, separators=(',', ':'))
+        getattr(os, 'replace', os.rename)(temp_path, path)
+    except (IOError, OSError) as e:
+        logger.warning("Can't save %s: %s" % (path, e))